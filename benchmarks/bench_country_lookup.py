@@ -0,0 +1,120 @@
+"""
+Benchmark per-request latency of /api/v1/countries/{iso3}/timeseries as the
+number of countries grows, with the days per country fixed.
+
+For each dataset size, times the country lookup alone (the previous boolean
+mask + copy + sort against the Dataset's row-range index with binary-searched
+date bounds) and the whole request through the FastAPI test client. Indexed
+latency should stay flat; the masked lookup grows with the table.
+
+Usage:
+    python benchmarks/bench_country_lookup.py --countries 50 200 800 3200 --days 365
+"""
+
+from pathlib import Path
+from typing import Dict
+import argparse
+import json
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import REPO_ROOT
+
+sys.path.insert(0, str(REPO_ROOT / "services" / "api"))
+import main  # noqa: E402
+
+
+def make_timeseries(n_countries: int, n_days: int, seed: int = 0) -> pd.DataFrame:
+    """A frame shaped like the ETL output: sorted by (iso3, date), categorical labels."""
+    rng = np.random.default_rng(seed)
+    codes = [f"C{i:04d}" for i in range(n_countries)]
+    df = pd.DataFrame({
+        "date": np.tile(pd.date_range("2020-01-22", periods=n_days).to_numpy(), n_countries),
+        "country": pd.Categorical(np.repeat([f"Country {code}" for code in codes], n_days)),
+        "iso3": pd.Categorical(np.repeat(codes, n_days)),
+    })
+    for col in main.BASE_METRICS + main.DERIVED_METRICS:
+        df[col] = rng.random(len(df)) * 1000
+    return df
+
+
+def masked_lookup(df: pd.DataFrame, iso3: str, from_date, to_date) -> pd.DataFrame:
+    """The lookup used before the country index."""
+    country_data = df[df["iso3"] == iso3].copy()
+    country_data["date"] = main._date_column(country_data)
+    country_data = country_data[country_data["date"] >= pd.Timestamp(from_date)]
+    country_data = country_data[country_data["date"] <= pd.Timestamp(to_date)]
+    return country_data.sort_values("date")
+
+
+def indexed_lookup(dataset, iso3: str, from_date, to_date) -> pd.DataFrame:
+    start, stop = dataset.ranges[iso3]
+    dates = dataset.dates[start:stop]
+    lo = start + int(np.searchsorted(dates, np.datetime64(from_date, "ns"), side="left"))
+    hi = start + int(np.searchsorted(dates, np.datetime64(to_date, "ns"), side="right"))
+    return pd.DataFrame({"date": dataset.dates[lo:hi], **{col: values[lo:hi] for col, values in dataset.columns.items()}})
+
+
+def median_ms(func, requests) -> float:
+    timings = []
+    for args in requests:
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def run_size(n_countries: int, n_days: int, n_requests: int) -> Dict:
+    from fastapi.testclient import TestClient
+    
+    df = make_timeseries(n_countries, n_days)
+    started = time.perf_counter()
+    dataset = main.build_dataset(df)
+    index_seconds = time.perf_counter() - started
+    main.install_dataset(dataset)
+    
+    rng = np.random.default_rng(1)
+    picks = [f"C{i:04d}" for i in rng.integers(0, n_countries, n_requests)]
+    from_date, to_date = pd.Timestamp("2020-03-01").date(), pd.Timestamp("2020-09-30").date()
+    requests = [(df, iso3, from_date, to_date) for iso3 in picks]
+    indexed_requests = [(dataset, iso3, from_date, to_date) for iso3 in picks]
+    
+    client = TestClient(main.app)
+    urls = [(f"/api/v1/countries/{iso3}/timeseries?metric=confirmed_cases&from_date={from_date}"
+             f"&to_date={to_date}",) for iso3 in picks]
+    expected = masked_lookup(*requests[0]).drop(columns=["country", "iso3"]).reset_index(drop=True)
+    pd.testing.assert_frame_equal(expected, indexed_lookup(*indexed_requests[0]))
+    return {
+        "countries": n_countries,
+        "rows": len(df),
+        "index_build_seconds": round(index_seconds, 4),
+        "masked_lookup_ms": median_ms(masked_lookup, requests),
+        "indexed_lookup_ms": median_ms(indexed_lookup, indexed_requests),
+        "request_ms": median_ms(lambda url: client.get(url).raise_for_status(), urls),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Benchmark country timeseries lookups")
+    parser.add_argument("--countries", type=int, nargs="+", default=[50, 200, 800, 3200])
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+    
+    results = [run_size(n, args.days, args.requests) for n in args.countries]
+    print(f"{args.days} days per country, median of {args.requests} requests")
+    print(f"{'countries':>9} {'rows':>9} {'index build':>12} {'masked':>10} {'indexed':>10} {'request':>10}")
+    for r in results:
+        print(f"{r['countries']:>9} {r['rows']:>9} {r['index_build_seconds']:>11.3f}s "
+              f"{r['masked_lookup_ms']:>8.3f}ms {r['indexed_lookup_ms']:>8.3f}ms {r['request_ms']:>8.3f}ms")
+    if args.output:
+        args.output.write_text(json.dumps({"days": args.days, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,159 @@
+"""
+Benchmark API data loading: parquet decode versus memory-mapped Arrow IPC.
+
+Starts --workers API processes per load mode, as a multi-worker server would,
+and records per worker the time load_data() takes, the time of a first full
+scan of the frame (mmap pages are faulted in lazily) and, once all workers
+have loaded, their RSS split into anonymous and file-backed memory plus PSS,
+which divides shared pages between the processes mapping them. The data
+files are evicted from the page cache before each mode (posix_fadvise), so
+the first worker starts cold. Memory figures come from /proc and need Linux.
+
+Usage:
+    python benchmarks/bench_load.py --days 1100 --workers 4
+    python benchmarks/bench_load.py --output-dir etl/output
+"""
+
+from pathlib import Path
+from typing import Dict, List
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_utils import REPO_ROOT
+
+MODES = ["parquet", "mmap"]
+DATA_FILES = ["timeseries.parquet", "timeseries.arrow", "global_daily.parquet"]
+
+
+def evict_page_cache(output_dir: Path) -> None:
+    """Ask the kernel to drop the data files' clean pages from the page cache."""
+    if not hasattr(os, "posix_fadvise"):
+        return
+    for name in DATA_FILES:
+        path = output_dir / name
+        if path.exists():
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+
+
+def memory_stats(pid: int) -> Dict[str, float]:
+    """RSS breakdown and PSS of a process in MB, from /proc."""
+    stats = {}
+    fields = {"Rss": "rss_mb", "Pss": "pss_mb", "Pss_Anon": "pss_anon_mb", "Pss_File": "pss_file_mb"}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in fields:
+                stats[fields[key]] = round(int(value.split()[0]) / 1024, 1)
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("RssAnon", "RssFile"):
+                stats[key.lower().replace("rss", "rss_") + "_mb"] = round(int(value.split()[0]) / 1024, 1)
+    return stats
+
+
+def child(mode: str, output_dir: Path) -> None:
+    """Worker process: load like the API does, report, then wait to be released."""
+    os.environ["COVID_API_LOAD_MODE"] = mode
+    started = time.perf_counter()
+    sys.path.insert(0, str(REPO_ROOT / "services" / "api"))
+    import main
+    import_seconds = time.perf_counter() - started
+    main.OUTPUT_DIRS = [output_dir]
+    
+    started = time.perf_counter()
+    assert main.load_data()
+    load_seconds = time.perf_counter() - started
+    
+    # First full scan: touches every page of every numeric column
+    dataset = main.get_dataset()
+    started = time.perf_counter()
+    for values in dataset.columns.values():
+        values.sum()
+    scan_seconds = time.perf_counter() - started
+    
+    print(json.dumps({"import_seconds": round(import_seconds, 4), "load_seconds": round(load_seconds, 4),
+                      "first_scan_seconds": round(scan_seconds, 4), "rows": dataset.rows}), flush=True)
+    sys.stdin.read()
+
+
+def run_mode(mode: str, output_dir: Path, workers: int) -> List[Dict]:
+    """Start workers one after another (the first one cold) and measure them all while alive."""
+    evict_page_cache(output_dir)
+    procs, results = [], []
+    try:
+        for _ in range(workers):
+            proc = subprocess.Popen([sys.executable, __file__, "--child", mode, "--output-dir", str(output_dir)],
+                                    stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            procs.append(proc)
+            results.append(json.loads(proc.stdout.readline()))
+        for proc, result in zip(procs, results):
+            result.update(memory_stats(proc.pid))
+    finally:
+        for proc in procs:
+            proc.stdin.close()
+            proc.wait()
+    return results
+
+
+def summarize(results: List[Dict]) -> Dict:
+    return {
+        "cold_load_seconds": results[0]["load_seconds"],
+        "warm_load_seconds": min(r["load_seconds"] for r in results[1:]) if len(results) > 1 else None,
+        "first_scan_seconds": results[0]["first_scan_seconds"],
+        "mean_rss_mb": round(sum(r["rss_mb"] for r in results) / len(results), 1),
+        "mean_rss_anon_mb": round(sum(r["rss_anon_mb"] for r in results) / len(results), 1),
+        "total_pss_mb": round(sum(r["pss_mb"] for r in results), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API load modes")
+    parser.add_argument("--output-dir", type=Path, help="ETL output to load; generated if omitted")
+    parser.add_argument("--days", type=int, default=1100, help="Days of synthetic data to generate")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--json", type=Path, help="Write results as JSON")
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.child:
+        child(args.child, args.output_dir)
+        return
+    
+    with tempfile.TemporaryDirectory(prefix="bench_load_") as tmp_dir:
+        output_dir = args.output_dir
+        if output_dir is None:
+            from generate_data import generate_raw_data
+            from run_etl import run_etl
+            import logging
+            logging.getLogger().setLevel(logging.ERROR)
+            generate_raw_data(Path(tmp_dir) / "raw", n_days=args.days)
+            output_dir = Path(tmp_dir) / "output"
+            assert run_etl(Path(tmp_dir) / "raw", output_dir)
+        
+        results = {mode: run_mode(mode, output_dir, args.workers) for mode in MODES}
+        sizes = {name: (output_dir / name).stat().st_size for name in DATA_FILES if (output_dir / name).exists()}
+    
+    summary = {mode: summarize(workers) for mode, workers in results.items()}
+    print(f"{results['parquet'][0]['rows']} rows, {args.workers} workers")
+    print(f"{'mode':<8} {'cold load':>10} {'warm load':>10} {'1st scan':>9} {'RSS/worker':>11} "
+          f"{'anon/worker':>12} {'total PSS':>10}")
+    for mode, s in summary.items():
+        warm = f"{s['warm_load_seconds']:>9.3f}s" if s["warm_load_seconds"] is not None else f"{'-':>10}"
+        print(f"{mode:<8} {s['cold_load_seconds']:>9.3f}s {warm} {s['first_scan_seconds']:>8.3f}s "
+              f"{s['mean_rss_mb']:>8.1f} MB {s['mean_rss_anon_mb']:>9.1f} MB {s['total_pss_mb']:>7.1f} MB")
+    if args.json:
+        args.json.write_text(json.dumps({"file_bytes": sizes, "summary": summary, "workers": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark the key-encoded source merge against the previous DataFrame.merge
+join on ["date", "country", "iso3"].
+
+Usage:
+    python benchmarks/bench_merge.py --countries 200 --days 1100
+"""
+
+from datetime import date, timedelta
+from pathlib import Path
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+from bench_utils import measure
+from transform_utils import ISO3_DISPLAY_NAMES, VACCINATION_COLUMNS, merge_sources
+
+
+def legacy_merge(cases_df: pd.DataFrame, deaths_df: pd.DataFrame, vacc_df: pd.DataFrame) -> pd.DataFrame:
+    """The object-key merge used before the key-encoded join."""
+    merged = cases_df.merge(deaths_df, on=["date", "country", "iso3"], how="outer")
+    merged = merged.merge(vacc_df, on=["date", "country", "iso3"], how="left")
+    return merged.sort_values(["iso3", "date"]).reset_index(drop=True)
+
+
+def make_sources(n_countries: int, n_days: int, seed: int = 0):
+    """Long frames shaped like the source stage outputs (date objects, object strings)."""
+    rng = np.random.default_rng(seed)
+    iso3 = sorted(ISO3_DISPLAY_NAMES)[:n_countries]
+    iso3 += [f"X{i:02d}" for i in range(n_countries - len(iso3))]
+    dates = [date(2020, 1, 22) + timedelta(days=i) for i in range(n_days)]
+    
+    def frame(cols, first_day=0):
+        n = n_days - first_day
+        df = pd.DataFrame({
+            "date": np.tile(np.array(dates[first_day:], dtype=object), len(iso3)),
+            "country": np.repeat([ISO3_DISPLAY_NAMES.get(code, code) for code in iso3], n),
+            "iso3": np.repeat(iso3, n),
+        })
+        for col in cols:
+            df[col] = rng.integers(0, 10 ** 6, len(df)).astype(np.float64)
+        return df
+    
+    # Vaccinations start about a year into the series, as in the OWID data
+    return frame(["confirmed_cases"]), frame(["deaths"]), frame(VACCINATION_COLUMNS, min(330, n_days - 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the source merge")
+    parser.add_argument("--countries", type=int, default=200)
+    parser.add_argument("--days", type=int, default=1100)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    args = parser.parse_args()
+    
+    sources = make_sources(args.countries, args.days)
+    legacy, legacy_stats = measure(legacy_merge, *sources, repeat=args.repeat)
+    keyed, keyed_stats = measure(merge_sources, *sources, repeat=args.repeat)
+    
+    # Same rows and values; only the date dtype differs
+    legacy["date"] = pd.to_datetime(legacy["date"])
+    pd.testing.assert_frame_equal(legacy, keyed)
+    
+    results = {
+        "countries": args.countries,
+        "days": args.days,
+        "rows": len(keyed),
+        "legacy_merge": legacy_stats,
+        "key_merge": keyed_stats,
+        "speedup": round(legacy_stats["seconds"] / keyed_stats["seconds"], 2),
+    }
+    print(f"{results['rows']} rows")
+    for name in ["legacy_merge", "key_merge"]:
+        print(f"  {name:<13} {results[name]['seconds']:>8.3f}s  peak {results[name]['peak_mb']:>8.1f} MB")
+    print(f"  speedup       {results['speedup']:>8.2f}x")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Shared helpers for the benchmark scripts.
+"""
+
+from pathlib import Path
+from typing import Dict, Optional
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(REPO_ROOT / "etl"))
+
+
+def measure(func, *args, repeat: int = 3):
+    """
+    Run func(*args) and return (result, stats): the best wall time over
+    repeat runs and the tracemalloc peak of one extra traced run.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": round(min(timings), 4), "peak_mb": round(peak / 1024 ** 2, 1)}
+
+
+def git_commit() -> Optional[str]:
+    """Short hash of the checked-out commit, if this is a git checkout."""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    """Versions that affect benchmark numbers."""
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+    }
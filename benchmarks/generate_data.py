@@ -0,0 +1,173 @@
+"""
+Synthetic JHU/OWID raw data generator for ETL benchmarks.
+
+Writes CONVENIENT_global_confirmed_cases.csv, CONVENIENT_global_deaths.csv
+and country_vaccinations.csv in the layout of the real inputs, at a
+configurable number of countries, days and province columns, with the
+usual upstream noise: empty cells, negative values, cumulative counts that
+decrease for a day, unmapped regions and missing vaccination reports.
+
+Usage:
+    python benchmarks/generate_data.py --output-dir /tmp/raw --countries 190 --days 1100
+"""
+
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "etl"))
+
+from transform_utils import ISO3_DISPLAY_NAMES
+from stages import SOURCE_FILES
+
+logger = logging.getLogger(__name__)
+
+START_DATE = date(2020, 1, 22)
+
+# Regions the ISO3 mapping does not know, present in the real JHU files
+UNMAPPED_REGIONS = ["Diamond Princess", "MS Zaandam", "Summer Olympics 2020", "Winter Olympics 2022"]
+
+# Columns of the OWID vaccinations file, in upstream order
+OWID_COLUMNS = [
+    "country", "iso_code", "date", "total_vaccinations", "people_vaccinated",
+    "people_fully_vaccinated", "daily_vaccinations_raw", "daily_vaccinations", "vaccines",
+]
+
+
+def country_names(n_countries: int) -> List[str]:
+    """
+    n_countries column names: the display names of the ISO3 mapping, then
+    synthetic names the mapping does not know. Like the real files' unmapped
+    columns, those are read and skipped by the transform.
+    """
+    names = sorted(ISO3_DISPLAY_NAMES.values())[:n_countries]
+    return names + [f"Country {i:03d}" for i in range(len(names), n_countries)]
+
+
+def _cumulative(rng: np.random.Generator, n_days: int, n_cols: int, scale: np.ndarray) -> np.ndarray:
+    """Cumulative counts per column following a noisy logistic outbreak curve."""
+    t = np.arange(n_days)[:, None]
+    midpoint = rng.uniform(0.2, 0.8, n_cols) * n_days
+    steepness = rng.uniform(4, 12, n_cols) / n_days
+    curve = scale / (1 + np.exp(-steepness * (t - midpoint)))
+    daily = rng.poisson(np.maximum(np.diff(curve, axis=0, prepend=0), 0))
+    return np.cumsum(daily, axis=0).astype(np.float64)
+
+
+def _add_noise(rng: np.random.Generator, values: np.ndarray, gap_rate: float, negative_rate: float,
+               decrease_rate: float) -> np.ndarray:
+    """Punch gaps, negative values and one-day decreases into cumulative counts."""
+    values = values.copy()
+    decrease = rng.random(values.shape) < decrease_rate
+    values[decrease] = np.floor(values[decrease] * rng.uniform(0.5, 0.95, decrease.sum()))
+    negative = rng.random(values.shape) < negative_rate
+    values[negative] = -rng.integers(1, 100, negative.sum())
+    values[rng.random(values.shape) < gap_rate] = np.nan
+    return values
+
+
+def _write_wide_csv(path: Path, header: List[str], provinces: List[str], dates: List[date],
+                    values: np.ndarray) -> None:
+    """Write a CONVENIENT-style wide file: country header, province row, one row per date."""
+    frame = pd.DataFrame(values, columns=range(values.shape[1])).astype("Int64")
+    frame.insert(0, "date", [f"{d.month}/{d.day}/{d.year % 100}" for d in dates])
+    with open(path, "w", newline="") as f:
+        f.write(",".join(["Country/Region"] + header) + "\n")
+        f.write(",".join(["Province/State"] + provinces) + "\n")
+        frame.to_csv(f, header=False, index=False)
+
+
+def generate_raw_data(output_dir: Path, n_countries: int = 190, n_days: int = 1100,
+                      province_countries: int = 8, provinces: int = 10, gap_rate: float = 0.01,
+                      negative_rate: float = 0.001, decrease_rate: float = 0.002,
+                      vaccination_start: int = 330, seed: int = 0) -> Dict[str, Path]:
+    """
+    Write the three raw input files to output_dir and return their paths
+    keyed by source. The first province_countries countries are split into
+    provinces columns each, as Australia, China or Canada are upstream.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = [START_DATE + timedelta(days=i) for i in range(n_days)]
+    
+    header, province_row = [], []
+    for i, name in enumerate(country_names(n_countries)):
+        n_provinces = provinces if i < province_countries else 1
+        header += [name] * n_provinces
+        province_row += [f"{name} Province {p + 1}" for p in range(n_provinces)] if n_provinces > 1 else [""]
+    header += UNMAPPED_REGIONS
+    province_row += [""] * len(UNMAPPED_REGIONS)
+    
+    scale = 10 ** rng.uniform(3, 7, len(header))
+    cases = _cumulative(rng, n_days, len(header), scale)
+    deaths = np.floor(cases * rng.uniform(0.005, 0.03, len(header)))
+    paths = {source: output_dir / name for source, name in SOURCE_FILES.items()}
+    for source, values in [("cases", cases), ("deaths", deaths)]:
+        noisy = _add_noise(rng, values, gap_rate, negative_rate, decrease_rate)
+        _write_wide_csv(paths[source], header, province_row, dates, noisy)
+    
+    # Vaccination reports start partway through the series
+    write_vaccinations(paths["vaccinations"], country_names(n_countries),
+                       dates[min(vaccination_start, n_days // 2):], rng, gap_rate)
+    logger.info(f"Wrote {n_days} days x {len(header)} columns to {output_dir}")
+    return paths
+
+
+def write_vaccinations(path: Path, countries: List[str], dates: List[date], rng: np.random.Generator,
+                       gap_rate: float = 0.01, report_rate: float = 0.7) -> None:
+    """Write an OWID-style long vaccinations file; countries skip some report days."""
+    n_days = len(dates)
+    population = 10 ** rng.uniform(5, 9, len(countries))
+    people = _cumulative(rng, n_days, len(countries), population * rng.uniform(0.4, 0.9, len(countries)))
+    fully = np.floor(people * rng.uniform(0.6, 0.95, len(countries)))
+    total = people + fully
+    daily = np.diff(total, axis=0, prepend=total[:1])
+    iso3_by_name = {name: iso3 for iso3, name in ISO3_DISPLAY_NAMES.items()}
+    
+    frame = pd.DataFrame({
+        "country": np.repeat(countries, n_days),
+        "iso_code": np.repeat([iso3_by_name.get(name, f"OWID_{i:03d}") for i, name in enumerate(countries)], n_days),
+        "date": np.tile([d.isoformat() for d in dates], len(countries)),
+        "total_vaccinations": total.T.ravel(),
+        "people_vaccinated": people.T.ravel(),
+        "people_fully_vaccinated": fully.T.ravel(),
+        "daily_vaccinations_raw": daily.T.ravel(),
+        "daily_vaccinations": pd.DataFrame(daily).rolling(7, min_periods=1).mean().round().to_numpy().T.ravel(),
+        "vaccines": "Pfizer/BioNTech, Moderna",
+    })
+    metrics = OWID_COLUMNS[3:8]
+    frame[metrics] = frame[metrics].mask(rng.random((len(frame), len(metrics))) < gap_rate)
+    frame = frame[rng.random(len(frame)) < report_rate]
+    frame[metrics] = frame[metrics].astype("Int64")
+    frame[OWID_COLUMNS].to_csv(path, index=False)
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Generate synthetic JHU/OWID raw ETL inputs")
+    parser.add_argument("--output-dir", type=Path, required=True)
+    parser.add_argument("--countries", type=int, default=190)
+    parser.add_argument("--days", type=int, default=1100)
+    parser.add_argument("--province-countries", type=int, default=8,
+                        help="Number of countries reported per province")
+    parser.add_argument("--provinces", type=int, default=10, help="Province columns per such country")
+    parser.add_argument("--gap-rate", type=float, default=0.01)
+    parser.add_argument("--negative-rate", type=float, default=0.001)
+    parser.add_argument("--decrease-rate", type=float, default=0.002)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = parse_args()
+    generate_raw_data(args.output_dir, n_countries=args.countries, n_days=args.days,
+                      province_countries=args.province_countries, provinces=args.provinces,
+                      gap_rate=args.gap_rate, negative_rate=args.negative_rate,
+                      decrease_rate=args.decrease_rate, seed=args.seed)
@@ -0,0 +1,167 @@
+"""
+ETL benchmark runner.
+
+Generates synthetic raw inputs (or uses --raw-dir), times every ETL stage
+and the full pipeline, and records wall time, tracemalloc peak and row
+counts per stage into a JSON results file, together with the per-stage
+run report of the full pipeline run. Pass --compare with an earlier
+results file to print the change per stage.
+
+Usage:
+    python benchmarks/run_benchmarks.py --days 1100 --output benchmarks/results/latest.json
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import tempfile
+
+import pandas as pd
+
+from bench_utils import environment, git_commit, measure
+from generate_data import generate_raw_data
+from transform_utils import (
+    apply_compact_schema,
+    fix_monotonicity,
+    jhu_long_format,
+    load_and_transform_jhu,
+    load_and_transform_vaccinations,
+    long_format_timeseries,
+    merge_sources,
+    read_jhu_wide,
+    repair_monotonicity,
+    validate_data,
+)
+from dataset_writer import write_timeseries_parquet
+from instrumentation import REPORT_NAME
+from quality import profile_quality
+from run_etl import run_etl
+from stages import SOURCE_FILES
+from streaming import stream_jhu_source
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTPUT = Path(__file__).parent / "results" / "latest.json"
+
+
+def _rows(result) -> Optional[int]:
+    if isinstance(result, tuple):
+        result = result[0]
+    return len(result) if isinstance(result, (pd.DataFrame, pd.Series)) else None
+
+
+def benchmark_stages(raw_dir: Path, work_dir: Path, repeat: int = 1) -> Dict[str, Dict]:
+    """Time each ETL stage on the raw files in raw_dir; returns stats per stage."""
+    paths = {source: str(Path(raw_dir) / name) for source, name in SOURCE_FILES.items()}
+    results: Dict[str, Dict] = {}
+    
+    def stage(name, func, *args, rows_in=None):
+        result, stats = measure(func, *args, repeat=repeat)
+        results[name] = dict(stats, rows_in=rows_in, rows_out=_rows(result))
+        logger.info(f"{name:<24} {stats['seconds']:>8.3f}s  peak {stats['peak_mb']:>8.1f} MB")
+        return result
+    
+    raw_cases = stage("read_csv", pd.read_csv, paths["cases"])
+    long_cases = stage("long_format_timeseries", long_format_timeseries, raw_cases, "confirmed_cases",
+                       rows_in=int(raw_cases.size))
+    wide_cases = stage("read_jhu_wide", read_jhu_wide, paths["cases"])
+    stage("jhu_long_format", jhu_long_format, wide_cases, "confirmed_cases", rows_in=int(wide_cases.values.size))
+    stage("fix_monotonicity", lambda df: df.groupby("iso3")["confirmed_cases"].transform(fix_monotonicity),
+          long_cases, rows_in=len(long_cases))
+    stage("repair_monotonicity", repair_monotonicity, long_cases, ["confirmed_cases"], rows_in=len(long_cases))
+    cases = stage("load_cases", load_and_transform_jhu, paths["cases"], "confirmed_cases")
+    stage("stream_cases", stream_jhu_source, paths["cases"], "confirmed_cases",
+          Path(work_dir) / "cases_streamed.parquet")
+    deaths = stage("load_deaths", load_and_transform_jhu, paths["deaths"], "deaths")
+    vacc = stage("load_vaccinations", load_and_transform_vaccinations, paths["vaccinations"])
+    merged = stage("merge_sources", merge_sources, cases, deaths, vacc,
+                   rows_in=len(cases) + len(deaths) + len(vacc))
+    stage("validate_data", validate_data, merged, rows_in=len(merged))
+    stage("profile_quality", profile_quality, merged, rows_in=len(merged))
+    compact = stage("apply_compact_schema", apply_compact_schema, merged, rows_in=len(merged))
+    stage("write_parquet", write_timeseries_parquet, compact, Path(work_dir) / "timeseries.parquet",
+          rows_in=len(compact))
+    stage("run_etl", run_etl, Path(raw_dir), Path(work_dir) / "output")
+    
+    # run_etl's own per-stage report for the last run, including worker sub-stages
+    report = json.loads((Path(work_dir) / "output" / REPORT_NAME).read_text())
+    results["run_etl"]["stages"] = {
+        record["stage"]: {key: record.get(key) for key in ["wall_seconds", "cpu_seconds", "max_rss_mb",
+                                                             "rows_in", "rows_out"]}
+        for record in report["stages"]
+    }
+    return results
+
+
+def compare(current: Dict, baseline: Dict) -> List[str]:
+    """Per-stage time and peak memory ratios of current against baseline."""
+    lines = [f"{'stage':<24} {'seconds':>18} {'ratio':>7} {'peak MB':>18} {'ratio':>7}"]
+    for name, stats in current["stages"].items():
+        base = baseline["stages"].get(name)
+        if base is None:
+            lines.append(f"{name:<24} {stats['seconds']:>18.3f} {'new':>7}")
+            continue
+        time_ratio = stats["seconds"] / base["seconds"] if base["seconds"] else float("nan")
+        peak_ratio = stats["peak_mb"] / base["peak_mb"] if base["peak_mb"] else float("nan")
+        lines.append(f"{name:<24} {base['seconds']:>8.3f} -> {stats['seconds']:<6.3f} {time_ratio:>7.2f} "
+                     f"{base['peak_mb']:>8.1f} -> {stats['peak_mb']:<6.1f} {peak_ratio:>7.2f}")
+    return lines
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the ETL stages")
+    parser.add_argument("--raw-dir", type=Path, help="Benchmark existing raw files instead of generating them")
+    parser.add_argument("--countries", type=int, default=190)
+    parser.add_argument("--days", type=int, default=1100)
+    parser.add_argument("--province-countries", type=int, default=8)
+    parser.add_argument("--provinces", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="Timed runs per stage (best is kept)")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT, help="Results JSON file")
+    parser.add_argument("--compare", type=Path, help="Earlier results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    args = parse_args(argv)
+    # The pipeline's own logging (e.g. unmapped columns) would drown the stage timings
+    logging.getLogger().setLevel(logging.ERROR)
+    logger.setLevel(logging.INFO)
+    
+    params = {"countries": args.countries, "days": args.days, "province_countries": args.province_countries,
+              "provinces": args.provinces, "seed": args.seed, "repeat": args.repeat}
+    with tempfile.TemporaryDirectory(prefix="etl_bench_") as tmp_dir:
+        raw_dir = args.raw_dir
+        if raw_dir is None:
+            raw_dir = Path(tmp_dir) / "raw"
+            generate_raw_data(raw_dir, n_countries=args.countries, n_days=args.days,
+                              province_countries=args.province_countries, provinces=args.provinces,
+                              seed=args.seed)
+        else:
+            params = {"raw_dir": str(raw_dir), "repeat": args.repeat}
+        input_bytes = {source: (Path(raw_dir) / name).stat().st_size for source, name in SOURCE_FILES.items()}
+        stages = benchmark_stages(raw_dir, Path(tmp_dir), repeat=args.repeat)
+    
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "environment": environment(),
+        "params": params,
+        "input_bytes": input_bytes,
+        "stages": stages,
+    }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    args.output.write_text(json.dumps(results, indent=2))
+    print(f"Wrote results to {args.output}")
+    
+    if args.compare:
+        print("\n".join(compare(results, json.loads(args.compare.read_text()))))
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""
+Partitioned Parquet dataset, Arrow IPC (Feather) and dense matrix outputs of the
+merged timeseries.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import feather
+
+logger = logging.getLogger(__name__)
+
+DATASET_DIR_NAME = "timeseries_dataset"
+MATRIX_DIR_NAME = "matrices"
+# Leading underscore keeps pyarrow.dataset discovery from treating it as data
+MANIFEST_NAME = "_manifest.json"
+
+# Rows per row group; a few years of daily data per country fits in one
+DEFAULT_ROW_GROUP_SIZE = 64 * 1024
+
+
+def to_arrow_table(df: pd.DataFrame, plain_string_cols: Iterable[str] = ()) -> pa.Table:
+    """
+    Convert a timeseries frame to Arrow: dates as date32 and string columns
+    dictionary-encoded, except plain_string_cols (e.g. partition keys).
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(table.schema):
+        column = table.column(i)
+        if field.name == "date" and pa.types.is_timestamp(field.type):
+            column = column.cast(pa.date32())
+        elif field.name in plain_string_cols and pa.types.is_dictionary(field.type):
+            column = column.cast(pa.string())
+        elif pa.types.is_string(field.type) and field.name not in plain_string_cols:
+            column = column.dictionary_encode()
+        table = table.set_column(i, field.name, column)
+    return table
+
+
+def write_timeseries_parquet(df: pd.DataFrame, path: Path) -> None:
+    """
+    Write a timeseries frame as a single parquet file with the compact Arrow
+    types. The file is replaced atomically, so readers never see it half-written.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    pq.write_table(to_arrow_table(df), str(tmp_path), compression="snappy")
+    os.replace(tmp_path, path)
+
+
+class ParquetStreamWriter:
+    """
+    Append DataFrame chunks to one parquet file, a row group per chunk, as
+    pandas to_parquet would write them. Used as a context manager: the file
+    is written under a .tmp name and moved into place on a clean exit, and
+    removed on error.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self.rows = 0
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._empty: Optional[pd.DataFrame] = None
+    
+    def write(self, df: pd.DataFrame) -> None:
+        if df.empty:
+            self._empty = df
+            return
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(str(self.tmp_path), table.schema, compression="snappy")
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(df)
+    
+    def __enter__(self) -> "ParquetStreamWriter":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        if exc_type is not None:
+            self.tmp_path.unlink(missing_ok=True)
+            return
+        if self._writer is None:
+            empty = self._empty if self._empty is not None else pd.DataFrame()
+            pq.write_table(pa.Table.from_pandas(empty, preserve_index=False), str(self.tmp_path))
+        os.replace(self.tmp_path, self.path)
+
+
+def to_mmap_table(df: pd.DataFrame) -> pa.Table:
+    """
+    Convert a timeseries frame to Arrow laid out for zero-copy reads into
+    pandas: one record batch, dates as timestamp[ns], NaN kept as float
+    values instead of validity bitmaps, strings and categoricals as
+    dictionaries. Every column then maps onto a numpy array without copying.
+    """
+    arrays = []
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays.append(pa.DictionaryArray.from_arrays(
+                values.cat.codes.to_numpy(), pa.array(values.cat.categories.to_numpy(dtype=object))
+            ))
+        elif col == "date" or pd.api.types.is_datetime64_any_dtype(values):
+            arrays.append(pa.array(pd.to_datetime(values).to_numpy(dtype="datetime64[ns]")))
+        elif pd.api.types.is_numeric_dtype(values):
+            arrays.append(pa.array(values.to_numpy(), from_pandas=False))
+        else:
+            array = pa.array(values, from_pandas=True)
+            arrays.append(array.dictionary_encode() if pa.types.is_string(array.type) else array)
+    return pa.Table.from_arrays(arrays, names=list(df.columns))
+
+
+def write_timeseries_feather(df: pd.DataFrame, path: Path) -> None:
+    """
+    Write a timeseries frame as an uncompressed Arrow IPC (Feather v2) file
+    for memory-mapped loading. The file is replaced atomically, so readers
+    that still map the previous file keep a valid mapping.
+    """
+    _write_feather(to_mmap_table(df), Path(path))
+
+
+def _write_feather(table: pa.Table, path: Path) -> None:
+    """Write table uncompressed as a single record batch, replacing path atomically."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    feather.write_feather(table, str(tmp_path), compression="uncompressed", chunksize=max(len(table), 1))
+    os.replace(tmp_path, path)
+
+
+def write_metric_matrices(matrices: Dict[str, pd.DataFrame], output_dir: Path) -> Path:
+    """
+    Write each dense (date x country) matrix from date_grid.build_metric_matrices
+    to output_dir/matrices/<metric>.arrow, with the dates as the first column.
+    """
+    matrix_dir = Path(output_dir) / MATRIX_DIR_NAME
+    matrix_dir.mkdir(parents=True, exist_ok=True)
+    for metric, matrix in matrices.items():
+        _write_feather(to_mmap_table(matrix.reset_index()), matrix_dir / f"{metric}.arrow")
+    logger.info(f"Wrote {len(matrices)} metric matrices to {matrix_dir}")
+    return matrix_dir
+
+
+def read_metric_matrix(path: Path, from_date=None, to_date=None) -> pd.DataFrame:
+    """
+    Memory-map a metric matrix and return the rows from from_date to to_date
+    (inclusive), indexed by date. Rows are consecutive days, so the date
+    range is located by offset from the first date and read as a slice.
+    """
+    table = feather.read_table(str(path), memory_map=True)
+    if len(table) == 0:
+        return table.to_pandas().set_index("date")
+    first = pd.Timestamp(table.column("date")[0].as_py())
+    start = min(max((pd.Timestamp(from_date) - first).days, 0), len(table)) if from_date is not None else 0
+    stop = (pd.Timestamp(to_date) - first).days + 1 if to_date is not None else len(table)
+    stop = min(max(stop, start), len(table))
+    return table.slice(start, stop - start).to_pandas().set_index("date")
+
+
+def write_partitioned_dataset(df: pd.DataFrame, output_dir: Path, partition_by_year: bool = False,
+                              row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> Dict:
+    """
+    Write df as a partitioned dataset under output_dir/timeseries_dataset.
+    Any previous dataset in that directory is replaced. Returns the manifest.
+    """
+    dataset_dir = Path(output_dir) / DATASET_DIR_NAME
+    if dataset_dir.exists():
+        shutil.rmtree(dataset_dir)
+    
+    partition_cols = ["iso3", "year"] if partition_by_year else ["iso3"]
+    df = df.copy()
+    if partition_by_year:
+        df["year"] = pd.to_datetime(df["date"]).dt.year.astype("int16")
+    df = df.sort_values(partition_cols + ["date"], kind="mergesort")
+    
+    table = to_arrow_table(df, plain_string_cols=partition_cols)
+    partitioning = ds.partitioning(table.select(partition_cols).schema, flavor="hive")
+    file_options = ds.ParquetFileFormat().make_write_options(
+        compression="snappy", use_dictionary=True, write_statistics=True
+    )
+    ds.write_dataset(
+        table, dataset_dir, format="parquet", partitioning=partitioning,
+        file_options=file_options, basename_template="part-{i}.parquet",
+        max_rows_per_group=row_group_size, min_rows_per_group=min(row_group_size, 1024),
+    )
+    
+    manifest = build_manifest(df, partition_cols, table.schema)
+    (dataset_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    logger.info(f"Wrote partitioned dataset to {dataset_dir} "
+                f"({len(manifest['partitions'])} partitions, {manifest['row_count']} rows)")
+    return manifest
+
+
+def _date_str(value) -> str:
+    return str(pd.Timestamp(value).date())
+
+
+def build_manifest(df: pd.DataFrame, partition_cols: List[str], schema: pa.Schema) -> Dict:
+    """Describe every partition with its row count and date range."""
+    stats = df.groupby(partition_cols, sort=True, observed=True)["date"].agg(["size", "min", "max"]).reset_index()
+    partitions = []
+    for row in stats.itertuples(index=False):
+        keys = {col: getattr(row, col) for col in partition_cols}
+        path = "/".join(f"{col}={value}" for col, value in keys.items())
+        partitions.append({
+            "path": f"{path}/part-0.parquet",
+            **{col: (int(v) if col == "year" else v) for col, v in keys.items()},
+            "rows": int(row.size),
+            "min_date": _date_str(row.min),
+            "max_date": _date_str(row.max),
+        })
+    return {
+        "format": "parquet",
+        "partitioning": partition_cols,
+        "row_count": int(len(df)),
+        "min_date": _date_str(df["date"].min()) if len(df) else None,
+        "max_date": _date_str(df["date"].max()) if len(df) else None,
+        "schema": {field.name: str(field.type) for field in schema},
+        "partitions": partitions,
+    }
+
+
+def read_partitioned_dataset(dataset_dir: Path, iso3: Optional[str] = None,
+                             from_date=None, to_date=None) -> pd.DataFrame:
+    """
+    Read (part of) a partitioned dataset, pushing the country filter down to
+    partition pruning and the date range down to row-group statistics.
+    """
+    dataset = ds.dataset(str(dataset_dir), format="parquet", partitioning="hive")
+    condition = None
+    for expr in [
+        ds.field("iso3") == iso3 if iso3 is not None else None,
+        ds.field("date") >= pa.scalar(from_date, pa.date32()) if from_date is not None else None,
+        ds.field("date") <= pa.scalar(to_date, pa.date32()) if to_date is not None else None,
+    ]:
+        if expr is not None:
+            condition = expr if condition is None else condition & expr
+    return dataset.to_table(filter=condition).to_pandas()
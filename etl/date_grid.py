@@ -0,0 +1,113 @@
+"""
+Dense date-grid alignment of the merged timeseries: every country on one shared
+daily axis, with forward-filled cumulative metrics flagged as imputed.
+"""
+
+from typing import Dict, List, Optional
+import logging
+
+import numpy as np
+import pandas as pd
+
+from transform_utils import VACCINATION_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Metrics that only grow, so a missing day carries the last reported value
+CUMULATIVE_METRICS = ["confirmed_cases", "deaths", "total_vaccinations", "people_vaccinated",
+                      "people_fully_vaccinated"]
+
+# Metrics written as dense matrices by default
+MATRIX_METRICS = ["confirmed_cases", "deaths"] + VACCINATION_COLUMNS
+
+
+def imputed_column(metric: str) -> str:
+    return f"{metric}_imputed"
+
+
+def _forward_fill_rows(grid: np.ndarray) -> np.ndarray:
+    """Forward-fill NaN along axis 1 of a 2-D array; leading NaN stay NaN."""
+    positions = np.where(np.isnan(grid), 0, np.arange(grid.shape[1]))
+    np.maximum.accumulate(positions, axis=1, out=positions)
+    return grid[np.arange(grid.shape[0])[:, None], positions]
+
+
+def align_to_date_grid(df: pd.DataFrame, cumulative_cols: Optional[List[str]] = None,
+                       group_col: str = "iso3", date_col: str = "date") -> pd.DataFrame:
+    """
+    Return df with one row per (group_col, day) over the frame's full date
+    range, sorted by [group_col, date_col]. Columns in cumulative_cols
+    (default CUMULATIVE_METRICS present in df) are forward-filled and get a
+    boolean <metric>_imputed flag; other numeric columns are placed on the
+    grid as they are. Raises ValueError on duplicate (group_col, date_col) keys.
+    """
+    if cumulative_cols is None:
+        cumulative_cols = [col for col in CUMULATIVE_METRICS if col in df.columns]
+    codes, groups = pd.factorize(df[group_col].to_numpy(dtype=object), sort=True)
+    codes = codes.astype(np.int64)
+    days = pd.to_datetime(df[date_col]).to_numpy().astype("datetime64[D]").astype(np.int64)
+    start = days.min() if len(days) else 0
+    n_days = int(days.max() - start + 1) if len(days) else 0
+    n_groups = len(groups)
+    
+    cells = codes * n_days + (days - start)
+    if len(np.unique(cells)) < len(cells):
+        raise ValueError(f"Duplicate ({group_col}, {date_col}) keys, cannot align to a date grid")
+    
+    result = pd.DataFrame({
+        date_col: np.tile(np.arange(start, start + n_days).astype("datetime64[D]").astype("datetime64[ns]"),
+                          n_groups),
+        group_col: np.repeat(np.asarray(groups, dtype=object), n_days),
+    })
+    # Carry other labels (e.g. country) from each group's first row
+    _, first_rows = np.unique(codes, return_index=True)
+    for col in df.columns:
+        if col not in (date_col, group_col) and not pd.api.types.is_numeric_dtype(df[col]):
+            labels = df[col].to_numpy(dtype=object)[first_rows]
+            result[col] = np.repeat(labels, n_days)
+    
+    filled_total = 0
+    for col in df.columns:
+        if col in (date_col, group_col) or not pd.api.types.is_numeric_dtype(df[col]):
+            continue
+        grid = np.full(n_groups * n_days, np.nan)
+        grid[cells] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        if col in cumulative_cols:
+            grid = grid.reshape(n_groups, n_days)
+            filled = _forward_fill_rows(grid)
+            imputed = np.isnan(grid) & ~np.isnan(filled)
+            result[col] = filled.ravel()
+            result[imputed_column(col)] = imputed.ravel()
+            filled_total += int(imputed.sum())
+        else:
+            result[col] = grid
+    
+    logger.info(f"Aligned {n_groups} countries to {n_days} days: {len(df)} -> {len(result)} rows, "
+                f"{filled_total} cumulative cells forward-filled")
+    return result
+
+
+def build_metric_matrices(df: pd.DataFrame, metrics: Optional[List[str]] = None,
+                          group_col: str = "iso3", date_col: str = "date") -> Dict[str, pd.DataFrame]:
+    """
+    Dense (date x country) matrix per metric from a frame produced by
+    align_to_date_grid: a DataFrame indexed by date with one float64 column
+    per country. Raises ValueError if df is not on a dense date grid.
+    """
+    if metrics is None:
+        metrics = [col for col in MATRIX_METRICS if col in df.columns]
+    df = df.sort_values([group_col, date_col], kind="mergesort")
+    groups = pd.unique(df[group_col].to_numpy(dtype=object))
+    n_days = len(df) // len(groups) if len(groups) else 0
+    days = pd.to_datetime(df[date_col]).to_numpy().astype("datetime64[D]").astype(np.int64)
+    if len(df) != len(groups) * n_days or len(df) and not (
+        (days.reshape(len(groups), n_days) == days[0] + np.arange(n_days)).all()
+    ):
+        raise ValueError("Frame is not on a dense date grid; run align_to_date_grid first")
+    
+    dates = pd.DatetimeIndex(pd.to_datetime(df[date_col].iloc[:n_days]).to_numpy(), name=date_col)
+    matrices = {}
+    for metric in metrics:
+        values = df[metric].to_numpy(dtype=np.float64, na_value=np.nan).reshape(len(groups), n_days)
+        matrices[metric] = pd.DataFrame(values.T, index=dates, columns=[str(g) for g in groups])
+    return matrices
@@ -0,0 +1,71 @@
+"""
+Derived metrics (daily new values, rolling means, week-over-week growth, case
+fatality ratio) computed from the repaired cumulative series.
+"""
+
+from typing import List
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Cumulative source column -> daily new column
+DAILY_NEW_METRICS = {
+    "confirmed_cases": "new_cases",
+    "deaths": "new_deaths",
+}
+
+ROLLING_WINDOWS = [7, 14]
+
+# Every column added by add_derived_metrics, in output order
+DERIVED_METRICS: List[str] = [
+    name
+    for new_col in DAILY_NEW_METRICS.values()
+    for name in [new_col] + [f"{new_col}_{window}d_avg" for window in ROLLING_WINDOWS] + [f"{new_col}_wow_growth"]
+] + ["case_fatality_ratio"]
+
+
+def add_derived_metrics(df: pd.DataFrame, group_col: str = "iso3", date_col: str = "date") -> pd.DataFrame:
+    """
+    Return df sorted by [group_col, date_col] with DERIVED_METRICS added:
+
+    - new_cases / new_deaths: day-over-day difference of the cumulative
+      series (NaN on a country's first row or next to a missing value)
+    - <new>_7d_avg / <new>_14d_avg: trailing rolling means, NaN until the
+      window is full
+    - <new>_wow_growth: 7-day mean over the 7-day mean a week earlier, minus 1
+      (NaN when the earlier mean is 0)
+    - case_fatality_ratio: deaths / confirmed_cases (NaN without cases)
+    """
+    df = df.sort_values([group_col, date_col], kind="mergesort").reset_index(drop=True)
+    groups = df[group_col].to_numpy()
+    # Rows that start a new group must not be differenced against the previous group
+    first_in_group = np.ones(len(df), dtype=bool)
+    first_in_group[1:] = groups[1:] != groups[:-1]
+    group_keys = pd.Series(np.cumsum(first_in_group))
+    
+    for cumulative, new_col in DAILY_NEW_METRICS.items():
+        values = df[cumulative].to_numpy(dtype=np.float64, na_value=np.nan)
+        new = np.empty_like(values)
+        new[1:] = values[1:] - values[:-1]
+        new[first_in_group] = np.nan
+        df[new_col] = new
+        
+        grouped = pd.Series(new).groupby(group_keys, sort=False)
+        for window in ROLLING_WINDOWS:
+            rolled = grouped.rolling(window, min_periods=window).mean()
+            df[f"{new_col}_{window}d_avg"] = rolled.reset_index(level=0, drop=True).sort_index().to_numpy()
+        
+        weekly = pd.Series(df[f"{new_col}_7d_avg"].to_numpy())
+        previous = weekly.groupby(group_keys, sort=False).shift(7)
+        df[f"{new_col}_wow_growth"] = (weekly / previous.where(previous != 0) - 1).to_numpy()
+    
+    cases = df["confirmed_cases"].to_numpy(dtype=np.float64, na_value=np.nan)
+    deaths = df["deaths"].to_numpy(dtype=np.float64, na_value=np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df["case_fatality_ratio"] = np.where(cases > 0, deaths / cases, np.nan)
+    
+    logger.info(f"Added {len(DERIVED_METRICS)} derived metrics for {int(first_in_group.sum())} countries")
+    return df
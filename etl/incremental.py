@@ -0,0 +1,160 @@
+"""
+Incremental ETL helpers - transform only the dates added since each source's
+last output. Revisions of already-published dates need a full rebuild.
+"""
+
+from datetime import date
+from pathlib import Path
+from typing import Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import stage
+from transform_utils import (
+    DateNormalizer,
+    ISO3_RESOLVER,
+    VACCINATION_COLUMNS,
+    JHUWideTable,
+    jhu_long_format,
+    read_jhu_wide,
+    read_vaccinations_raw,
+    repair_jhu_series,
+    transform_jhu_wide,
+    transform_vaccinations,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def read_existing_output(path: Path) -> Optional[pd.DataFrame]:
+    """Read a previous run's per-source output, or None if there is none."""
+    if not path.exists():
+        return None
+    return pd.read_parquet(path)
+
+
+def read_high_water_mark(existing: Optional[pd.DataFrame]) -> Optional[date]:
+    """Latest date already present in a source output."""
+    if existing is None or existing.empty:
+        return None
+    return existing["date"].max()
+
+
+def _repair_overlap(existing: pd.DataFrame, metric_col: str) -> pd.Series:
+    """
+    Mask of existing rows to re-run through the repair with the new rows.
+
+    For most series the last repaired row is enough: it holds the running
+    maximum (and the forward-fill value). Series with no valid value yet are
+    re-repaired in full, since new values backfill their whole history.
+    Series are keyed by Country/Region, as repair_jhu_series repairs them.
+    """
+    last_rows = ~existing.duplicated("country", keep="last")
+    has_value = existing[metric_col].notna().groupby(existing["country"]).transform("any")
+    return last_rows | ~has_value
+
+
+def _transform_full(wide: JHUWideTable, metric_col: str,
+                    date_normalizer: DateNormalizer) -> Tuple[pd.DataFrame, int, pd.DataFrame]:
+    """Reshape and repair a whole wide table; returns it, its row count and the repair report."""
+    long_df, repair_report = transform_jhu_wide(wide, metric_col, date_normalizer)
+    return long_df, len(long_df), repair_report
+
+
+def update_jhu_source(raw_path: str, metric_col: str, existing: Optional[pd.DataFrame],
+                      date_normalizer: DateNormalizer, return_repair_report: bool = False):
+    """
+    Bring a cases/deaths long frame up to date with a wide JHU CSV.
+    Returns the updated frame and the number of new rows transformed, plus
+    with return_repair_report the points repaired in this run per country.
+    """
+    result = _update_jhu_source(raw_path, metric_col, existing, date_normalizer)
+    return result if return_repair_report else result[:2]
+
+
+def _update_jhu_source(raw_path: str, metric_col: str, existing: Optional[pd.DataFrame],
+                       date_normalizer: DateNormalizer) -> Tuple[pd.DataFrame, int, pd.DataFrame]:
+    with stage("read_csv") as record:
+        wide = read_jhu_wide(raw_path)
+        record["rows_out"] = len(wide.dates)
+    hwm = read_high_water_mark(existing)
+    if hwm is None:
+        logger.info(f"No previous {metric_col} output, transforming full history")
+        return _transform_full(wide, metric_col, date_normalizer)
+    
+    # Countries are matched on their Country/Region name, so a province
+    # column added to a known country only counts from the new dates on
+    known = set(existing["country"].unique())
+    is_known = np.array([c in known for c in wide.countries], dtype=bool)
+    
+    # New countries that share an ISO3 with existing rows would interleave
+    # with already-published history; rebuild the source in that case
+    existing_iso3 = set(existing["iso3"].unique())
+    if any(ISO3_RESOLVER.resolve(c) in existing_iso3 for c in wide.countries[~is_known]):
+        logger.info(f"New {metric_col} columns map to existing countries, transforming full history")
+        return _transform_full(wide, metric_col, date_normalizer)
+    
+    row_dates = date_normalizer.normalize_many(pd.Series(wide.dates, dtype=object).astype(str))
+    is_new_row = np.array([d is not None and d > hwm for d in row_dates], dtype=bool)
+    
+    with stage("reshape", rows_in=int(wide.values[is_new_row].size)) as record:
+        parts = [jhu_long_format(wide.select(is_new_row, is_known), metric_col, date_normalizer)]
+        if not is_known.all():
+            logger.info(f"Transforming full history for {int((~is_known).sum())} new {metric_col} columns")
+            parts.append(jhu_long_format(wide.select(cols=~is_known), metric_col, date_normalizer))
+        delta = pd.concat(parts, ignore_index=True)
+        record["rows_out"] = len(delta)
+    if delta.empty:
+        return existing, 0, pd.DataFrame(columns=[metric_col], dtype=np.int64)
+    
+    existing = existing.reset_index(drop=True)
+    overlap = _repair_overlap(existing, metric_col)
+    with stage("repair_monotonicity", rows_in=int(overlap.sum()) + len(delta)) as record:
+        repaired, repair_report = repair_jhu_series(pd.concat([existing[overlap], delta], ignore_index=True),
+                                                    metric_col)
+        record["rows_out"] = len(repaired)
+    
+    updated = pd.concat([existing[~overlap], repaired], ignore_index=True)
+    return updated.sort_values(["iso3", "date"]), len(delta), repair_report
+
+
+def update_vaccinations_source(raw_path: str, existing: Optional[pd.DataFrame],
+                               date_normalizer: DateNormalizer, return_misses: bool = False):
+    """
+    Bring the vaccinations frame up to date with the OWID CSV, using a
+    high-water mark per ISO3. Returns the updated frame and new row count,
+    with return_misses also the raw country names without an ISO3 mapping.
+    """
+    raw_df, misses = read_vaccinations_raw(raw_path, date_normalizer, return_misses=True)
+    result = _apply_vaccinations_delta(raw_df, existing)
+    return result + (misses,) if return_misses else result
+
+
+def _apply_vaccinations_delta(raw_df: pd.DataFrame, existing: Optional[pd.DataFrame]) -> Tuple[pd.DataFrame, int]:
+    if existing is None or existing.empty:
+        logger.info("No previous vaccinations output, transforming full history")
+        with stage("transform", rows_in=len(raw_df)) as record:
+            result = transform_vaccinations(raw_df)
+            record["rows_out"] = len(result)
+        return result, len(result)
+    
+    hwm = existing.groupby("iso3")["date"].max()
+    row_hwm = raw_df["iso3"].map(hwm)
+    is_new_row = row_hwm.isna() | (raw_df["date"] > row_hwm.fillna(date.min))
+    delta = raw_df[is_new_row.to_numpy(dtype=bool)]
+    if delta.empty:
+        return existing, 0
+    
+    # The last published row per country carries the forward-fill state
+    existing = existing.reset_index(drop=True)
+    last_rows = existing[~existing.duplicated("iso3", keep="last") & existing["iso3"].isin(delta["iso3"])]
+    combined = pd.concat([last_rows.assign(_overlap=True), delta.assign(_overlap=False)], ignore_index=True)
+    with stage("transform", rows_in=len(combined)) as record:
+        filled = transform_vaccinations(combined, extra_cols=["_overlap"])
+        filled = filled[~filled["_overlap"]].drop(columns=["_overlap"])
+        record["rows_out"] = len(filled)
+    
+    updated = pd.concat([existing, filled], ignore_index=True)
+    return updated.sort_values(["iso3", "date"])[["date", "country", "iso3"] + VACCINATION_COLUMNS], len(filled)
@@ -0,0 +1,156 @@
+"""
+Per-stage instrumentation for the ETL pipeline: wall/CPU time, peak memory and
+rows per stage, with optional cProfile dumps.
+"""
+
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import cProfile
+import json
+import logging
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+REPORT_NAME = "run_report.json"
+PROFILE_DIR_NAME = "profiles"
+
+
+def max_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MB."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(rss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+class StageRecorder:
+    """Collects one measurement record per (possibly nested) stage."""
+    
+    def __init__(self, trace_memory: bool = False, profile_dir: Optional[Path] = None):
+        self.trace_memory = trace_memory
+        self.profile_dir = Path(profile_dir) if profile_dir is not None else None
+        self.records: List[Dict] = []
+        self._stack: List[Dict] = []
+    
+    @contextmanager
+    def stage(self, name: str, rows_in: Optional[int] = None):
+        """
+        Measure the enclosed block. Yields the stage's record; set
+        record["rows_out"] (or other fields) inside the block.
+        """
+        parent = self._stack[-1] if self._stack else None
+        record = {
+            "stage": f"{parent['stage']}/{name}" if parent else name,
+            "rows_in": rows_in,
+            "rows_out": None,
+        }
+        self.records.append(record)
+        
+        profiler = None
+        if self.profile_dir is not None and parent is None:
+            profiler = cProfile.Profile()
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                record["_started_tracing"] = True
+            # Keep the parent's peak so far before resetting for this stage
+            if parent is not None:
+                parent["_peak"] = max(parent["_peak"], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            record["_peak"] = 0
+        
+        self._stack.append(record)
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_seconds"] = round(time.perf_counter() - wall, 4)
+            record["cpu_seconds"] = round(time.process_time() - cpu, 4)
+            record["max_rss_mb"] = max_rss_mb()
+            self._stack.pop()
+            if self.trace_memory:
+                peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+                record["tracemalloc_peak_mb"] = round(peak / 1024 ** 2, 1)
+                if parent is not None:
+                    parent["_peak"] = max(parent["_peak"], peak)
+                if record.pop("_started_tracing", False):
+                    tracemalloc.stop()
+            if profiler is not None:
+                self.profile_dir.mkdir(parents=True, exist_ok=True)
+                profiler.dump_stats(str(self.profile_dir / f"{name}.prof"))
+    
+    def add(self, record: Dict) -> Dict:
+        """Append a record measured elsewhere (a worker process or the cache)."""
+        self.records.append(record)
+        return record
+    
+    def report(self, **extra) -> Dict:
+        """Machine-readable run report: run-level fields plus every stage record."""
+        return {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            **extra,
+            "max_rss_mb": max_rss_mb(),
+            "stages": self.records,
+        }
+    
+    def write_report(self, path: Path, **extra) -> Dict:
+        report = self.report(**extra)
+        Path(path).write_text(json.dumps(report, indent=2))
+        logger.info(f"Wrote run report to {path}")
+        return report
+    
+    def log_summary(self) -> None:
+        """Log the top-level stages, slowest first."""
+        top = [r for r in self.records if "/" not in r["stage"] and "wall_seconds" in r]
+        for record in sorted(top, key=lambda r: -r["wall_seconds"]):
+            cpu = f"{record['cpu_seconds']:>8.3f}s cpu" if "cpu_seconds" in record else f"{'':>12}"
+            cached = " (cached)" if record.get("cache_hit") else ""
+            logger.info(f"  {record['stage']:<24} {record['wall_seconds']:>8.3f}s wall {cpu}  "
+                        f"rows {record['rows_out']}{cached}")
+
+
+# Recorder that stage() reports to; None disables instrumentation
+_active: Optional[StageRecorder] = None
+
+
+@contextmanager
+def recording(recorder: StageRecorder):
+    """Make recorder the target of stage() for the enclosed block."""
+    global _active
+    previous, _active = _active, recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+def stage(name: str, rows_in: Optional[int] = None):
+    """Measure a stage on the active recorder, or do nothing if there is none."""
+    if _active is None:
+        return nullcontext({})
+    return _active.stage(name, rows_in=rows_in)
+
+
+def active_recorder() -> Optional[StageRecorder]:
+    return _active
+
+
+def add_record(record: Dict) -> None:
+    """Add a record measured elsewhere to the active recorder, if any."""
+    if _active is not None:
+        _active.add(record)
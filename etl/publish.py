@@ -0,0 +1,151 @@
+"""
+Versioned, atomic publishing of ETL outputs through current.json.
+"""
+
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import shutil
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_writer import DATASET_DIR_NAME, MANIFEST_NAME as DATASET_MANIFEST_NAME
+from instrumentation import PROFILE_DIR_NAME, REPORT_NAME
+
+logger = logging.getLogger(__name__)
+
+VERSIONS_DIR_NAME = "versions"
+VERSION_MANIFEST_NAME = "manifest.json"
+CURRENT_NAME = "current.json"
+
+# Published versions kept on disk, including the current one
+DEFAULT_KEEP_VERSIONS = 5
+
+
+def new_version_id() -> str:
+    """Sortable version id from the current UTC time."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+
+
+def versions_dir(output_dir: Path) -> Path:
+    return Path(output_dir) / VERSIONS_DIR_NAME
+
+
+def read_current(output_dir: Path) -> Optional[Dict]:
+    """Manifest of the published version, or None if nothing is published."""
+    path = Path(output_dir) / CURRENT_NAME
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())
+
+
+def list_versions(output_dir: Path) -> List[str]:
+    """Complete (manifest written) versions on disk, oldest first."""
+    root = versions_dir(output_dir)
+    if not root.exists():
+        return []
+    return sorted(p.name for p in root.iterdir() if (p / VERSION_MANIFEST_NAME).exists())
+
+
+def prepare_version(output_dir: Path, base: Optional[Dict] = None) -> Path:
+    """
+    Create the directory for a new version. With base (a published
+    manifest), the base version's outputs are copied in first, so an
+    incremental run can update them without touching the published files.
+    """
+    version_path = versions_dir(output_dir) / new_version_id()
+    if base is not None:
+        shutil.copytree(Path(output_dir) / base["path"], version_path,
+                        ignore=shutil.ignore_patterns(VERSION_MANIFEST_NAME, REPORT_NAME, PROFILE_DIR_NAME))
+    else:
+        version_path.mkdir(parents=True)
+    return version_path
+
+
+def describe_outputs(version_path: Path) -> Dict[str, Dict]:
+    """Row count, size and schema of every parquet/Arrow output, read from file metadata."""
+    files = {}
+    for path in sorted(version_path.rglob("*")):
+        relative = path.relative_to(version_path).as_posix()
+        if relative.startswith(DATASET_DIR_NAME + "/"):
+            continue
+        if path.suffix == ".parquet":
+            metadata = pq.read_metadata(path)
+            rows, schema = metadata.num_rows, metadata.schema.to_arrow_schema()
+        elif path.suffix == ".arrow":
+            with pa.memory_map(str(path), "r") as source:
+                reader = pa.ipc.open_file(source)
+                rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+                schema = reader.schema
+        else:
+            continue
+        files[relative] = {
+            "rows": rows,
+            "bytes": path.stat().st_size,
+            "schema": {field.name: str(field.type) for field in schema},
+        }
+    
+    dataset_manifest = version_path / DATASET_DIR_NAME / DATASET_MANIFEST_NAME
+    if dataset_manifest.exists():
+        manifest = json.loads(dataset_manifest.read_text())
+        files[DATASET_DIR_NAME] = {"rows": manifest["row_count"], "schema": manifest["schema"],
+                                   "partitions": len(manifest["partitions"])}
+    return files
+
+
+def publish_version(output_dir: Path, version_path: Path, input_hashes: Dict[str, str],
+                    code_version: str, options: Dict) -> Dict:
+    """Write the version's manifest, then atomically point current.json at it."""
+    output_dir = Path(output_dir)
+    manifest = {
+        "version": version_path.name,
+        "path": version_path.relative_to(output_dir).as_posix(),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "code_version": code_version,
+        "inputs": input_hashes,
+        "options": options,
+        "files": describe_outputs(version_path),
+    }
+    (version_path / VERSION_MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+    _write_current(output_dir, manifest)
+    logger.info(f"Published version {manifest['version']}")
+    return manifest
+
+
+def _write_current(output_dir: Path, manifest: Dict) -> None:
+    tmp_path = output_dir / (CURRENT_NAME + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp_path, output_dir / CURRENT_NAME)
+
+
+def rollback(output_dir: Path, version: str) -> Dict:
+    """Publish an earlier version again. Raises ValueError if it is not on disk."""
+    manifest_path = versions_dir(output_dir) / version / VERSION_MANIFEST_NAME
+    if not manifest_path.exists():
+        raise ValueError(f"Version {version} not found in {versions_dir(output_dir)}")
+    manifest = json.loads(manifest_path.read_text())
+    _write_current(Path(output_dir), manifest)
+    logger.info(f"Rolled back to version {version}")
+    return manifest
+
+
+def prune_versions(output_dir: Path, keep: int = DEFAULT_KEEP_VERSIONS) -> List[str]:
+    """
+    Delete all but the newest keep published versions; the current version
+    is never deleted. Returns the removed version ids.
+    """
+    current = read_current(output_dir)
+    complete = list_versions(output_dir)
+    keep_set = set(complete[-keep:] if keep > 0 else [])
+    if current is not None:
+        keep_set.add(current["version"])
+    removed = [version for version in complete if version not in keep_set]
+    for version in removed:
+        shutil.rmtree(versions_dir(output_dir) / version)
+    if removed:
+        logger.info(f"Removed {len(removed)} old versions: {', '.join(removed)}")
+    return removed
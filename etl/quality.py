@@ -0,0 +1,142 @@
+"""
+Data quality profile of the merged timeseries and its hard thresholds.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+QUALITY_REPORT_NAME = "quality_report.json"
+QUALITY_TABLE_NAME = "quality_by_country.parquet"
+
+# Metrics whose null rates are profiled, when present
+PROFILED_METRICS = ["confirmed_cases", "deaths", "total_vaccinations", "people_vaccinated",
+                    "people_fully_vaccinated", "daily_vaccinations"]
+
+# Hard limits checked by check_thresholds; None disables a check
+DEFAULT_THRESHOLDS = {
+    # (iso3, date) keys occurring more than once in the merged frame
+    "max_duplicate_keys": 0,
+    # Source rows sharing an (iso3, date) key, resolved by merge_sources
+    "max_source_duplicate_keys": None,
+    # Longest run of missing dates inside one country's series
+    "max_gap_days": 31,
+    # Overall null rate of confirmed_cases and of deaths
+    "max_core_null_rate": 0.25,
+    # Share of cases/deaths points the monotonicity repair had to correct
+    "max_repaired_rate": 0.2,
+    # Raw country names without an ISO3 mapping
+    "max_iso3_misses": None,
+}
+
+CORE_METRICS = ["confirmed_cases", "deaths"]
+
+# Countries with the most missing days listed in the JSON summary
+_WORST = 10
+
+
+def count_duplicate_keys(df: pd.DataFrame) -> int:
+    """Rows of a source frame repeating an earlier (iso3, date) key."""
+    return int(df.duplicated(["iso3", "date"]).sum())
+
+
+def profile_quality(df: pd.DataFrame, repaired_points: Optional[Dict[str, Dict[str, int]]] = None,
+                    iso3_misses: Iterable[str] = (),
+                    source_duplicates: Optional[Dict[str, int]] = None) -> Tuple[Dict, pd.DataFrame]:
+    """
+    Profile a non-empty merged timeseries frame. repaired_points maps a
+    metric to {iso3: points repaired}; iso3_misses lists unmapped raw names;
+    source_duplicates maps a source to its count_duplicate_keys before the
+    merge. Returns (summary, per-country table).
+    """
+    codes, iso3 = pd.factorize(df["iso3"].to_numpy(dtype=object), sort=True)
+    days = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]").astype(np.int64)
+    keys = codes.astype(np.int64) * (days.max() - days.min() + 1) + (days - days.min())
+    order = None
+    if (np.diff(keys) < 0).any():
+        order = np.argsort(keys, kind="stable")
+        codes, days = codes[order], days[order]
+    
+    # Segment reductions over the rows of each country
+    same_country = np.r_[False, codes[1:] == codes[:-1]]
+    starts = np.flatnonzero(~same_country)
+    ends = np.r_[starts[1:], len(codes)]
+    step = np.r_[0, np.diff(days)]
+    duplicates = same_country & (step == 0)
+    gaps = np.where(same_country & (step > 1), step - 1, 0)
+    rows = ends - starts
+    table = pd.DataFrame({
+        "iso3": np.asarray(iso3, dtype=object),
+        "rows": rows,
+        "first_date": days[starts].astype("datetime64[D]"),
+        "last_date": days[ends - 1].astype("datetime64[D]"),
+        "duplicate_keys": np.add.reduceat(duplicates.astype(np.int64), starts),
+        "missing_days": np.add.reduceat(gaps, starts),
+        "max_gap_days": np.maximum.reduceat(gaps, starts),
+    })
+    
+    metrics = [m for m in PROFILED_METRICS if m in df.columns]
+    nulls = np.isnan(df[metrics].to_numpy(dtype=np.float64, na_value=np.nan))
+    null_counts = np.add.reduceat((nulls if order is None else nulls[order]).astype(np.int64), starts, axis=0)
+    for i, metric in enumerate(metrics):
+        table[f"null_rate_{metric}"] = null_counts[:, i] / rows
+    
+    repaired_points = repaired_points or {}
+    for metric, per_country in repaired_points.items():
+        table[f"repaired_{metric}"] = table["iso3"].map(per_country).fillna(0).astype(np.int64)
+    repaired_totals = {metric: int(sum(per_country.values())) for metric, per_country in repaired_points.items()}
+    core = [m for m in CORE_METRICS if m in repaired_totals]
+    core_points = int((~nulls[:, [metrics.index(m) for m in core]]).sum()) if core else 0
+    
+    with_gaps = table[table["missing_days"] > 0].sort_values("missing_days", ascending=False)
+    summary = {
+        "rows": len(df),
+        "countries": len(table),
+        "min_date": str(days.min().astype("datetime64[D]")),
+        "max_date": str(days.max().astype("datetime64[D]")),
+        "duplicate_keys": int(duplicates.sum()),
+        "source_duplicate_keys": dict(source_duplicates or {}),
+        "gaps": {
+            "countries_with_gaps": len(with_gaps),
+            "missing_days": int(gaps.sum()),
+            "max_gap_days": int(gaps.max()),
+            "worst": {row.iso3: int(row.missing_days) for row in with_gaps.head(_WORST).itertuples()},
+        },
+        "null_rates": {metric: float(null_counts[:, i].sum() / len(df)) for i, metric in enumerate(metrics)},
+        "repaired_points": repaired_totals,
+        "repaired_rate": sum(repaired_totals[m] for m in core) / core_points if core_points else 0.0,
+        "iso3_misses": sorted(set(iso3_misses)),
+    }
+    return summary, table
+
+
+def check_thresholds(summary: Dict, thresholds: Optional[Dict] = None) -> List[str]:
+    """Human-readable violations of the hard thresholds (empty if the data passes)."""
+    limits = dict(DEFAULT_THRESHOLDS, **(thresholds or {}))
+    checks = {
+        "max_duplicate_keys": summary["duplicate_keys"],
+        "max_source_duplicate_keys": sum(summary["source_duplicate_keys"].values()),
+        "max_gap_days": summary["gaps"]["max_gap_days"],
+        "max_core_null_rate": max((summary["null_rates"].get(m, 0.0) for m in CORE_METRICS), default=0.0),
+        "max_repaired_rate": summary["repaired_rate"],
+        "max_iso3_misses": len(summary["iso3_misses"]),
+    }
+    return [f"{name}: {value} exceeds {limits[name]}"
+            for name, value in checks.items()
+            if limits.get(name) is not None and value > limits[name]]
+
+
+def write_quality_report(summary: Dict, table: pd.DataFrame, output_dir: Path) -> Path:
+    """Write the summary JSON and the per-country parquet table to output_dir."""
+    output_dir = Path(output_dir)
+    table.to_parquet(output_dir / QUALITY_TABLE_NAME, index=False, compression="snappy")
+    path = output_dir / QUALITY_REPORT_NAME
+    path.write_text(json.dumps(summary, indent=2))
+    logger.info(f"Wrote quality report to {path}")
+    return path
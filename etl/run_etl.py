@@ -3,16 +3,52 @@ ETL Main Pipeline Runner - orchestrates data ingestion and transformation.
 """
 
 import os
+import shutil
 import sys
+import argparse
 import logging
+import time
 from pathlib import Path
+from typing import Dict, Optional
 import pandas as pd
 
 from transform_utils import (
-    load_and_transform_cases_deaths,
-    load_and_transform_vaccinations,
+    apply_compact_schema,
+    build_global_daily,
+    log_memory_footprint,
+    memory_footprint,
+    merge_sources,
     validate_data
 )
+from stages import (
+    JHU_METRICS,
+    PROVINCES_OUTPUT,
+    SOURCE_FILES,
+    SOURCE_OUTPUTS,
+    build_province_timeseries,
+    resolve_raw_file,
+    run_source_stages
+)
+from streaming import DEFAULT_CHUNK_CELLS
+from stage_cache import CODE_VERSION, DEFAULT_MAX_BYTES, StageCache, hash_file
+from dataset_writer import (
+    MATRIX_DIR_NAME,
+    write_metric_matrices,
+    write_partitioned_dataset,
+    write_timeseries_feather,
+    write_timeseries_parquet
+)
+from date_grid import align_to_date_grid, build_metric_matrices
+from derived_metrics import add_derived_metrics
+from instrumentation import PROFILE_DIR_NAME, REPORT_NAME, StageRecorder, recording, stage
+from quality import (
+    DEFAULT_THRESHOLDS,
+    check_thresholds,
+    count_duplicate_keys,
+    profile_quality,
+    write_quality_report
+)
+from publish import DEFAULT_KEEP_VERSIONS, prepare_version, prune_versions, publish_version, read_current, rollback
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -23,84 +59,324 @@ OUTPUT_DIR = Path(__file__).parent.parent / "output"
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 
-def run_etl():
-    """Execute the complete ETL pipeline."""
+# Uncompressed Arrow IPC copy of the timeseries for memory-mapped API loading
+FEATHER_OUTPUT = "timeseries.arrow"
+
+# Per-date global totals served by /api/v1/summary
+GLOBAL_DAILY_OUTPUT = "global_daily.parquet"
+
+# Location of the stage cache when the CLI enables it with --cache
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".stage_cache"
+
+
+def run_etl(raw_dir: Path = RAW_DATA_DIR, output_dir: Path = OUTPUT_DIR, incremental: bool = False,
+            workers: int = 1, partitioned: bool = False, partition_by_year: bool = False,
+            cache_dir: Optional[Path] = None, cache_max_bytes: int = DEFAULT_MAX_BYTES,
+            profile: bool = False, trace_memory: bool = False, dense_grid: bool = False,
+            versioned: bool = False, keep_versions: int = DEFAULT_KEEP_VERSIONS,
+            quality_thresholds: Optional[Dict] = None, provinces: bool = False, stream: bool = False,
+            chunk_cells: int = DEFAULT_CHUNK_CELLS):
+    """
+    Execute the complete ETL pipeline. The options mirror the command-line
+    flags (see parse_args); returns whether the run succeeded.
+    """
+    raw_dir = Path(raw_dir)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    
     logger.info("Starting COVID-19 ETL Pipeline")
-    logger.info(f"Raw data directory: {RAW_DATA_DIR}")
-    logger.info(f"Output directory: {OUTPUT_DIR}")
+    logger.info(f"Mode: {'incremental' if incremental else 'full rebuild'}")
+    logger.info(f"Raw data directory: {raw_dir}")
+    logger.info(f"Output directory: {output_dir}")
     
     # Find input files
-    cases_file = RAW_DATA_DIR / "CONVENIENT_global_confirmed_cases.csv"
-    deaths_file = RAW_DATA_DIR / "CONVENIENT_global_deaths.csv"
-    vacc_file = RAW_DATA_DIR / "country_vaccinations.csv"
+    raw_files = {source: resolve_raw_file(raw_dir, name) for source, name in SOURCE_FILES.items()}
+    for source, raw_file in raw_files.items():
+        if not raw_file.exists():
+            logger.error(f"{source.capitalize()} file not found: {raw_file}")
+            return False
     
-    if not cases_file.exists():
-        logger.error(f"Cases file not found: {cases_file}")
-        return False
+    cache = StageCache(cache_dir, max_bytes=cache_max_bytes) if cache_dir is not None else None
+    recorder = StageRecorder(trace_memory=trace_memory,
+                             profile_dir=output_dir / PROFILE_DIR_NAME if profile else None)
+    started = time.perf_counter()
+    run_info = {"success": False, "mode": "incremental" if incremental else "full", "workers": workers,
+                "dense_grid": dense_grid, "provinces": provinces, "stream": stream}
+    stage_options = {"workers": workers, "partitioned": partitioned, "partition_by_year": partition_by_year,
+                     "cache": cache, "dense_grid": dense_grid, "quality_thresholds": quality_thresholds,
+                     "provinces": provinces, "chunk_cells": chunk_cells if stream else None}
     
-    if not deaths_file.exists():
-        logger.error(f"Deaths file not found: {deaths_file}")
-        return False
+    try:
+        with recording(recorder):
+            if versioned:
+                run_info["success"] = _run_versioned(raw_files, output_dir, incremental, keep_versions,
+                                                     run_info, stage_options)
+            else:
+                run_info["success"] = _run_stages(raw_files, output_dir, incremental, **stage_options)
+        if run_info["success"]:
+            logger.info("ETL Pipeline completed successfully")
+        return run_info["success"]
     
-    if not vacc_file.exists():
-        logger.error(f"Vaccinations file not found: {vacc_file}")
+    except Exception as e:
+        logger.error(f"ETL Pipeline failed: {e}", exc_info=True)
         return False
     
+    finally:
+        run_info["total_seconds"] = round(time.perf_counter() - started, 3)
+        logger.info("Stage timings:")
+        recorder.log_summary()
+        recorder.write_report(output_dir / REPORT_NAME, **run_info)
+
+
+def _run_versioned(raw_files: Dict[str, Path], output_dir: Path, incremental: bool, keep_versions: int,
+                   run_info: Dict, stage_options: Dict) -> bool:
+    """
+    Run the stages into a new version directory and publish it. An
+    incremental run starts from a copy of the current version and publishes
+    nothing if the inputs, code and options are those of the current version.
+    """
+    input_hashes = {source: hash_file(path) for source, path in raw_files.items()}
+    options = {name: stage_options[name] for name in ["partitioned", "partition_by_year", "dense_grid", "provinces"]}
+    current = read_current(output_dir)
+    if incremental and current is not None and (current["inputs"], current["code_version"], current["options"]) == (
+        input_hashes, CODE_VERSION, options
+    ):
+        logger.info(f"Inputs unchanged since version {current['version']}, nothing to publish")
+        run_info["version"] = current["version"]
+        return True
+    
+    version_path = prepare_version(output_dir, base=current if incremental else None)
+    logger.info(f"Writing version {version_path.name} to {version_path}")
+    published = False
     try:
-        # Load and transform cases/deaths
-        logger.info("Processing cases and deaths data...")
-        cases_df, deaths_df = load_and_transform_cases_deaths(str(cases_file), str(deaths_file))
-        
-        # Merge cases and deaths
-        logger.info("Merging cases and deaths...")
-        timeseries_df = cases_df.merge(
-            deaths_df,
-            on=["date", "country", "iso3"],
-            how="outer"
-        )
-        
-        # Load vaccinations
-        logger.info("Processing vaccinations data...")
-        vacc_df = load_and_transform_vaccinations(str(vacc_file))
-        
-        # Merge with vaccinations
-        logger.info("Merging with vaccinations...")
-        timeseries_df = timeseries_df.merge(
-            vacc_df,
-            on=["date", "country", "iso3"],
-            how="left"
-        )
-        
-        # Validate
-        if not validate_data(timeseries_df):
-            logger.error("Data validation failed")
+        if not _run_stages(raw_files, version_path, incremental, **stage_options):
             return False
-        
-        # Sort and save
-        logger.info("Sorting and saving results...")
-        timeseries_df = timeseries_df.sort_values(["iso3", "date"])
-        
-        output_file = OUTPUT_DIR / "timeseries.parquet"
-        timeseries_df.to_parquet(output_file, index=False, compression="snappy")
-        logger.info(f"Saved timeseries to {output_file}")
-        logger.info(f"Total records: {len(timeseries_df)}")
-        logger.info(f"Countries: {timeseries_df['iso3'].nunique()}")
-        logger.info(f"Date range: {timeseries_df['date'].min()} to {timeseries_df['date'].max()}")
-        
-        # Save individual metrics for easier access
-        logger.info("Saving individual metric files...")
-        cases_df.to_parquet(OUTPUT_DIR / "cases_timeseries.parquet", index=False, compression="snappy")
-        deaths_df.to_parquet(OUTPUT_DIR / "deaths_timeseries.parquet", index=False, compression="snappy")
-        vacc_df.to_parquet(OUTPUT_DIR / "vaccinations_timeseries.parquet", index=False, compression="snappy")
-        
-        logger.info("ETL Pipeline completed successfully")
+        with stage("publish") as record:
+            manifest = publish_version(output_dir, version_path, input_hashes, CODE_VERSION, options)
+            published = True
+            record["removed_versions"] = prune_versions(output_dir, keep=keep_versions)
+        run_info["version"] = manifest["version"]
         return True
-        
-    except Exception as e:
-        logger.error(f"ETL Pipeline failed: {e}", exc_info=True)
+    finally:
+        if not published:
+            shutil.rmtree(version_path, ignore_errors=True)
+
+
+def _run_stages(raw_files: Dict[str, Path], output_dir: Path, incremental: bool, workers: int = 1,
+                partitioned: bool = False, partition_by_year: bool = False,
+                cache: Optional[StageCache] = None, dense_grid: bool = False,
+                quality_thresholds: Optional[Dict] = None, provinces: bool = False,
+                chunk_cells: Optional[int] = None) -> bool:
+    """The pipeline stages of run_etl; returns False if validation or a quality check fails."""
+    logger.info("Processing cases, deaths and vaccinations data...")
+    frames, stage_info = run_source_stages(raw_files, output_dir, incremental=incremental,
+                                           workers=workers, cache=cache, chunk_cells=chunk_cells)
+    cases_df, deaths_df, vacc_df = frames["cases"], frames["deaths"], frames["vaccinations"]
+    
+    for source, info in stage_info.items():
+        logger.info(f"{source.capitalize()}: {info['rows']} rows ({info['new_rows']} transformed) "
+                    f"in {info['seconds']}s")
+    logger.info(f"Dates parsed: {sum(i['dates_parsed'] for i in stage_info.values())}, "
+                f"failed to parse: {sum(i['dates_failed'] for i in stage_info.values())}")
+    
+    if incremental:
+        changed = [source for source, info in stage_info.items() if info["new_rows"]]
+        outputs = ["timeseries.parquet", FEATHER_OUTPUT, GLOBAL_DAILY_OUTPUT]
+        if dense_grid:
+            outputs.append(MATRIX_DIR_NAME)
+        if provinces:
+            outputs.append(PROVINCES_OUTPUT)
+        if not changed and all((output_dir / name).exists() for name in outputs):
+            logger.info("No new dates in any source, outputs are up to date")
+            return True
+    else:
+        changed = list(SOURCE_OUTPUTS)
+    
+    # Merge, keyed on the source stage keys when caching
+    merge_key = validate_key = None
+    if cache is not None:
+        merge_key = cache.key("merge", *(info["cache_key"] for info in stage_info.values()))
+        validate_key = cache.key("validate", merge_key)
+    
+    with stage("merge", rows_in=len(cases_df) + len(deaths_df) + len(vacc_df)) as record:
+        cached = cache.get(merge_key) if cache is not None else None
+        record["cache_hit"] = cached is not None
+        if cached is not None:
+            timeseries_df = cached[0]
+        else:
+            timeseries_df = merge_sources(cases_df, deaths_df, vacc_df)
+            if cache is not None:
+                cache.put(merge_key, timeseries_df)
+        record["rows_out"] = len(timeseries_df)
+    
+    # Validate
+    with stage("validate", rows_in=len(timeseries_df)) as record:
+        cached = cache.get(validate_key) if cache is not None else None
+        record["cache_hit"] = cached is not None
+        valid = cached[1]["valid"] if cached is not None else validate_data(timeseries_df)
+        if cache is not None and cached is None:
+            cache.put(validate_key, meta={"valid": valid})
+        record["valid"] = bool(valid)
+    if cache is not None:
+        logger.info(f"Stage cache {cache.summary()}")
+    if not valid:
+        logger.error("Data validation failed")
         return False
+    
+    # Quality profile of the merged frame; hard thresholds fail the run
+    with stage("quality", rows_in=len(timeseries_df)) as record:
+        summary, by_country = profile_quality(
+            timeseries_df,
+            repaired_points={metric: stage_info[source]["repaired_points"] for source, metric in JHU_METRICS.items()},
+            iso3_misses=[name for info in stage_info.values() for name in info["iso3_misses"]],
+            source_duplicates={source: count_duplicate_keys(frame) for source, frame in frames.items()},
+        )
+        summary["violations"] = check_thresholds(summary, quality_thresholds)
+        write_quality_report(summary, by_country, output_dir)
+        record["violations"] = len(summary["violations"])
+    if summary["violations"]:
+        for violation in summary["violations"]:
+            logger.error(f"Quality check failed: {violation}")
+        return False
+    
+    # Shared daily date axis for every country
+    if dense_grid:
+        with stage("date_grid", rows_in=len(timeseries_df)) as record:
+            timeseries_df = align_to_date_grid(timeseries_df)
+            record["rows_out"] = len(timeseries_df)
+    
+    # Daily new counts, rolling means, growth and CFR per country
+    with stage("derived_metrics", rows_in=len(timeseries_df)) as record:
+        timeseries_df = add_derived_metrics(timeseries_df)
+        record["rows_out"] = len(timeseries_df)
+    
+    # Compact schema for the published frame
+    with stage("compact_schema", rows_in=len(timeseries_df)) as record:
+        footprint_before = memory_footprint(timeseries_df)
+        timeseries_df = apply_compact_schema(timeseries_df)
+        log_memory_footprint(footprint_before, memory_footprint(timeseries_df))
+        record["rows_out"] = len(timeseries_df)
+    
+    # Save
+    logger.info("Saving results...")
+    output_file = output_dir / "timeseries.parquet"
+    with stage("write_timeseries", rows_in=len(timeseries_df)) as record:
+        write_timeseries_parquet(timeseries_df, output_file)
+        record["rows_out"] = len(timeseries_df)
+    with stage("write_feather", rows_in=len(timeseries_df)) as record:
+        write_timeseries_feather(timeseries_df, output_dir / FEATHER_OUTPUT)
+        record["rows_out"] = len(timeseries_df)
+    if dense_grid:
+        with stage("write_matrices", rows_in=len(timeseries_df)) as record:
+            matrices = build_metric_matrices(timeseries_df)
+            write_metric_matrices(matrices, output_dir)
+            record["rows_out"] = int(sum(matrix.size for matrix in matrices.values()))
+    logger.info(f"Saved timeseries to {output_file} and {output_dir / FEATHER_OUTPUT}")
+    logger.info(f"Total records: {len(timeseries_df)}")
+    logger.info(f"Countries: {timeseries_df['iso3'].nunique()}")
+    logger.info(f"Date range: {timeseries_df['date'].min().date()} to {timeseries_df['date'].max().date()}")
+    
+    with stage("global_daily", rows_in=len(timeseries_df)) as record:
+        global_daily = build_global_daily(timeseries_df)
+        write_timeseries_parquet(global_daily, output_dir / GLOBAL_DAILY_OUTPUT)
+        record["rows_out"] = len(global_daily)
+    logger.info(f"Saved {len(global_daily)} global daily totals to {output_dir / GLOBAL_DAILY_OUTPUT}")
+    
+    if partitioned:
+        with stage("write_dataset", rows_in=len(timeseries_df)) as record:
+            manifest = write_partitioned_dataset(timeseries_df, output_dir, partition_by_year=partition_by_year)
+            record["rows_out"] = manifest["row_count"]
+    
+    if provinces:
+        with stage("provinces") as record:
+            provinces_df = build_province_timeseries(raw_files)
+            write_timeseries_parquet(provinces_df, output_dir / PROVINCES_OUTPUT)
+            record["rows_out"] = len(provinces_df)
+        logger.info(f"Saved {len(provinces_df)} province rows to {output_dir / PROVINCES_OUTPUT}")
+    
+    # Save individual metrics for easier access (only those that changed and
+    # were not already streamed to their files)
+    changed = [source for source in changed if not stage_info[source]["streamed"]]
+    logger.info(f"Saving individual metric files: {', '.join(changed)}")
+    source_frames = {"cases": cases_df, "deaths": deaths_df, "vaccinations": vacc_df}
+    with stage("write_sources", rows_in=sum(len(source_frames[source]) for source in changed)) as record:
+        for source in changed:
+            source_frames[source].to_parquet(output_dir / SOURCE_OUTPUTS[source], index=False,
+                                             compression="snappy")
+        record["rows_out"] = record["rows_in"]
+    return True
+
+
+def parse_thresholds(items) -> Dict:
+    """NAME=VALUE quality threshold overrides from the command line."""
+    thresholds = {}
+    for item in items:
+        name, _, value = item.partition("=")
+        if name not in DEFAULT_THRESHOLDS:
+            raise SystemExit(f"Unknown quality threshold {name}")
+        thresholds[name] = None if value.lower() == "none" else float(value)
+    return thresholds
+
+
+def parse_args(argv=None):
+    """Parse command-line options."""
+    parser = argparse.ArgumentParser(description="COVID-19 ETL pipeline")
+    parser.add_argument("--raw-dir", type=Path, default=RAW_DATA_DIR,
+                        help="Directory containing the raw CSV inputs (optionally .gz or .zst compressed)")
+    parser.add_argument("--output-dir", type=Path, default=OUTPUT_DIR,
+                        help="Directory for the parquet outputs")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only transform dates newer than the existing outputs")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processes for the source stages (default 1 runs them sequentially; "
+                             "up to 3 run cases, deaths and vaccinations in parallel)")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Also write the timeseries as a dataset partitioned by iso3")
+    parser.add_argument("--partition-by-year", action="store_true",
+                        help="With --partitioned, also partition by year")
+    parser.add_argument("--cache", action="store_true",
+                        help="Cache stage results by content hash and skip stages whose inputs did not change")
+    parser.add_argument("--cache-dir", type=Path, default=DEFAULT_CACHE_DIR,
+                        help="With --cache, directory for the cached stage results")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // 1024 ** 2,
+                        help="With --cache, evict least recently used entries above this size")
+    parser.add_argument("--profile", action="store_true",
+                        help="Dump a cProfile file per stage to <output-dir>/profiles")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Record tracemalloc peaks per stage in the run report (slower)")
+    parser.add_argument("--dense-grid", action="store_true",
+                        help="Align every country to the shared daily date axis and write metric matrices")
+    parser.add_argument("--versioned", action="store_true",
+                        help="Write a new version under <output-dir>/versions and publish it atomically")
+    parser.add_argument("--keep-versions", type=int, default=DEFAULT_KEEP_VERSIONS,
+                        help="With --versioned, number of published versions to keep")
+    parser.add_argument("--quality-threshold", action="append", default=[], metavar="NAME=VALUE",
+                        help=f"Override a quality threshold ({', '.join(DEFAULT_THRESHOLDS)}); "
+                             f"'none' disables it")
+    parser.add_argument("--provinces", action="store_true",
+                        help="Also write province-level cases and deaths to provinces_timeseries.parquet")
+    parser.add_argument("--stream", action="store_true",
+                        help="Read raw files in bounded chunks and write source outputs progressively; "
+                             "the merge still reads them back whole")
+    parser.add_argument("--chunk-cells", type=int, default=DEFAULT_CHUNK_CELLS,
+                        help="With --stream, raw CSV cells (rows x columns) per chunk")
+    parser.add_argument("--rollback", metavar="VERSION",
+                        help="Publish an earlier version again instead of running the pipeline")
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    success = run_etl()
+    args = parse_args()
+    if args.rollback:
+        rollback(args.output_dir, args.rollback)
+        sys.exit(0)
+    success = run_etl(raw_dir=args.raw_dir, output_dir=args.output_dir, incremental=args.incremental,
+                      workers=args.workers, partitioned=args.partitioned,
+                      partition_by_year=args.partition_by_year,
+                      cache_dir=args.cache_dir if args.cache else None,
+                      cache_max_bytes=args.cache_max_mb * 1024 ** 2,
+                      profile=args.profile, trace_memory=args.trace_memory, dense_grid=args.dense_grid,
+                      versioned=args.versioned, keep_versions=args.keep_versions,
+                      quality_thresholds=parse_thresholds(args.quality_threshold), provinces=args.provinces,
+                      stream=args.stream, chunk_cells=args.chunk_cells)
     sys.exit(0 if success else 1)
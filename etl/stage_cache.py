@@ -0,0 +1,131 @@
+"""
+Content-addressed cache for ETL stage results, keyed by input and code hashes.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+
+import pandas as pd
+from pyarrow import feather
+
+logger = logging.getLogger(__name__)
+
+# Default upper bound for the cache directory size
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    """SHA-256 of a file's contents, or a marker if it does not exist."""
+    path = Path(path)
+    if not path.exists():
+        return "missing"
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_code(paths: Iterable[Path]) -> str:
+    """Hash of the source files that implement the stages."""
+    digest = hashlib.sha256()
+    for path in sorted(Path(p) for p in paths):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+# Any change to the ETL modules invalidates every cached stage
+CODE_VERSION = hash_code(Path(__file__).parent.glob("*.py"))
+
+
+class StageCache:
+    """Directory of cached stage results keyed by content hash."""
+    
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES,
+                 code_version: str = CODE_VERSION):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.code_version = code_version
+        self.hits = []
+        self.misses = []
+    
+    def key(self, stage: str, *parts) -> str:
+        """Cache key for a stage from its input fingerprints."""
+        digest = hashlib.sha256()
+        for part in (stage, self.code_version) + parts:
+            digest.update(str(part).encode())
+            digest.update(b"\0")
+        return f"{stage}-{digest.hexdigest()[:24]}"
+    
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return self.cache_dir / f"{key}.arrow", self.cache_dir / f"{key}.json"
+    
+    def get(self, key: str) -> Optional[Tuple[Optional[pd.DataFrame], Dict]]:
+        """Return (frame, meta) for a cached stage, or None on a miss."""
+        stage = key.rsplit("-", 1)[0]
+        data_path, meta_path = self._paths(key)
+        if not meta_path.exists():
+            self.misses.append(stage)
+            return None
+        
+        meta = json.loads(meta_path.read_text())
+        df = None
+        if meta.get("has_frame"):
+            if not data_path.exists():
+                self.misses.append(stage)
+                return None
+            df = feather.read_table(str(data_path)).to_pandas()
+            os.utime(data_path)
+        os.utime(meta_path)
+        self.hits.append(stage)
+        return df, meta
+    
+    def put(self, key: str, df: Optional[pd.DataFrame] = None, meta: Optional[Dict] = None) -> None:
+        """Store a stage result, then evict old entries if over the size limit."""
+        data_path, meta_path = self._paths(key)
+        meta = dict(meta or {}, has_frame=df is not None)
+        if df is not None:
+            tmp_path = data_path.with_suffix(".arrow.tmp")
+            feather.write_feather(df.reset_index(drop=True), str(tmp_path), compression="lz4")
+            os.replace(tmp_path, data_path)
+        # The sidecar is written last: an entry only exists once it is complete
+        meta_path.write_text(json.dumps(meta))
+        self.evict()
+    
+    def size_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.cache_dir.iterdir() if p.is_file())
+    
+    def evict(self) -> int:
+        """Delete least recently used entries until under max_bytes."""
+        entries = {}
+        for path in self.cache_dir.iterdir():
+            if path.suffix in (".arrow", ".json"):
+                entry = entries.setdefault(path.stem, {"size": 0, "last_used": 0.0, "paths": []})
+                stat = path.stat()
+                entry["size"] += stat.st_size
+                entry["last_used"] = max(entry["last_used"], stat.st_mtime)
+                entry["paths"].append(path)
+        
+        total = sum(entry["size"] for entry in entries.values())
+        evicted = 0
+        for key, entry in sorted(entries.items(), key=lambda item: item[1]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            for path in entry["paths"]:
+                path.unlink(missing_ok=True)
+            total -= entry["size"]
+            evicted += 1
+        if evicted:
+            logger.info(f"Evicted {evicted} stage cache entries")
+        return evicted
+    
+    def summary(self) -> str:
+        return f"hits: {', '.join(self.hits) or 'none'}; misses: {', '.join(self.misses) or 'none'}"
@@ -0,0 +1,272 @@
+"""
+ETL stage scheduling - runs the independent source pipelines concurrently.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import logging
+import tempfile
+import time
+
+import pandas as pd
+from pyarrow import feather
+
+from transform_utils import (
+    DateNormalizer,
+    ISO3_RESOLVER,
+    jhu_long_format,
+    load_and_transform_jhu,
+    load_and_transform_vaccinations,
+    read_jhu_header,
+    read_jhu_wide,
+    repair_monotonicity,
+)
+from streaming import read_streamed_output, stream_jhu_source, stream_vaccinations_source
+from incremental import (
+    read_existing_output,
+    update_jhu_source,
+    update_vaccinations_source,
+)
+from stage_cache import StageCache, hash_file
+from instrumentation import StageRecorder, active_recorder, add_record, recording, stage
+
+logger = logging.getLogger(__name__)
+
+# Raw input file per source
+SOURCE_FILES = {
+    "cases": "CONVENIENT_global_confirmed_cases.csv",
+    "deaths": "CONVENIENT_global_deaths.csv",
+    "vaccinations": "country_vaccinations.csv",
+}
+
+# Compressed variants of a raw file that are picked up, in order of preference
+RAW_COMPRESSION_SUFFIXES = [".gz", ".zst"]
+
+# Per-source output files, also used as the incremental high-water marks
+SOURCE_OUTPUTS = {
+    "cases": "cases_timeseries.parquet",
+    "deaths": "deaths_timeseries.parquet",
+    "vaccinations": "vaccinations_timeseries.parquet",
+}
+
+# Metric column produced by each Johns Hopkins source
+JHU_METRICS = {
+    "cases": "confirmed_cases",
+    "deaths": "deaths",
+}
+
+# Optional province-level cases and deaths
+PROVINCES_OUTPUT = "provinces_timeseries.parquet"
+
+
+def resolve_raw_file(raw_dir: Path, name: str) -> Path:
+    """The raw file for name in raw_dir, or its first existing .gz/.zst variant."""
+    path = Path(raw_dir) / name
+    for candidate in [path] + [path.with_name(name + suffix) for suffix in RAW_COMPRESSION_SUFFIXES]:
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def run_source_stage(source: str, raw_file: Path, output_dir: Path, incremental: bool,
+                     date_normalizer: DateNormalizer, chunk_cells: Optional[int] = None
+                     ) -> Tuple[pd.DataFrame, int, Dict[str, int], List[str]]:
+    """
+    Load and transform one source.
+    Returns the long frame, the number of rows transformed in this run, the
+    number of cumulative points repaired in this run per ISO3 and the raw
+    country names without an ISO3 mapping.
+    With chunk_cells, a full load is streamed to the source's output file
+    in chunks of that many raw cells instead of being read in one go.
+    """
+    if chunk_cells is not None and not incremental:
+        return _stream_source_stage(source, raw_file, output_dir, date_normalizer, chunk_cells)
+    if source in JHU_METRICS:
+        metric_col = JHU_METRICS[source]
+        if incremental:
+            existing = read_existing_output(output_dir / SOURCE_OUTPUTS[source])
+            df, new_rows, repair_report = update_jhu_source(str(raw_file), metric_col, existing,
+                                                            date_normalizer, return_repair_report=True)
+        else:
+            df, repair_report = load_and_transform_jhu(str(raw_file), metric_col, date_normalizer,
+                                                       return_repair_report=True)
+            new_rows = len(df)
+        repaired = repair_report[metric_col]
+        return (df, new_rows, {str(iso3): int(n) for iso3, n in repaired[repaired > 0].items()},
+                jhu_iso3_misses(raw_file))
+    
+    if incremental:
+        existing = read_existing_output(output_dir / SOURCE_OUTPUTS[source])
+        df, new_rows, misses = update_vaccinations_source(str(raw_file), existing, date_normalizer,
+                                                          return_misses=True)
+        return df, new_rows, {}, misses
+    df, misses = load_and_transform_vaccinations(str(raw_file), date_normalizer, return_misses=True)
+    return df, len(df), {}, misses
+
+
+def _stream_source_stage(source: str, raw_file: Path, output_dir: Path, date_normalizer: DateNormalizer,
+                         chunk_cells: int) -> Tuple[pd.DataFrame, int, Dict[str, int], List[str]]:
+    output_path = output_dir / SOURCE_OUTPUTS[source]
+    repaired = {}
+    with stage("stream") as record:
+        if source in JHU_METRICS:
+            rows, repair_report, misses = stream_jhu_source(str(raw_file), JHU_METRICS[source], output_path,
+                                                            date_normalizer, chunk_cells)
+            counts = repair_report[JHU_METRICS[source]]
+            repaired = {str(iso3): int(n) for iso3, n in counts[counts > 0].items()}
+        else:
+            rows, misses = stream_vaccinations_source(str(raw_file), output_path, date_normalizer, chunk_cells)
+        record["rows_out"] = rows
+    # The merge needs the whole source frame; this is where streaming stops
+    with stage("read_back", rows_in=rows) as record:
+        df = read_streamed_output(output_path)
+        record["rows_out"] = len(df)
+    return df, len(df), repaired, misses
+
+
+def build_province_timeseries(raw_files: Dict[str, Path]) -> pd.DataFrame:
+    """
+    Province-level cases and deaths from the Province/State columns of the
+    JHU files, one repaired series per (iso3, province), outer-joined on
+    date. Country-level columns are left out; the country totals are in the
+    main timeseries.
+    """
+    keys = ["iso3", "country", "province", "date"]
+    merged = None
+    for source, metric_col in JHU_METRICS.items():
+        wide = read_jhu_wide(raw_files[source])
+        long_df = jhu_long_format(wide, metric_col, DateNormalizer(), by_province=True)
+        long_df = long_df[long_df["province"] != ""]
+        long_df["series"] = long_df["iso3"] + "/" + long_df["province"]
+        long_df = repair_monotonicity(long_df, [metric_col], group_col="series").drop(columns="series")
+        merged = long_df if merged is None else merged.merge(long_df, on=keys, how="outer")
+    return merged[keys + list(JHU_METRICS.values())].sort_values(["iso3", "province", "date"],
+                                                                ignore_index=True)
+
+
+def jhu_iso3_misses(raw_file: Path) -> List[str]:
+    """Country names in a JHU file's header that have no ISO3 mapping (their columns are dropped)."""
+    names, _ = read_jhu_header(raw_file)
+    return sorted({str(name) for name in names if ISO3_RESOLVER.resolve(name) is None})
+
+
+def source_stage_key(cache: StageCache, source: str, raw_file: Path, output_dir: Path,
+                     incremental: bool) -> str:
+    """Cache key of a source stage: raw file contents, mode and, when
+    incremental, the previous output it builds on."""
+    previous = hash_file(output_dir / SOURCE_OUTPUTS[source]) if incremental else ""
+    return cache.key(source, hash_file(raw_file), "incremental" if incremental else "full", previous)
+
+
+def _stage_info(source: str, df: pd.DataFrame, new_rows: int, repaired: Dict[str, int],
+                misses: List[str], normalizer: DateNormalizer, started: float) -> Dict:
+    return {
+        "source": source,
+        "rows": len(df),
+        "new_rows": new_rows,
+        "dates_parsed": normalizer.parsed_count,
+        "dates_failed": normalizer.failed_count,
+        "repaired_points": repaired,
+        "iso3_misses": misses,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _source_stage_worker(source: str, raw_file: Path, output_dir: Path, incremental: bool,
+                         result_path: Path, chunk_cells: Optional[int] = None, trace_memory: bool = False,
+                         profile_dir: Optional[Path] = None) -> Dict:
+    """
+    Process-pool entry point: run a stage and write its frame as Arrow IPC.
+    The stage is measured by a recorder in the worker; its records are
+    returned with the stage info.
+    """
+    started = time.perf_counter()
+    normalizer = DateNormalizer()
+    recorder = StageRecorder(trace_memory=trace_memory, profile_dir=profile_dir)
+    with recording(recorder), recorder.stage(source) as record:
+        df, new_rows, repaired, misses = run_source_stage(source, raw_file, output_dir, incremental,
+                                                          normalizer, chunk_cells)
+        record["rows_out"] = len(df)
+    feather.write_feather(df.reset_index(drop=True), str(result_path), compression="uncompressed")
+    info = _stage_info(source, df, new_rows, repaired, misses, normalizer, started)
+    info["result_path"] = str(result_path)
+    info["records"] = recorder.records
+    return info
+
+
+def run_source_stages(raw_files: Dict[str, Path], output_dir: Path, incremental: bool = False,
+                      workers: int = 1, cache: Optional[StageCache] = None, chunk_cells: Optional[int] = None
+                      ) -> Tuple[Dict[str, pd.DataFrame], Dict[str, Dict]]:
+    """
+    Run every source stage and return (frames, stage_info) keyed by source.
+    
+    With workers > 1 the stages run in a process pool; otherwise they run
+    one after another in this process, sharing a single DateNormalizer.
+    With a cache, stages whose inputs are unchanged are loaded from it.
+    With chunk_cells, full loads are streamed (see run_source_stage); the
+    stage info of a streamed source has streamed=True, as its output file
+    is already written.
+    """
+    frames: Dict[str, pd.DataFrame] = {}
+    stage_info: Dict[str, Dict] = {}
+    
+    pending = dict(raw_files)
+    keys = {}
+    if cache is not None:
+        for source, raw_file in raw_files.items():
+            started = time.perf_counter()
+            keys[source] = source_stage_key(cache, source, raw_file, output_dir, incremental)
+            cached = cache.get(keys[source])
+            if cached is not None:
+                frames[source], stage_info[source] = cached
+                stage_info[source]["cache_hit"] = True
+                stage_info[source]["streamed"] = False
+                del pending[source]
+                add_record({"stage": source, "cache_hit": True, "rows_out": len(frames[source]),
+                            "wall_seconds": round(time.perf_counter() - started, 4)})
+    
+    if workers <= 1 or len(pending) <= 1:
+        normalizer = DateNormalizer()
+        for source, raw_file in pending.items():
+            started = time.perf_counter()
+            parsed, failed = normalizer.parsed_count, normalizer.failed_count
+            with stage(source) as record:
+                frames[source], new_rows, repaired, misses = run_source_stage(
+                    source, raw_file, output_dir, incremental, normalizer, chunk_cells)
+                record["rows_out"] = len(frames[source])
+            info = _stage_info(source, frames[source], new_rows, repaired, misses, normalizer, started)
+            info["dates_parsed"] -= parsed
+            info["dates_failed"] -= failed
+            stage_info[source] = info
+    else:
+        logger.info(f"Running {len(pending)} source stages with {workers} workers")
+        recorder = active_recorder()
+        recorder_options = {"trace_memory": recorder.trace_memory,
+                            "profile_dir": recorder.profile_dir} if recorder is not None else {}
+        with tempfile.TemporaryDirectory(prefix="etl_stages_") as tmp_dir:
+            with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+                futures = {
+                    pool.submit(_source_stage_worker, source, raw_file, output_dir, incremental,
+                                Path(tmp_dir) / f"{source}.arrow", chunk_cells, **recorder_options): source
+                    for source, raw_file in pending.items()
+                }
+                for future in as_completed(futures):
+                    info = future.result()
+                    source = futures[future]
+                    frames[source] = feather.read_table(info.pop("result_path")).to_pandas()
+                    for record in info.pop("records"):
+                        add_record(record)
+                    stage_info[source] = info
+                    logger.info(f"Stage {source} finished in {info['seconds']}s ({info['rows']} rows)")
+    
+    for source in pending:
+        stage_info[source]["cache_hit"] = False
+        stage_info[source]["streamed"] = chunk_cells is not None and not incremental
+        if cache is not None:
+            stage_info[source]["cache_key"] = keys[source]
+            cache.put(keys[source], frames[source], meta=stage_info[source])
+    
+    # Keep the caller's source order regardless of completion order
+    return ({source: frames[source] for source in raw_files},
+            {source: stage_info[source] for source in raw_files})
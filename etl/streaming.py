@@ -0,0 +1,183 @@
+"""
+Chunked streaming ingestion of the raw inputs. Only ingestion is bounded by the
+chunk size; the merge reads the streamed outputs back whole.
+"""
+
+from pathlib import Path
+from typing import List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from dataset_writer import ParquetStreamWriter
+from transform_utils import (
+    DateNormalizer,
+    ISO3_RESOLVER,
+    VACCINATION_COLUMNS,
+    _long_frame,
+    _numeric_block,
+    open_raw,
+    read_jhu_header,
+    resolve_jhu_columns,
+    rollup_provinces,
+)
+
+logger = logging.getLogger(__name__)
+
+# Raw CSV cells per chunk (rows x columns): 8 MB as a float64 block
+DEFAULT_CHUNK_CELLS = 1_000_000
+
+
+class _MonotonicStream:
+    """
+    Forward fill, backfill of leading gaps and running-maximum repair of k
+    cumulative series fed as consecutive (date x series) blocks; the chunked
+    form of repair_monotonicity.
+    """
+    
+    def __init__(self, k: int):
+        self.last = np.full(k, np.nan)
+        self.peak = np.full(k, np.nan)
+        self.started = np.zeros(k, dtype=bool)
+        self.corrected = np.zeros(k, dtype=np.int64)
+        self.seen_dates = []
+    
+    def push(self, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Repair the next block. Returns (values for the series with a report so
+        far, the series that got their first report in this block, the value
+        to backfill their earlier dates with).
+        """
+        n = len(values)
+        seeded = np.vstack([self.last, values])
+        positions = np.where(np.isnan(seeded), 0, np.arange(n + 1)[:, None])
+        np.maximum.accumulate(positions, axis=0, out=positions)
+        filled = seeded[positions, np.arange(seeded.shape[1])][1:]
+        
+        has_value = ~np.isnan(filled)
+        first_row = np.where(has_value.any(axis=0), has_value.argmax(axis=0), n)
+        newly = ~self.started & (first_row < n)
+        first_value = np.where(newly, filled[np.minimum(first_row, n - 1), np.arange(len(first_row))], np.nan)
+        leading = newly & (np.arange(n)[:, None] < first_row)
+        filled = np.where(leading, first_value, filled)
+        
+        repaired = np.fmax.accumulate(np.vstack([self.peak, filled]), axis=0)[1:]
+        self.corrected += ((repaired != filled) & ~np.isnan(filled)).sum(axis=0)
+        self.last, self.peak = filled[-1], repaired[-1]
+        self.started |= newly
+        return repaired, newly, first_value
+
+
+def stream_jhu_source(raw_path: str, metric_col: str, output_path: Path,
+                      date_normalizer: Optional[DateNormalizer] = None,
+                      chunk_cells: int = DEFAULT_CHUNK_CELLS) -> Tuple[int, pd.DataFrame, List[str]]:
+    """
+    Stream a JHU wide CSV into a long, monotonicity-repaired parquet file at
+    output_path. Returns the rows written, the repair report (points
+    corrected per ISO3, as repair_monotonicity returns it) and the sorted
+    country names without an ISO3 mapping. Dates must be ascending.
+    """
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
+    countries, provinces = read_jhu_header(raw_path)
+    iso3, mapped = resolve_jhu_columns(countries)
+    names = np.asarray(pd.unique(countries[mapped]), dtype=object)
+    country_iso3 = dict(zip(countries[mapped], iso3[mapped]))
+    name_iso3 = np.array([country_iso3[name] for name in names], dtype=object)
+    series = _MonotonicStream(len(names))
+    
+    chunk_rows = max(1, chunk_cells // (len(countries) + 1))
+    last_date = None
+    with ParquetStreamWriter(output_path) as writer, open_raw(raw_path) as f:
+        chunks = pd.read_csv(f, header=None, skiprows=1 if provinces is None else 2, dtype={0: str},
+                             names=range(len(countries) + 1), chunksize=chunk_rows)
+        for chunk in chunks:
+            row_dates = date_normalizer.normalize_many(chunk[0].astype(str))
+            valid = pd.notna(row_dates)
+            row_dates = row_dates[valid]
+            if len(row_dates) == 0:
+                continue
+            order = np.argsort(row_dates, kind="stable")
+            row_dates = row_dates[order]
+            if last_date is not None and row_dates[0] <= last_date:
+                raise ValueError(f"{raw_path}: dates are not in ascending order, cannot stream")
+            last_date = row_dates[-1]
+            
+            values = _numeric_block(chunk.iloc[:, 1:])[valid][order][:, mapped]
+            _, totals = rollup_provinces(countries[mapped], values)
+            repaired, newly, first_value = series.push(totals)
+            
+            # Earlier dates of countries that just got their first report
+            if newly.any() and series.seen_dates:
+                earlier = np.concatenate(series.seen_dates)
+                backfill = np.broadcast_to(first_value[newly], (len(earlier), int(newly.sum())))
+                writer.write(_long_frame(earlier, {"country": names[newly], "iso3": name_iso3[newly]},
+                                         metric_col, backfill))
+            started = series.started
+            writer.write(_long_frame(row_dates, {"country": names[started], "iso3": name_iso3[started]},
+                                     metric_col, repaired[:, started]))
+            series.seen_dates.append(row_dates)
+        
+        # Countries without any report keep all-missing series
+        never = ~series.started
+        if never.any() and series.seen_dates:
+            seen = np.concatenate(series.seen_dates)
+            writer.write(_long_frame(seen, {"country": names[never], "iso3": name_iso3[never]},
+                                     metric_col, np.full((len(seen), int(never.sum())), np.nan)))
+        rows = writer.rows
+    
+    report = pd.Series(series.corrected, index=name_iso3).groupby(level=0).sum().to_frame(metric_col)
+    logger.info(f"Streamed {rows} {metric_col} rows to {output_path}, repaired "
+                f"{int(report[metric_col].sum())} non-monotonic points")
+    return rows, report, sorted({str(name) for name in countries[~mapped]})
+
+
+def stream_vaccinations_source(raw_path: str, output_path: Path,
+                               date_normalizer: Optional[DateNormalizer] = None,
+                               chunk_cells: int = DEFAULT_CHUNK_CELLS) -> Tuple[int, List[str]]:
+    """
+    Stream the OWID vaccinations CSV into a parquet file at output_path,
+    forward-filling the metrics per country across chunks. Returns the rows
+    written and the sorted country names without an ISO3 mapping. Each
+    country's dates must be ascending across the file.
+    """
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
+    usecols = ["country", "date"] + VACCINATION_COLUMNS
+    last_values = pd.DataFrame(columns=VACCINATION_COLUMNS, dtype=np.float64)
+    last_dates = pd.Series(dtype=object)
+    misses = set()
+    
+    with ParquetStreamWriter(output_path) as writer, open_raw(raw_path) as f:
+        for chunk in pd.read_csv(f, usecols=usecols, chunksize=max(1, chunk_cells // len(usecols))):
+            chunk["date"] = date_normalizer.normalize_many(chunk["date"])
+            chunk["iso3"] = ISO3_RESOLVER.resolve_many(chunk["country"])
+            misses.update(chunk.loc[chunk["iso3"].isna(), "country"].dropna().astype(str))
+            chunk = chunk.dropna(subset=["date", "iso3"]).sort_values(["iso3", "date"], kind="mergesort")
+            if chunk.empty:
+                continue
+            first_dates = chunk.groupby("iso3", sort=False)["date"].first()
+            previous = last_dates.reindex(first_dates.index).dropna()
+            if (first_dates[previous.index] <= previous).any():
+                raise ValueError(f"{raw_path}: dates are not in ascending order per country, cannot stream")
+            
+            # Seed each country's forward fill with its last values from earlier chunks
+            seeds = last_values[last_values.index.isin(chunk["iso3"])].rename_axis("iso3").reset_index()
+            combined = pd.concat([seeds.assign(_seed=True), chunk.assign(_seed=False)], ignore_index=True)
+            combined = combined.sort_values("iso3", kind="mergesort")
+            combined[VACCINATION_COLUMNS] = combined.groupby("iso3", sort=False)[VACCINATION_COLUMNS].ffill()
+            chunk = combined[~combined["_seed"].to_numpy(dtype=bool)]
+            
+            last_values = chunk.groupby("iso3")[VACCINATION_COLUMNS].last().combine_first(last_values)
+            last_dates = chunk.groupby("iso3")["date"].max().combine_first(last_dates)
+            writer.write(chunk[["date", "country", "iso3"] + VACCINATION_COLUMNS])
+        rows = writer.rows
+    
+    logger.info(f"Streamed {rows} vaccination rows to {output_path}")
+    return rows, sorted(misses)
+
+
+def read_streamed_output(path: Path) -> pd.DataFrame:
+    """A streamed source output in the row order of the in-memory loaders."""
+    return pd.read_parquet(path).sort_values(["iso3", "date"], kind="mergesort", ignore_index=True)
@@ -5,10 +5,16 @@ Handles ISO3 canonicalization, date normalization, monotonicity fixes, and data
 
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Tuple, Optional
+import csv
+import io
 import logging
 
+import pyarrow as pa
+
+from instrumentation import stage
+
 logger = logging.getLogger(__name__)
 
 # ISO3 country mapping - canonical reference
@@ -89,6 +95,10 @@ ISO3_COUNTRY_MAPPING = {
 }
 
 
+# Supported input date formats, in order of preference
+DATE_FORMATS = ["%Y-%m-%d", "%m/%d/%y", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d"]
+
+
 def normalize_date(date_str: str) -> Optional[pd.Timestamp]:
     """Normalize various date formats to pandas Timestamp."""
     if pd.isna(date_str) or date_str == "":
@@ -96,7 +106,7 @@ def normalize_date(date_str: str) -> Optional[pd.Timestamp]:
     
     try:
         # Try common date formats
-        for fmt in ["%Y-%m-%d", "%m/%d/%y", "%m/%d/%Y", "%d/%m/%Y", "%Y/%m/%d"]:
+        for fmt in DATE_FORMATS:
             try:
                 return pd.Timestamp(pd.to_datetime(date_str, format=fmt))
             except:
@@ -108,30 +118,170 @@ def normalize_date(date_str: str) -> Optional[pd.Timestamp]:
         return None
 
 
-def get_iso3_code(country_name: str) -> Optional[str]:
-    """Map country name to ISO3 code."""
-    if pd.isna(country_name):
-        return None
+class DateNormalizer:
+    """
+    Batch date normalizer with a string -> date cache shared across a run.
+
+    For each batch, the format is detected once from a sample of the values
+    not seen before, all of them are parsed in one vectorized call and only
+    the leftovers fall back to per-value normalize_date.
+    """
     
-    # Normalize input
-    country_name_norm = str(country_name).strip().lower()
+    def __init__(self, formats: Optional[List[str]] = None, sample_size: int = 100):
+        self.formats = list(formats or DATE_FORMATS)
+        self.sample_size = sample_size
+        self._cache: Dict[str, Optional[date]] = {}
+        self.parsed_count = 0
+        self.failed_count = 0
     
-    # Direct lookup (case-insensitive, strip whitespace)
-    for key, value in ISO3_COUNTRY_MAPPING.items():
-        if key.strip().lower() == country_name_norm:
-            return value
+    def detect_format(self, values: List[str]) -> Optional[str]:
+        """Return the format that parses most of a sample of values."""
+        sample = pd.Series(values[:self.sample_size], dtype=object)
+        best_fmt, best_hits = None, 0
+        for fmt in self.formats:
+            hits = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+            if hits > best_hits:
+                best_fmt, best_hits = fmt, hits
+                if hits == len(sample):
+                    break
+        return best_fmt
     
-    # Partial match as fallback
-    for key, value in ISO3_COUNTRY_MAPPING.items():
-        if key.strip().lower() in country_name_norm or country_name_norm in key.strip().lower():
-            return value
+    def _parse_new(self, keys: List[str]) -> None:
+        fmt = self.detect_format(keys)
+        if fmt is not None:
+            parsed = pd.to_datetime(pd.Series(keys, dtype=object), format=fmt, errors="coerce")
+        else:
+            parsed = pd.Series(pd.NaT, index=range(len(keys)))
+        
+        leftovers = 0
+        for key, ts in zip(keys, parsed):
+            if pd.isna(ts):
+                leftovers += 1
+                ts = normalize_date(key)
+            self._cache[key] = None if ts is None or pd.isna(ts) else ts.date()
+        logger.debug(f"Parsed {len(keys)} new date strings with format {fmt} "
+                     f"({leftovers} needed per-value parsing)")
+    
+    def normalize_many(self, values) -> np.ndarray:
+        """
+        Normalize a sequence of raw date values to datetime.date objects.
+        Returns an object array with None where a value could not be parsed.
+        """
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+        keys = [str(value) for value in uniques]
+        
+        new_keys = [key for key in keys if key not in self._cache]
+        if new_keys:
+            self._parse_new(new_keys)
+        
+        # Trailing None is picked up by the -1 code pandas uses for missing values
+        resolved = np.array([self._cache[key] for key in keys] + [None], dtype=object)
+        result = resolved[codes]
+        
+        # Blank/missing values are not counted as parse failures
+        counts = np.bincount(codes[codes >= 0], minlength=len(keys))
+        for key, count in zip(keys, counts):
+            if self._cache[key] is not None:
+                self.parsed_count += int(count)
+            elif key != "":
+                self.failed_count += int(count)
+        return result
+
+
+class ISO3Resolver:
+    """
+    Country name -> ISO3 resolver built once from a mapping.
+
+    Exact matches use a normalized hash index; the partial-match fallback uses
+    a precomputed substring index, so a lookup costs O(len(name)^2) instead of
+    O(len(mapping)). Results (including misses) are memoized per raw name.
+    """
     
     # Special fallback for common US variants
-    if country_name_norm in ["united states", "usa", "us", "united states of america"]:
-        return "USA"
+    US_VARIANTS = {"united states", "usa", "us", "united states of america"}
+    
+    def __init__(self, mapping: Dict[str, str]):
+        self._values: List[str] = []
+        self._exact: Dict[str, int] = {}
+        self._substrings: Dict[str, int] = {}
+        for position, (key, value) in enumerate(mapping.items()):
+            key_norm = key.strip().lower()
+            self._values.append(value)
+            self._exact.setdefault(key_norm, position)
+            # Every substring of a key points at the first key containing it
+            for i in range(len(key_norm) + 1):
+                for j in range(i, len(key_norm) + 1):
+                    self._substrings.setdefault(key_norm[i:j], position)
+        self._cache: Dict[str, Optional[str]] = {}
     
-    logger.warning(f"Could not map country: {country_name}")
-    return None
+    @property
+    def misses(self) -> List[str]:
+        """Raw names that could not be mapped so far."""
+        return [name for name, iso3 in self._cache.items() if iso3 is None]
+    
+    def _lookup(self, name_norm: str) -> Optional[str]:
+        # Direct lookup (case-insensitive, strip whitespace)
+        position = self._exact.get(name_norm)
+        if position is not None:
+            return self._values[position]
+        
+        # Partial match as fallback: first mapping key (in mapping order) that
+        # contains the name or is contained in it
+        candidates = []
+        if name_norm in self._substrings:
+            candidates.append(self._substrings[name_norm])
+        for i in range(len(name_norm)):
+            for j in range(i + 1, len(name_norm) + 1):
+                position = self._exact.get(name_norm[i:j])
+                if position is not None:
+                    candidates.append(position)
+        if candidates:
+            return self._values[min(candidates)]
+        
+        if name_norm in self.US_VARIANTS:
+            return "USA"
+        return None
+    
+    def is_exact(self, country_name) -> bool:
+        """Whether a name maps through the exact index rather than a partial match."""
+        return not pd.isna(country_name) and str(country_name).strip().lower() in self._exact
+    
+    def resolve(self, country_name) -> Optional[str]:
+        """Map a single country name to its ISO3 code."""
+        if pd.isna(country_name):
+            return None
+        
+        key = str(country_name)
+        if key in self._cache:
+            return self._cache[key]
+        
+        iso3 = self._lookup(key.strip().lower())
+        if iso3 is None:
+            logger.warning(f"Could not map country: {country_name}")
+        self._cache[key] = iso3
+        return iso3
+    
+    def resolve_many(self, names: pd.Series) -> pd.Series:
+        """Map a series of names by resolving each distinct value once."""
+        codes, uniques = pd.factorize(names)
+        # Trailing None is picked up by the -1 code pandas uses for missing values
+        resolved = np.array([self.resolve(name) for name in uniques] + [None], dtype=object)
+        return pd.Series(resolved[codes], index=names.index, name=names.name)
+
+
+ISO3_RESOLVER = ISO3Resolver(ISO3_COUNTRY_MAPPING)
+
+# Reference display name per ISO3: the first mapping key that is a name
+# rather than a code or abbreviation ("United States", not "US"/"USA")
+ISO3_DISPLAY_NAMES: Dict[str, str] = {}
+for _name, _iso3 in ISO3_COUNTRY_MAPPING.items():
+    if not _name.isupper():
+        ISO3_DISPLAY_NAMES.setdefault(_iso3, _name)
+
+
+def get_iso3_code(country_name: str) -> Optional[str]:
+    """Map country name to ISO3 code."""
+    return ISO3_RESOLVER.resolve(country_name)
 
 
 def fix_monotonicity(series: pd.Series) -> pd.Series:
@@ -139,27 +289,127 @@ def fix_monotonicity(series: pd.Series) -> pd.Series:
     Fix non-monotonic cumulative data by converting to daily differences when needed.
     Cumulative data should never decrease. If it does, reset using daily diffs.
     """
-    result = series.copy()
+    # Fill NaN with forward fill then backward fill, then carry the running
+    # maximum so a decrease is replaced by the previous value
+    return series.fillna(method='ffill').fillna(method='bfill').cummax()
+
+
+def repair_monotonicity(df: pd.DataFrame, metric_cols: List[str], group_col: str = "iso3",
+                        date_col: str = "date", return_report: bool = False):
+    """
+    Repair cumulative metrics for all groups in one grouped pass.
+
+    Equivalent to applying fix_monotonicity to every (group, metric) series:
+    rows are sorted by [group, date], then ffill/bfill and a running maximum
+    are applied per group to all metric columns at once.
+
+    If return_report is True, also returns a frame indexed by group with the
+    number of points per metric that the running maximum corrected.
+    """
+    df = df.sort_values([group_col, date_col])
+    groups = df[group_col]
     
-    # Fill NaN with forward fill then backward fill
-    result = result.fillna(method='ffill').fillna(method='bfill')
+    filled = df.groupby(group_col, sort=False)[metric_cols].ffill()
+    filled = filled.groupby(groups, sort=False).bfill()
+    repaired = filled.groupby(groups, sort=False).cummax()
     
-    # Check for non-monotonic sequences
-    for i in range(1, len(result)):
-        if pd.notna(result.iloc[i]) and pd.notna(result.iloc[i-1]):
-            if result.iloc[i] < result.iloc[i-1]:
-                # Attempt to replace with forward fill value
-                result.iloc[i] = result.iloc[i-1]
+    df[metric_cols] = repaired
+    if not return_report:
+        return df
     
-    return result
+    corrected = (repaired != filled) & filled.notna()
+    report = corrected.groupby(groups, sort=True).sum().astype(np.int64)
+    return df, report
+
+
+def repair_jhu_series(long_df: pd.DataFrame, metric_col: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    repair_monotonicity of a JHU long frame per Country/Region series, so two
+    raw names resolving to one ISO3 are not repaired as one interleaved
+    series. Returns the frame sorted by [iso3, date] and the report per ISO3.
+    """
+    repaired, report = repair_monotonicity(long_df, [metric_col], group_col="country", return_report=True)
+    country_iso3 = repaired.drop_duplicates("country").set_index("country")["iso3"]
+    report = report.groupby(report.index.map(country_iso3)).sum().rename_axis("iso3")
+    return repaired.sort_values(["iso3", "date"], kind="mergesort"), report
 
 
-def long_format_timeseries(df: pd.DataFrame, metric_col: str, date_col: str = "date", 
-                           country_col: str = "country") -> pd.DataFrame:
+def long_format_timeseries(df: pd.DataFrame, metric_col: str, date_col: str = "date",
+                           country_col: str = "country",
+                           date_normalizer: Optional[DateNormalizer] = None) -> pd.DataFrame:
     """
     Convert wide-format country data to long-format timeseries.
     Input: rows=dates, columns=countries
     Output: [date, country, iso3, metric]
+
+    Columnar (melt-style) reshape: ISO3 is resolved once per column, dates are
+    parsed once per unique value and metric cleansing runs on the whole block.
+    """
+    # Rename index if needed
+    if date_col not in df.columns and df.index.name == "Date":
+        df = df.reset_index()
+    
+    date_name = date_col if date_col in df.columns else df.columns[0]
+    country_names = [c for c in df.columns if c != date_name]
+    
+    # Resolve ISO3 once per column
+    countries, iso3_codes = [], []
+    for country in country_names:
+        iso3 = get_iso3_code(country)
+        if iso3 is None:
+            logger.warning(f"Skipping country {country} - no ISO3 mapping")
+            continue
+        countries.append(country)
+        iso3_codes.append(iso3)
+    
+    # Parse each distinct date string once, then broadcast back to the rows
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
+    row_dates = date_normalizer.normalize_many(df[date_name].astype(str))
+    valid_rows = pd.notna(row_dates)
+    row_dates = row_dates[valid_rows]
+    
+    # Non-numeric -> NaN, negative -> NaN, as array operations on the block
+    values = _numeric_block(df.loc[valid_rows, countries])
+    return _long_frame(row_dates, {"country": countries, "iso3": iso3_codes}, metric_col, values)
+
+
+def _numeric_block(block: pd.DataFrame) -> np.ndarray:
+    """Float matrix of a wide block: non-numeric and negative cells become NaN."""
+    is_text = np.array([not pd.api.types.is_numeric_dtype(dtype) for dtype in block.dtypes], dtype=bool)
+    if not is_text.any():
+        values = block.to_numpy(dtype=np.float64, na_value=np.nan)
+    else:
+        # Filled column group by column group; block itself is left untouched
+        values = np.empty(block.shape, dtype=np.float64)
+        values[:, ~is_text] = block.iloc[:, ~is_text].to_numpy(dtype=np.float64, na_value=np.nan)
+        for i in np.flatnonzero(is_text):
+            values[:, i] = pd.to_numeric(block.iloc[:, i], errors="coerce").to_numpy(dtype=np.float64,
+                                                                                     na_value=np.nan)
+    values[values < 0] = np.nan
+    return values
+
+
+def _long_frame(row_dates: np.ndarray, labels: Dict[str, List], metric_col: str,
+                values: np.ndarray) -> pd.DataFrame:
+    """
+    Long frame from a (date x column) matrix: one row per cell, column by
+    column, with each column's labels (country, iso3, ...) repeated.
+    """
+    n_dates, n_cols = values.shape
+    frame = {"date": np.tile(row_dates, n_cols)}
+    for name, column_labels in labels.items():
+        frame[name] = np.repeat(np.array(column_labels, dtype=object), n_dates)
+    # Column-major ravel keeps the column-by-column row order
+    frame[metric_col] = values.ravel(order="F")
+    return pd.DataFrame(frame)
+
+
+def long_format_timeseries_reference(df: pd.DataFrame, metric_col: str, date_col: str = "date",
+                                     country_col: str = "country") -> pd.DataFrame:
+    """
+    Reference (per-cell loop) implementation of long_format_timeseries.
+    Kept to check the vectorized path for equivalence; do not use in the pipeline.
     """
     df = df.copy()
     
@@ -204,74 +454,397 @@ def long_format_timeseries(df: pd.DataFrame, metric_col: str, date_col: str = "d
     return pd.DataFrame(records)
 
 
-def load_and_transform_cases_deaths(cases_path: str, deaths_path: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Load and transform cases and deaths CSVs from Johns Hopkins format."""
-    logger.info("Loading cases data...")
-    cases_df = pd.read_csv(cases_path)
+class JHUWideTable(NamedTuple):
+    """A JHU CONVENIENT wide file: one row per date, one column per (country, province)."""
+    dates: np.ndarray       # raw date strings, one per row
+    countries: np.ndarray   # Country/Region per column
+    provinces: np.ndarray   # Province/State per column, "" for country-level columns
+    values: np.ndarray      # float64 (date x column); non-numeric and negative cells are NaN
+    
+    def select(self, rows=slice(None), cols=slice(None)) -> "JHUWideTable":
+        return JHUWideTable(self.dates[rows], self.countries[cols], self.provinces[cols],
+                            self.values[rows][:, cols])
+
+
+def open_raw(path) -> pa.NativeFile:
+    """
+    Binary stream of a raw input file. Compressed files (.gz, .zst, ...)
+    are decompressed transparently, by extension.
+    """
+    return pa.input_stream(str(path), compression="detect")
+
+
+def read_jhu_header(path: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Country/Region names of a JHU wide CSV's columns (after the date column)
+    and, if the file has the second Province/State header row, the province
+    of each column ("" for country-level columns), else None.
+    """
+    with open_raw(path) as f:
+        reader = csv.reader(io.TextIOWrapper(f, encoding="utf-8", newline=""))
+        countries = next(reader)
+        second = next(reader, [])
+    names = np.array([c.strip() for c in countries[1:]], dtype=object)
+    if not second or second[0].strip().lower() != "province/state":
+        return names, None
+    second = (second + [""] * len(countries))[1:len(countries)]
+    return names, np.array([p.strip() for p in second], dtype=object)
+
+
+def read_jhu_wide(path: str) -> JHUWideTable:
+    """
+    Read a JHU CONVENIENT wide CSV with its two-level header: Country/Region
+    on the first row and Province/State on the second. Files with only the
+    country row are read with empty provinces.
+    """
+    countries, provinces = read_jhu_header(path)
+    with open_raw(path) as f:
+        body = pd.read_csv(f, header=None, skiprows=1 if provinces is None else 2, dtype={0: str},
+                           names=range(len(countries) + 1))
+    return JHUWideTable(
+        dates=body[0].to_numpy(dtype=object),
+        countries=countries,
+        provinces=np.full(len(countries), "", dtype=object) if provinces is None else provinces,
+        values=_numeric_block(body.iloc[:, 1:]),
+    )
+
+
+def rollup_provinces(countries: np.ndarray, values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sum a (date x column) matrix over the columns of each country in one
+    grouped reduction. Missing cells count as 0 unless all of a country's
+    columns are missing on that date. Returns (country names, totals) with
+    countries in first-appearance order.
+    """
+    codes, names = pd.factorize(countries)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0]) if len(codes) else np.array([], dtype=int)
+    if len(starts) == len(codes):
+        return np.asarray(names, dtype=object), values[:, order]
+    ordered = values[:, order]
+    missing = np.isnan(ordered)
+    totals = np.add.reduceat(np.where(missing, 0.0, ordered), starts, axis=1)
+    reported = np.add.reduceat(~missing, starts, axis=1)
+    totals[reported == 0] = np.nan
+    return np.asarray(names, dtype=object), totals
+
+
+def resolve_jhu_columns(countries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ISO3 per column (once per Country/Region name) and the mask of mapped columns."""
+    iso3 = np.array([get_iso3_code(name) for name in countries], dtype=object)
+    mapped = pd.notna(iso3)
+    for name in pd.unique(countries[~mapped]):
+        logger.warning(f"Skipping country {name} - no ISO3 mapping")
+    return iso3, mapped
+
+
+def jhu_long_format(wide: JHUWideTable, metric_col: str, date_normalizer: Optional[DateNormalizer] = None,
+                    by_province: bool = False) -> pd.DataFrame:
+    """
+    Long [date, country, iso3, metric] frame from a JHU wide table, with the
+    province columns of each country summed into country totals. ISO3 is
+    resolved once per country name, so province names never reach the
+    resolver. With by_province=True, returns one series per column instead,
+    with a province column ("" for country-level columns).
+    """
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
+    row_dates = date_normalizer.normalize_many(pd.Series(wide.dates, dtype=object).astype(str))
+    valid_rows = pd.notna(row_dates)
     
-    logger.info("Loading deaths data...")
-    deaths_df = pd.read_csv(deaths_path)
+    iso3, mapped = resolve_jhu_columns(wide.countries)
+    values = wide.values[valid_rows][:, mapped]
     
-    # Transform to long format
-    logger.info("Converting cases to long format...")
-    cases_long = long_format_timeseries(cases_df, metric_col="confirmed_cases")
+    if by_province:
+        labels = {"country": wide.countries[mapped], "province": wide.provinces[mapped], "iso3": iso3[mapped]}
+        return _long_frame(row_dates[valid_rows], labels, metric_col, values)
     
-    logger.info("Converting deaths to long format...")
-    deaths_long = long_format_timeseries(deaths_df, metric_col="deaths")
+    countries, totals = rollup_provinces(wide.countries[mapped], values)
+    country_iso3 = dict(zip(wide.countries[mapped], iso3[mapped]))
+    labels = {"country": countries, "iso3": [country_iso3[name] for name in countries]}
+    return _long_frame(row_dates[valid_rows], labels, metric_col, totals)
+
+
+def load_and_transform_jhu(path: str, metric_col: str,
+                           date_normalizer: Optional[DateNormalizer] = None,
+                           return_repair_report: bool = False):
+    """
+    Load one Johns Hopkins wide CSV (cases or deaths) and return the long,
+    monotonicity-repaired frame, optionally with the repair report.
+    """
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
     
-    # Fix monotonicity
-    logger.info("Fixing monotonicity in cases...")
-    cases_long = cases_long.sort_values(["iso3", "date"])
-    for iso3 in cases_long["iso3"].unique():
-        mask = cases_long["iso3"] == iso3
-        cases_long.loc[mask, "confirmed_cases"] = fix_monotonicity(
-            cases_long.loc[mask, "confirmed_cases"]
-        )
-    
-    logger.info("Fixing monotonicity in deaths...")
-    deaths_long = deaths_long.sort_values(["iso3", "date"])
-    for iso3 in deaths_long["iso3"].unique():
-        mask = deaths_long["iso3"] == iso3
-        deaths_long.loc[mask, "deaths"] = fix_monotonicity(
-            deaths_long.loc[mask, "deaths"]
-        )
+    logger.info(f"Loading {metric_col} data...")
+    with stage("read_csv") as record:
+        wide = read_jhu_wide(path)
+        record["rows_out"] = len(wide.dates)
+    long_df, repair_report = transform_jhu_wide(wide, metric_col, date_normalizer)
     
-    return cases_long, deaths_long
+    if return_repair_report:
+        return long_df, repair_report
+    return long_df
 
 
-def load_and_transform_vaccinations(vacc_path: str) -> pd.DataFrame:
-    """Load and transform vaccinations CSV."""
-    logger.info("Loading vaccinations data...")
-    vacc_df = pd.read_csv(vacc_path)
+def transform_jhu_wide(wide: JHUWideTable, metric_col: str,
+                       date_normalizer: DateNormalizer) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """Long, monotonicity-repaired frame of a JHU wide table, and its repair report."""
+    # Transform to long format, summing provinces into country totals
+    logger.info(f"Converting {metric_col} to long format...")
+    with stage("reshape", rows_in=int(wide.values.size)) as record:
+        long_df = jhu_long_format(wide, metric_col, date_normalizer)
+        record["rows_out"] = len(long_df)
     
-    # Select relevant columns
-    if "country" in vacc_df.columns and "date" in vacc_df.columns:
-        vacc_df = vacc_df[["country", "date", "total_vaccinations", "people_vaccinated", 
-                           "people_fully_vaccinated", "daily_vaccinations"]].copy()
+    # Fix monotonicity
+    logger.info(f"Fixing monotonicity in {metric_col}...")
+    with stage("repair_monotonicity", rows_in=len(long_df)) as record:
+        long_df, repair_report = repair_jhu_series(long_df, metric_col)
+        record["rows_out"] = len(long_df)
+    logger.info(f"Repaired {int(repair_report[metric_col].sum())} non-monotonic {metric_col} points "
+                f"across {int((repair_report[metric_col] > 0).sum())} countries")
+    return long_df, repair_report
+
+
+def load_and_transform_cases_deaths(cases_path: str, deaths_path: str,
+                                    return_repair_report: bool = False,
+                                    date_normalizer: Optional[DateNormalizer] = None) -> Tuple[pd.DataFrame, ...]:
+    """
+    Load and transform cases and deaths CSVs from Johns Hopkins format.
+    With return_repair_report=True, also returns the per-country count of
+    corrected non-monotonic points (see repair_monotonicity).
+    """
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
     
-    # Normalize dates and add ISO3
-    vacc_df["date"] = vacc_df["date"].apply(normalize_date)
-    vacc_df["date"] = vacc_df["date"].dt.date
-    vacc_df["iso3"] = vacc_df["country"].apply(get_iso3_code)
+    cases_long, cases_report = load_and_transform_jhu(
+        cases_path, "confirmed_cases", date_normalizer, return_repair_report=True
+    )
+    deaths_long, deaths_report = load_and_transform_jhu(
+        deaths_path, "deaths", date_normalizer, return_repair_report=True
+    )
     
-    # Drop records without ISO3
-    vacc_df = vacc_df.dropna(subset=["iso3"])
+    if return_repair_report:
+        repair_report = cases_report.join(deaths_report, how="outer").fillna(0).astype(np.int64)
+        return cases_long, deaths_long, repair_report
+    return cases_long, deaths_long
+
+
+# Vaccination metrics kept from the OWID country_vaccinations file
+VACCINATION_COLUMNS = ["total_vaccinations", "people_vaccinated",
+                       "people_fully_vaccinated", "daily_vaccinations"]
+
+
+def read_vaccinations_raw(vacc_path: str, date_normalizer: DateNormalizer, return_misses: bool = False):
+    """
+    Read the vaccinations CSV with normalized dates and ISO3 codes. With
+    return_misses, also returns the sorted country names without an ISO3
+    mapping, whose rows are dropped.
+    """
+    with stage("read_csv") as record, open_raw(vacc_path) as f:
+        vacc_df = pd.read_csv(f)
+        record["rows_out"] = len(vacc_df)
     
+    with stage("normalize", rows_in=len(vacc_df)) as record:
+        # Select relevant columns
+        if "country" in vacc_df.columns and "date" in vacc_df.columns:
+            vacc_df = vacc_df[["country", "date"] + VACCINATION_COLUMNS].copy()
+        
+        # Normalize dates and add ISO3
+        vacc_df["date"] = date_normalizer.normalize_many(vacc_df["date"])
+        vacc_df["iso3"] = ISO3_RESOLVER.resolve_many(vacc_df["country"])
+        misses = sorted(set(vacc_df.loc[vacc_df["iso3"].isna(), "country"].dropna().astype(str)))
+        
+        # Drop records without a parseable date or ISO3
+        vacc_df = vacc_df.dropna(subset=["date", "iso3"])
+        record["rows_out"] = len(vacc_df)
+    return (vacc_df, misses) if return_misses else vacc_df
+
+
+def transform_vaccinations(vacc_df: pd.DataFrame, extra_cols: Optional[List[str]] = None) -> pd.DataFrame:
+    """Sort by [iso3, date] and forward-fill vaccination metrics per country."""
     # Fill missing vaccinations with forward fill
     vacc_df = vacc_df.sort_values(["iso3", "date"])
-    for col in ["total_vaccinations", "people_vaccinated", "people_fully_vaccinated", "daily_vaccinations"]:
-        if col in vacc_df.columns:
-            vacc_df[col] = vacc_df.groupby("iso3")[col].transform(
-                lambda x: x.fillna(method='ffill')
-            )
+    cols = [col for col in VACCINATION_COLUMNS if col in vacc_df.columns]
+    vacc_df[cols] = vacc_df.groupby("iso3", sort=False)[cols].ffill()
+    
+    return vacc_df[["date", "country", "iso3"] + VACCINATION_COLUMNS + (extra_cols or [])]
+
+
+def load_and_transform_vaccinations(vacc_path: str, date_normalizer: Optional[DateNormalizer] = None,
+                                    return_misses: bool = False):
+    """Load and transform vaccinations CSV (with return_misses, also the unmapped country names)."""
+    if date_normalizer is None:
+        date_normalizer = DateNormalizer()
+    
+    logger.info("Loading vaccinations data...")
+    vacc_df, misses = read_vaccinations_raw(vacc_path, date_normalizer, return_misses=True)
+    with stage("transform", rows_in=len(vacc_df)) as record:
+        vacc_df = transform_vaccinations(vacc_df)
+        record["rows_out"] = len(vacc_df)
     
     logger.info(f"Loaded {len(vacc_df)} vaccination records")
-    return vacc_df[["date", "country", "iso3", "total_vaccinations", "people_vaccinated", 
-                    "people_fully_vaccinated", "daily_vaccinations"]]
+    return (vacc_df, misses) if return_misses else vacc_df
+
+
+def _day_ordinals(dates) -> np.ndarray:
+    """Dates (datetime.date objects or datetime64) as int64 days since the epoch."""
+    return pd.to_datetime(pd.Series(dates)).to_numpy().astype("datetime64[D]").astype(np.int64)
+
+
+def _dedupe_by_key(keys: np.ndarray, countries: pd.Series, iso3: pd.Series) -> np.ndarray:
+    """
+    Positions of one row per key, in key order. When several source spellings
+    map to the same (iso3, date), prefer the reference display name, then any
+    exact mapping match, then the first row.
+    """
+    order = np.argsort(keys, kind="stable")
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = keys[order][1:] != keys[order][:-1]
+    if first.all():
+        return order
+    
+    names = pd.unique(countries)
+    exact = countries.map(dict(zip(names, map(ISO3_RESOLVER.is_exact, names)))).to_numpy(dtype=bool)
+    is_display = countries.to_numpy() == iso3.map(ISO3_DISPLAY_NAMES).to_numpy()
+    rank = np.where(is_display, 0, np.where(exact, 1, 2))
+    # lexsort is stable, so equal ranks keep their original order
+    order = np.lexsort((rank, keys))
+    return order[first]
+
+
+def merge_sources(cases_df: pd.DataFrame, deaths_df: pd.DataFrame, vacc_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Join cases, deaths and vaccinations into one timeseries frame.
+    
+    The join runs on integer keys (ISO3 code, day ordinal) with sorted array
+    alignment: cases and deaths are outer-joined, vaccinations left-joined.
+    Each source keeps one row per (iso3, date), and the country display name
+    is attached afterwards from ISO3_DISPLAY_NAMES, so differing source
+    spellings of a country cannot produce extra rows.
+    """
+    sources = [("cases", cases_df, ["confirmed_cases"]),
+               ("deaths", deaths_df, ["deaths"]),
+               ("vaccinations", vacc_df, VACCINATION_COLUMNS)]
+    iso3_codes = np.array(sorted(set().union(*(df["iso3"].unique() for _, df, _ in sources))), dtype=object)
+    days = {name: _day_ordinals(df["date"]) for name, df, _ in sources}
+    nonempty = [d for d in days.values() if len(d)]
+    min_day = min(d.min() for d in nonempty) if nonempty else 0
+    span = (max(d.max() for d in nonempty) - min_day + 1) if nonempty else 1
+    
+    # Encode each source as sorted unique keys plus aligned metric arrays
+    encoded = {}
+    for name, df, cols in sources:
+        codes = pd.Categorical(df["iso3"], categories=iso3_codes).codes.astype(np.int64)
+        keys = codes * span + (days[name] - min_day)
+        keep = _dedupe_by_key(keys, df["country"].reset_index(drop=True), df["iso3"].reset_index(drop=True))
+        if len(keep) < len(keys):
+            logger.info(f"Dropped {len(keys) - len(keep)} {name} rows duplicating an (iso3, date) key")
+        encoded[name] = (keys[keep], {col: df[col].to_numpy(dtype=np.float64, na_value=np.nan)[keep]
+                                      for col in cols})
+    
+    logger.info("Joining cases, deaths and vaccinations on (iso3, date) keys...")
+    keys = np.union1d(encoded["cases"][0], encoded["deaths"][0])
+    columns = {}
+    for name, _, cols in sources:
+        source_keys, values = encoded[name]
+        pos = np.searchsorted(keys, source_keys)
+        matched = pos < len(keys)
+        matched[matched] = keys[pos[matched]] == source_keys[matched]
+        for col in cols:
+            aligned = np.full(len(keys), np.nan)
+            aligned[pos[matched]] = values[col][matched]
+            columns[col] = aligned
+    
+    # Decode keys and attach display names from the reference table
+    iso3 = iso3_codes[keys // span]
+    names = np.array([ISO3_DISPLAY_NAMES.get(code, code) for code in iso3_codes], dtype=object)
+    result = pd.DataFrame({
+        "date": (keys % span + min_day).astype("datetime64[D]").astype("datetime64[ns]"),
+        "country": names[keys // span],
+        "iso3": iso3,
+    })
+    for col, values in columns.items():
+        result[col] = values
+    return result
+
+
+def _compact_metric(values: pd.Series) -> pd.Series:
+    """Smallest dtype that holds a metric column without changing any value."""
+    data = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    finite = data[~np.isnan(data)]
+    if len(finite) == len(data) and np.array_equal(finite, np.round(finite)):
+        for int_type in (np.int32, np.int64):
+            info = np.iinfo(int_type)
+            if len(finite) == 0 or (finite.min() >= info.min and finite.max() <= info.max):
+                return values.astype(int_type)
+    if np.array_equal(finite.astype(np.float32).astype(np.float64), finite):
+        return values.astype(np.float32)
+    return values.astype(np.float64)
+
+
+def apply_compact_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Canonical compact schema for the merged timeseries:
+    categorical iso3/country, datetime64 dates (written as date32) and
+    int32/int64/float32 metrics wherever every value fits exactly. Boolean
+    flag columns are kept as they are.
+    """
+    df = df.copy()
+    for col in ["iso3", "country"]:
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    df["date"] = pd.to_datetime(df["date"])
+    for col in df.columns:
+        if col in ("date", "iso3", "country") or pd.api.types.is_bool_dtype(df[col]):
+            continue
+        if pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = _compact_metric(df[col])
+    return df
+
+
+def memory_footprint(df: pd.DataFrame) -> Dict[str, int]:
+    """Deep memory usage in bytes per column, plus the total."""
+    usage = df.memory_usage(deep=True, index=False)
+    report = {col: int(size) for col, size in usage.items()}
+    report["total"] = int(usage.sum())
+    return report
+
+
+def log_memory_footprint(before: Dict[str, int], after: Dict[str, int]) -> None:
+    """Log a before/after memory report produced by memory_footprint."""
+    logger.info("Memory footprint (before -> after):")
+    for col in before:
+        logger.info(f"  {col:<25} {before[col] / 1024 ** 2:9.2f} MB -> {after.get(col, 0) / 1024 ** 2:9.2f} MB")
+
+
+# Global daily totals: output column -> summed timeseries column
+GLOBAL_DAILY_METRICS = {
+    "total_confirmed_cases": "confirmed_cases",
+    "total_deaths": "deaths",
+    "total_vaccinations": "total_vaccinations",
+    "people_fully_vaccinated": "people_fully_vaccinated",
+}
+
+
+def build_global_daily(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per date with global totals, computed in a single grouped pass.
+    
+    Matches /api/v1/summary: each metric is summed over countries (0 when
+    no country reports it) and countries_affected counts countries with
+    confirmed_cases > 0. Sums are taken in float64 so float32 metrics
+    from the compact schema do not lose precision.
+    """
+    values = pd.DataFrame({out: df[col].astype(np.float64) for out, col in GLOBAL_DAILY_METRICS.items()})
+    values["countries_affected"] = (df["confirmed_cases"] > 0).astype(np.int32)
+    daily = values.groupby(pd.to_datetime(df["date"]).to_numpy(), sort=True).sum()
+    daily["countries_affected"] = daily["countries_affected"].astype(np.int32)
+    daily.index.name = "date"
+    return daily.reset_index()
 
 
 def validate_data(df: pd.DataFrame) -> bool:
-    """Validate data quality."""
+    """Validate the structure of the merged frame: non-empty, with the key columns."""
     if df.empty:
         logger.error("Data frame is empty")
         return False
@@ -287,10 +860,5 @@ def validate_data(df: pd.DataFrame) -> bool:
     max_date = df["date"].max()
     logger.info(f"Date range: {min_date} to {max_date}")
     
-    # Check for reasonable metric values
-    for col in df.columns:
-        if col not in required_cols and df[col].dtype in [np.float64, np.int64]:
-            null_pct = df[col].isna().sum() / len(df) * 100
-            logger.info(f"Column {col}: {null_pct:.1f}% null values")
-    
+    # Null rates, gaps and duplicates are covered by the quality profile (quality.py)
     return True
@@ -2,14 +2,35 @@
 COVID-19 Data API - FastAPI backend serving timeseries and aggregated data.
 """
 
-from fastapi import FastAPI, Query, HTTPException
+from fastapi import FastAPI, Header, Query, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Mapping, NamedTuple, Optional, Dict, Any, Tuple
 from datetime import date, datetime
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from pathlib import Path
+from types import MappingProxyType
+import asyncio
+import hmac
+import json
 import logging
+import os
+import sys
+import threading
+import time
+
+try:
+    import orjson
+except ImportError:  # in requirements.txt; the json module is the slower fallback
+    orjson = None
+
+# Metric definitions and global totals come from the ETL (etl/ ships next to services/api/)
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "etl"))
+from derived_metrics import DERIVED_METRICS  # noqa: E402
+from transform_utils import GLOBAL_DAILY_METRICS, build_global_daily  # noqa: E402
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,55 +51,336 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global data cache
-_data_cache = {}
-_last_load_time = None
+# Dataset being served, replaced whole by install_dataset
+_dataset = None
+# Serializes reloads; requests never take it
+_reload_lock = threading.Lock()
+
+# Cumulative metrics served per country; the ETL's DERIVED_METRICS are opt-in
+BASE_METRICS = [
+    "confirmed_cases",
+    "deaths",
+    "total_vaccinations",
+    "people_vaccinated",
+    "people_fully_vaccinated",
+    "daily_vaccinations",
+]
+VACCINATION_METRICS = [m for m in BASE_METRICS if "vaccin" in m]
+
+# Locations checked for the ETL outputs, in order
+REPO_ROOT = Path(__file__).parent.parent.parent
+OUTPUT_DIRS = [REPO_ROOT / "etl" / "output", REPO_ROOT / "output"]
+
+# Manifest of the published version, written atomically by the ETL's
+# versioned publish; it points at the version directory to serve
+CURRENT_FILE = "current.json"
+
+# How load_data reads the timeseries: "parquet" decodes timeseries.parquet into
+# memory; "mmap" memory-maps the uncompressed timeseries.arrow so startup is
+# near-instant and worker processes share the pages through the OS page cache
+LOAD_MODE = os.environ.get("COVID_API_LOAD_MODE", "parquet")
+FEATHER_FILE = "timeseries.arrow"
+
+# Seconds between checks for a newly published version (current.json);
+# 0 disables the background refresher
+RELOAD_INTERVAL = float(os.environ.get("COVID_API_RELOAD_INTERVAL", "30"))
+# Token required by the admin endpoints in the X-Admin-Token header; they are
+# disabled (404) while it is unset
+ADMIN_TOKEN = os.environ.get("COVID_API_ADMIN_TOKEN")
+
+# Per-date global totals written by the ETL next to timeseries.parquet
+GLOBAL_DAILY_FILE = "global_daily.parquet"
+
 
 
+# Shapes of /api/v1/countries/{iso3}/timeseries data: a list of per-date
+# objects, or one array per column (date first) for charting clients
+TIMESERIES_FORMATS = ["rows", "columnar"]
+
 
 # ============ Response Schemas (plain structures) ============
 # Pydantic model classes removed for compatibility with pydantic v2.
 # Endpoints will return plain dict/list structures instead of BaseModel instances.
 
-# ============ Helper Functions ============
-
-def load_data():
-    """Load parquet data into cache."""
-    global _data_cache, _last_load_time
+class Dataset(NamedTuple):
+    """
+    Data served by the API, built once per load by build_dataset and never
+    modified afterwards. Rows are sorted by (iso3, date); every array is
+    read-only, so requests share one Dataset without locks and a reload
+    replaces it with a single assignment.
+    """
+    dates: np.ndarray  # datetime64[ns] per row
+    columns: Mapping[str, np.ndarray]  # metric -> values per row, in the stored dtype
+    ranges: Mapping[str, Tuple[int, int]]  # iso3 -> contiguous row range
+    names: Mapping[str, str]  # iso3 -> country name
+    countries: Tuple[Tuple[str, str], ...]  # (iso3, name), sorted by name
+    daily_dates: np.ndarray  # datetime64[ns] of the per-date global totals, ascending
+    daily: Mapping[str, np.ndarray]  # summary field -> global total per daily date
+    manifest: Optional[Dict]
+    loaded_at: datetime
+    source: Tuple = ()  # _output_signature (published versions) when it was loaded
     
-    # Check both possible output locations for generated parquet files
-    repo_root = Path(__file__).parent.parent.parent
-    candidates = [repo_root / "etl" / "output", repo_root / "output"]
+    @property
+    def rows(self) -> int:
+        return len(self.dates)
 
-    try:
-        timeseries_file = None
-        for d in candidates:
-            candidate = d / "timeseries.parquet"
-            if candidate.exists():
-                timeseries_file = candidate
-                break
-
-        if timeseries_file is None:
-            logger.warning(f"Timeseries file not found in {candidates}")
-            return False
 
-        logger.info(f"Loading timeseries from {timeseries_file}")
-        df = pd.read_parquet(timeseries_file)
-        _data_cache["timeseries"] = df
-        _last_load_time = datetime.now()
-        logger.info(f"Loaded {len(df)} records from {len(df['iso3'].unique())} countries")
-        return True
+# ============ Helper Functions ============
+
+def load_data() -> bool:
+    """Load the ETL output into a new Dataset and serve it."""
+    try:
+        dataset = load_dataset()
     except Exception as e:
         logger.error(f"Failed to load data: {e}")
         return False
+    if dataset is None:
+        return False
+    install_dataset(dataset)
+    return True
 
 
-def get_timeseries_df() -> Optional[pd.DataFrame]:
-    """Get cached timeseries dataframe."""
-    if "timeseries" not in _data_cache:
-        if not load_data():
-            return None
-    return _data_cache.get("timeseries")
+def load_dataset() -> Optional[Dataset]:
+    """Read the ETL output into a new Dataset, or None if there is no output."""
+    # Check both possible output locations for generated parquet files
+    candidates = OUTPUT_DIRS
+    # Taken before reading, so a write racing the load is seen by the next check
+    source = _output_signature(candidates)
+    
+    data_dir, manifest = _find_output(candidates)
+    if data_dir is None:
+        logger.warning(f"Timeseries file not found in {candidates}")
+        return None
+    timeseries_file = data_dir / "timeseries.parquet"
+    if manifest is not None:
+        logger.info(f"Serving published version {manifest['version']}")
+    
+    feather_file = timeseries_file.parent / FEATHER_FILE
+    if LOAD_MODE == "mmap" and feather_file.exists():
+        logger.info(f"Memory-mapping timeseries from {feather_file}")
+        df = _read_mmap(feather_file)
+    else:
+        if LOAD_MODE == "mmap":
+            logger.warning(f"{feather_file} not found, falling back to parquet")
+        logger.info(f"Loading timeseries from {timeseries_file}")
+        # Keep the compact ETL dtypes: categorical strings, date32 -> datetime64
+        # instead of Python date objects, narrow integer/float32 metrics
+        df = pq.read_table(timeseries_file).to_pandas(date_as_object=False)
+    
+    global_daily_file = timeseries_file.parent / GLOBAL_DAILY_FILE
+    daily = None
+    if global_daily_file.exists():
+        daily = pq.read_table(global_daily_file).to_pandas(date_as_object=False).set_index("date")
+    dataset = build_dataset(df, daily, manifest, source)
+    logger.info(f"Loaded {dataset.rows} records from {len(dataset.ranges)} countries")
+    return dataset
+
+
+def install_dataset(dataset: Dataset) -> None:
+    """
+    Serve dataset from now on. A single reference assignment: requests in
+    flight keep the Dataset they started with.
+    """
+    global _dataset
+    _dataset = dataset
+
+
+def reload_data(force: bool = False) -> bool:
+    """
+    Build a new Dataset from the ETL output and swap it in, unless no new
+    version was published since the served Dataset was loaded (checked unless force).
+    Returns whether a new Dataset was installed; on failure the served one stays.
+    """
+    with _reload_lock:
+        dataset = _dataset
+        if not force and dataset is not None and dataset.source == _output_signature(OUTPUT_DIRS):
+            return False
+        return load_data()
+
+
+async def _refresh_periodically(interval: float):
+    """Background task: reload whenever a new version is published, in a worker thread."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(reload_data)
+        except Exception as e:
+            logger.error(f"Background reload failed: {e}")
+
+
+def _output_signature(candidates: List[Path]) -> Tuple:
+    """
+    Published version named by each candidate's current.json (None without
+    one). Only the atomic current.json switch marks a complete output; files
+    written in place may be caught halfway, so they are never watched.
+    """
+    signature = []
+    for d in candidates:
+        try:
+            signature.append(json.loads((d / CURRENT_FILE).read_text())["version"])
+        except FileNotFoundError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def _find_output(candidates: List[Path]):
+    """
+    (directory holding timeseries.parquet, published manifest) for the first
+    candidate with outputs. A published version (current.json) takes
+    precedence over files written in place; the manifest is None for those.
+    """
+    for d in candidates:
+        current = d / CURRENT_FILE
+        if current.exists():
+            manifest = json.loads(current.read_text())
+            if (d / manifest["path"] / "timeseries.parquet").exists():
+                return d / manifest["path"], manifest
+            logger.warning(f"Published version {manifest['version']} has no timeseries in {d}")
+        if (d / "timeseries.parquet").exists():
+            return d, None
+    return None, None
+
+
+def _read_mmap(path: Path) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC file written by the ETL. Its single record batch
+    without null bitmaps converts to pandas without copying, so the columns
+    are read-only views on the mapped file.
+    """
+    source = pa.memory_map(str(path), "r")
+    table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True, date_as_object=False)
+
+
+def _date_column(df: pd.DataFrame) -> pd.Series:
+    """Date column as datetime64, converting legacy object (datetime.date) columns."""
+    dates = df["date"]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    return dates
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    values = values.view()
+    values.flags.writeable = False
+    return values
+
+
+def _metric_array(column: pd.Series) -> np.ndarray:
+    """
+    Values of a metric column as a read-only numpy array. Numeric columns keep
+    their stored dtype without copying (memory-mapped columns stay views);
+    object or nullable columns are converted to float64 with NaN once here.
+    """
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind in "biuf":
+        return _read_only(column.to_numpy())
+    return _read_only(pd.to_numeric(column, errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan))
+
+
+def build_dataset(df: pd.DataFrame, global_daily: Optional[pd.DataFrame] = None,
+                  manifest: Optional[Dict] = None, source: Tuple = ()) -> Dataset:
+    """
+    Dataset of the timeseries frame df. df is sorted by (iso3, date) first
+    unless it already is, so memory-mapped columns of an ETL output stay
+    zero-copy views; df itself is not modified. global_daily (the ETL's
+    per-date totals indexed by date) is computed from df if not given.
+    """
+    codes, uniques = pd.factorize(df["iso3"].to_numpy(dtype=object), sort=True)
+    dates = _date_column(df).to_numpy(dtype="datetime64[ns]")
+    new_country = np.r_[True, codes[1:] != codes[:-1]]
+    in_order = (np.diff(codes) >= 0).all() and (np.diff(dates)[~new_country[1:]] >= np.timedelta64(0)).all()
+    if not in_order:
+        order = np.lexsort((dates, codes))
+        df = df.take(order).reset_index(drop=True)
+        codes, dates = codes[order], dates[order]
+        new_country = np.r_[True, codes[1:] != codes[:-1]]
+    starts = np.flatnonzero(new_country[:len(codes)])
+    stops = np.r_[starts[1:], len(codes)]
+    iso3 = [str(uniques[codes[start]]) for start in starts]
+    ranges = {code: (int(start), int(stop)) for code, start, stop in zip(iso3, starts, stops)}
+    names = dict(zip(iso3, df["country"].to_numpy(dtype=object)[starts].astype(str)))
+    
+    if global_daily is None:
+        global_daily = build_global_daily(df).set_index("date")
+    elif not global_daily.index.is_monotonic_increasing:
+        global_daily = global_daily.sort_index()
+    daily_fields = list(GLOBAL_DAILY_METRICS) + ["countries_affected"]
+    
+    return Dataset(
+        dates=_read_only(dates),
+        columns=MappingProxyType({col: _metric_array(df[col]) for col in BASE_METRICS + DERIVED_METRICS
+                                  if col in df.columns}),
+        ranges=MappingProxyType(ranges),
+        names=MappingProxyType(names),
+        countries=tuple(sorted(names.items(), key=lambda item: item[1])),
+        daily_dates=_read_only(global_daily.index.to_numpy(dtype="datetime64[ns]")),
+        daily=MappingProxyType({field: _read_only(global_daily[field].to_numpy()) for field in daily_fields}),
+        manifest=manifest,
+        loaded_at=datetime.now(),
+        source=source,
+    )
+
+
+def get_dataset() -> Dataset:
+    """The served Dataset, loaded on first use. Raises 503 if there is no data."""
+    dataset = _dataset
+    if dataset is None and load_data():
+        dataset = _dataset
+    if dataset is None or dataset.rows == 0:
+        raise HTTPException(status_code=503, detail="Data not available")
+    return dataset
+
+
+def _encode_columns(dates: np.ndarray, columns: Dict[str, Optional[np.ndarray]]) -> Dict[str, list]:
+    """
+    JSON-ready lists per column, converted from the numpy arrays in one step
+    each: dates as YYYY-MM-DD, metrics as floats with NaN (or a column given
+    as None) as None.
+    """
+    encoded = {"date": np.datetime_as_string(dates, unit="D").tolist()}
+    for col, values in columns.items():
+        if values is None:
+            encoded[col] = [None] * len(dates)
+            continue
+        values = values.astype(np.float64)
+        cells = values.astype(object)
+        cells[np.isnan(values)] = None
+        encoded[col] = cells.tolist()
+    return encoded
+
+
+def _json_response(payload: Any) -> Response:
+    """Encode payload (plain lists, dicts and scalars) directly, bypassing jsonable_encoder."""
+    if orjson is not None:
+        content = orjson.dumps(payload)
+    else:
+        content = json.dumps(payload, separators=(",", ":"), allow_nan=False).encode()
+    return Response(content=content, media_type="application/json")
+
+
+def _rows_or_columns(encoded: Dict[str, list], data_format: str):
+    """Encoded columns as a list of per-date objects ("rows") or as they are ("columnar")."""
+    if data_format == "rows":
+        keys = list(encoded)
+        return [dict(zip(keys, point)) for point in zip(*encoded.values())]
+    return encoded
+
+
+def _metric_columns(metric: str, dataset: Dataset) -> List[str]:
+    """
+    Columns to serve for a metric selector: "all" (the base metrics),
+    "derived" (the derived metrics in the dataset), "vaccinations", or one
+    metric name.
+    """
+    if metric == "all":
+        return BASE_METRICS
+    if metric == "derived":
+        return [m for m in DERIVED_METRICS if m in dataset.columns]
+    if metric == "vaccinations":
+        return VACCINATION_METRICS
+    if metric in BASE_METRICS or (metric in DERIVED_METRICS and metric in dataset.columns):
+        return [metric]
+    raise HTTPException(status_code=400, detail=f"Unknown metric {metric}")
 
 
 # ============ API Endpoints ============
@@ -88,150 +390,181 @@ async def startup_event():
     """Load data on startup."""
     logger.info("Starting COVID-19 API...")
     load_data()
+    if RELOAD_INTERVAL > 0:
+        app.state.refresher = asyncio.create_task(_refresh_periodically(RELOAD_INTERVAL))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the background refresher."""
+    refresher = getattr(app.state, "refresher", None)
+    if refresher is not None:
+        refresher.cancel()
 
 
 @app.get("/health", tags=["Health"])
 async def health_check():
     """Check API health."""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    dataset = _dataset
+    return {
+        "status": "healthy",
+        "timestamp": datetime.now().isoformat(),
+        "data_version": dataset.manifest["version"] if dataset and dataset.manifest else None,
+    }
 
 
 @app.get("/api/v1/countries", tags=["Countries"])
 async def list_countries():
     """Get list of all countries in dataset."""
-    df = get_timeseries_df()
-    if df is None or df.empty:
-        raise HTTPException(status_code=503, detail="Data not available")
-    
-    countries = df[["iso3", "country"]].drop_duplicates().sort_values("country")
-    return [
-        {"iso3": row["iso3"], "name": row["country"]}
-        for _, row in countries.iterrows()
-    ]
+    dataset = get_dataset()
+    return [{"iso3": iso3, "name": name} for iso3, name in dataset.countries]
 
 
 @app.get("/api/v1/summary", tags=["Summary"])
 async def global_summary(date_param: Optional[date] = Query(None, description="Date (YYYY-MM-DD), defaults to latest")):
     """Get global aggregated summary for a specific date."""
-    df = get_timeseries_df()
-    if df is None or df.empty:
-        raise HTTPException(status_code=503, detail="Data not available")
-    
-    # Convert date column to date type if needed
-    if df["date"].dtype == "object":
-        df["date"] = pd.to_datetime(df["date"]).dt.date
+    dataset = get_dataset()
     
+    # Binary search in the per-date totals; missing metrics sum to 0
+    daily_dates = dataset.daily_dates
+    if len(daily_dates) == 0:
+        raise HTTPException(status_code=404, detail="No daily totals available")
     if date_param is None:
-        date_param = df["date"].max()
-    
-    # Filter for the specific date
-    day_data = df[df["date"] == date_param]
-    if day_data.empty:
-        raise HTTPException(status_code=404, detail=f"No data for date {date_param}")
-    
-    # Calculate vaccination totals using only non-null values per country
-    total_vacc = day_data["total_vaccinations"].sum()
-    if pd.isna(total_vacc):
-        total_vacc = 0
-    
-    fully_vacc = day_data["people_fully_vaccinated"].sum()
-    if pd.isna(fully_vacc):
-        fully_vacc = 0
+        i = len(daily_dates) - 1
+        date_param = daily_dates[i].astype("datetime64[D]").item()
+    else:
+        i = int(np.searchsorted(daily_dates, np.datetime64(date_param, "ns")))
+        if i == len(daily_dates) or daily_dates[i] != np.datetime64(date_param, "ns"):
+            raise HTTPException(status_code=404, detail=f"No data for date {date_param}")
     
     return {
         "date": str(date_param),
-        "total_confirmed_cases": float(day_data["confirmed_cases"].sum() or 0),
-        "total_deaths": float(day_data["deaths"].sum() or 0),
-        "total_vaccinations": float(total_vacc),
-        "people_fully_vaccinated": float(fully_vacc),
-        "countries_affected": int((day_data["confirmed_cases"] > 0).sum())
+        **{field: float(dataset.daily[field][i]) for field in GLOBAL_DAILY_METRICS},
+        "countries_affected": int(dataset.daily["countries_affected"][i])
     }
 
 
+@app.get("/api/v1/summary/series", tags=["Summary"])
+async def global_summary_series(
+    from_date: Optional[date] = Query(None, alias="from", description="Start date (YYYY-MM-DD)"),
+    to_date: Optional[date] = Query(None, alias="to", description="End date (YYYY-MM-DD)"),
+    data_format: str = Query("rows", alias="format",
+                             description="rows (a list of per-date objects) or columnar (one array per column)")
+):
+    """Global totals for every date in a range, for trend charts."""
+    dataset = get_dataset()
+    if data_format not in TIMESERIES_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {data_format}")
+    
+    # Binary search on the sorted daily dates
+    daily_dates = dataset.daily_dates
+    start = int(np.searchsorted(daily_dates, np.datetime64(from_date, "ns"), side="left")) if from_date else 0
+    stop = int(np.searchsorted(daily_dates, np.datetime64(to_date, "ns"), side="right")) if to_date else len(daily_dates)
+    window = slice(start, max(start, stop))
+    
+    encoded = _encode_columns(daily_dates[window],
+                              {field: dataset.daily[field][window] for field in GLOBAL_DAILY_METRICS})
+    encoded["countries_affected"] = dataset.daily["countries_affected"][window].astype("int64").tolist()
+    return _json_response({
+        "from": str(from_date) if from_date else None,
+        "to": str(to_date) if to_date else None,
+        "data": _rows_or_columns(encoded, data_format)
+    })
+
+
 @app.get("/api/v1/countries/{iso3}/timeseries", tags=["Timeseries"])
 async def country_timeseries(
     iso3: str,
-    metric: Optional[str] = Query("all", description="Metric: confirmed_cases, deaths, vaccinations, or all"),
+    metric: Optional[str] = Query("all", description="Metric name (see /api/v1/metrics), vaccinations, derived, or all"),
     from_date: Optional[date] = Query(None, description="Start date (YYYY-MM-DD)"),
-    to_date: Optional[date] = Query(None, description="End date (YYYY-MM-DD)")
+    to_date: Optional[date] = Query(None, description="End date (YYYY-MM-DD)"),
+    data_format: str = Query("rows", alias="format",
+                             description="rows (a list of per-date objects) or columnar (one array per column)")
 ):
     """Get timeseries data for a specific country."""
-    df = get_timeseries_df()
-    if df is None or df.empty:
-        raise HTTPException(status_code=503, detail="Data not available")
+    dataset = get_dataset()
+    columns = _metric_columns(metric, dataset)
+    if data_format not in TIMESERIES_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {data_format}")
     
-    # Filter by ISO3
+    # The country's row range, narrowed to the date range by binary search
     iso3_upper = iso3.upper()
-    country_data = df[df["iso3"] == iso3_upper].copy()
-    
-    if country_data.empty:
+    if iso3_upper not in dataset.ranges:
         raise HTTPException(status_code=404, detail=f"Country {iso3} not found")
-    
-    # Convert date column
-    if country_data["date"].dtype == "object":
-        country_data["date"] = pd.to_datetime(country_data["date"]).dt.date
-    
-    # Filter by date range
+    start, stop = dataset.ranges[iso3_upper]
+    dates = dataset.dates[start:stop]
     if from_date:
-        country_data = country_data[country_data["date"] >= from_date]
+        start += int(np.searchsorted(dates, np.datetime64(from_date, "ns"), side="left"))
     if to_date:
-        country_data = country_data[country_data["date"] <= to_date]
-    
-    country_data = country_data.sort_values("date")
-    
-    country_name = country_data["country"].iloc[0] if not country_data.empty else iso3
+        stop -= len(dates) - int(np.searchsorted(dates, np.datetime64(to_date, "ns"), side="right"))
+    rows = slice(start, max(start, stop))
     
-    # Build response
-    data_points = []
-    for _, row in country_data.iterrows():
-        data_points.append({
-            "date": str(row["date"]),
-            "confirmed_cases": float(row["confirmed_cases"]) if pd.notna(row["confirmed_cases"]) else None,
-            "deaths": float(row["deaths"]) if pd.notna(row["deaths"]) else None,
-            "total_vaccinations": float(row["total_vaccinations"]) if pd.notna(row["total_vaccinations"]) else None,
-            "people_vaccinated": float(row.get("people_vaccinated")) if pd.notna(row.get("people_vaccinated")) else None,
-            "people_fully_vaccinated": float(row.get("people_fully_vaccinated")) if pd.notna(row.get("people_fully_vaccinated")) else None,
-            "daily_vaccinations": float(row.get("daily_vaccinations")) if pd.notna(row.get("daily_vaccinations")) else None,
-        })
-    
-    return {
+    # Build response from the column arrays; derived metrics are precomputed by the ETL
+    encoded = _encode_columns(dataset.dates[rows], {
+        col: dataset.columns[col][rows] if col in dataset.columns else None for col in columns
+    })
+    return _json_response({
         "iso3": iso3_upper,
-        "country": country_name,
-        "data": data_points
-    }
+        "country": dataset.names[iso3_upper],
+        "data": _rows_or_columns(encoded, data_format)
+    })
 
 
 @app.get("/api/v1/metrics", tags=["Metadata"])
 async def available_metrics():
-    """List available metrics in the dataset."""
+    """List available metrics; derived metrics are served when the ETL output holds them."""
+    return {"metrics": BASE_METRICS, "derived_metrics": DERIVED_METRICS}
+
+
+@app.get("/api/v1/version", tags=["Metadata"])
+async def data_version():
+    """ETL build being served: version id, input hashes and row counts (None if unversioned)."""
+    dataset = get_dataset()
+    manifest = dataset.manifest
+    loaded_at = dataset.loaded_at.isoformat()
+    if manifest is None:
+        return {"version": None, "loaded_at": loaded_at}
+    return {
+        "version": manifest["version"],
+        "created": manifest["created"],
+        "code_version": manifest["code_version"],
+        "inputs": manifest["inputs"],
+        "rows": {name: info["rows"] for name, info in manifest["files"].items()},
+        "loaded_at": loaded_at,
+    }
+
+
+@app.post("/api/v1/admin/reload", tags=["Admin"])
+async def force_reload(x_admin_token: Optional[str] = Header(None)):
+    """Reload the ETL output now and report how long building the new dataset took."""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+    
+    # Built in a worker thread; requests keep being served from the previous dataset
+    started = time.perf_counter()
+    if not await asyncio.to_thread(reload_data, True):
+        raise HTTPException(status_code=503, detail="Reload failed, still serving the previous data")
+    dataset = _dataset
     return {
-        "metrics": [
-            "confirmed_cases",
-            "deaths",
-            "total_vaccinations",
-            "people_vaccinated",
-            "people_fully_vaccinated",
-            "daily_vaccinations"
-        ]
+        "version": dataset.manifest["version"] if dataset.manifest else None,
+        "rows": dataset.rows,
+        "loaded_at": dataset.loaded_at.isoformat(),
+        "seconds": round(time.perf_counter() - started, 3),
     }
 
 
 @app.get("/api/v1/dates", tags=["Metadata"])
 async def available_dates():
     """Get date range of available data."""
-    df = get_timeseries_df()
-    if df is None or df.empty:
-        raise HTTPException(status_code=503, detail="Data not available")
-    
-    if df["date"].dtype == "object":
-        dates = pd.to_datetime(df["date"]).dt.date
-    else:
-        dates = df["date"]
-    
+    daily_dates = get_dataset().daily_dates
+    if len(daily_dates) == 0:
+        raise HTTPException(status_code=404, detail="No daily totals available")
     return {
-        "min_date": str(dates.min()),
-        "max_date": str(dates.max()),
-        "total_days": int(dates.nunique())
+        "min_date": str(daily_dates[0].astype("datetime64[D]")),
+        "max_date": str(daily_dates[-1].astype("datetime64[D]")),
+        "total_days": len(daily_dates)
     }
 
 
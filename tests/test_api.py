@@ -11,6 +11,9 @@ import pandas as pd
 import sys
 import tempfile
 
+# Add API dir to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "services" / "api"))
+
 # Mock data setup
 @pytest.fixture
 def mock_timeseries_data():
@@ -45,8 +48,8 @@ def test_client(mock_timeseries_data, tmp_path):
     # Create a mock main module with patched path
     sys.path.insert(0, str(Path(__file__).parent.parent / "services" / "api"))
     
-    from main import app, _data_cache
-    _data_cache["timeseries"] = mock_timeseries_data
+    from main import app, build_dataset, install_dataset
+    install_dataset(build_dataset(mock_timeseries_data))
     
     return TestClient(app)
 
@@ -161,6 +164,52 @@ class TestTimeseriesEndpoint:
     def test_timeseries_country_not_found(self, test_client):
         response = test_client.get("/api/v1/countries/XYZ/timeseries")
         assert response.status_code == 404
+    
+    def test_columnar_format(self, test_client):
+        url = "/api/v1/countries/USA/timeseries?metric=all"
+        rows = test_client.get(url).json()
+        columnar = test_client.get(url + "&format=columnar").json()
+        assert columnar["iso3"] == rows["iso3"] and columnar["country"] == rows["country"]
+        assert columnar["data"]["date"] == ["2020-03-15", "2020-03-16"]
+        assert columnar["data"]["confirmed_cases"] == [2000.0, 2500.0]
+        assert columnar["data"]["total_vaccinations"] == [None, None]  # NaN -> null
+        assert [dict(zip(columnar["data"], point)) for point in zip(*columnar["data"].values())] == rows["data"]
+        assert test_client.get(url + "&format=csv").status_code == 400
+    
+    def test_row_range_index(self, test_client, mock_timeseries_data):
+        from main import build_dataset, get_dataset, install_dataset
+        
+        dataset = get_dataset()
+        assert dict(dataset.ranges) == {"GBR": (0, 2), "USA": (2, 4)}
+        assert list(dataset.columns["confirmed_cases"]) == [1000.0, 1200.0, 2000.0, 2500.0]
+        assert dataset.countries == (("GBR", "United Kingdom"), ("USA", "United States"))
+        assert list(mock_timeseries_data["iso3"]) == ["USA", "USA", "GBR", "GBR"]  # input not reordered
+        
+        url = "/api/v1/countries/USA/timeseries"
+        assert [p["date"] for p in test_client.get(url).json()["data"]] == ["2020-03-15", "2020-03-16"]
+        assert test_client.get(url + "?from_date=2020-03-17").json()["data"] == []
+        assert test_client.get(url + "?from_date=2020-03-16&to_date=2020-03-15").json()["data"] == []
+        assert len(test_client.get(url + "?to_date=2020-03-15").json()["data"]) == 1
+        
+        # A replaced dataset comes with its own index
+        install_dataset(build_dataset(mock_timeseries_data.iloc[:2]))
+        assert test_client.get("/api/v1/countries/GBR/timeseries").status_code == 404
+        assert dict(get_dataset().ranges) == {"USA": (0, 2)}
+    
+    def test_dataset_is_read_only(self, test_client):
+        from main import get_dataset
+        
+        dataset = get_dataset()
+        with pytest.raises(ValueError):
+            dataset.columns["deaths"][0] = 0.0
+        with pytest.raises(ValueError):
+            dataset.daily["total_deaths"][0] = 0.0
+        with pytest.raises(TypeError):
+            dataset.ranges["USA"] = (0, 0)
+        with pytest.raises(AttributeError):
+            dataset.manifest = {}
+        # Object columns (all-missing vaccinations here) are converted once at load
+        assert dataset.columns["total_vaccinations"].dtype == "float64"
 
 
 class TestMetadataEndpoints:
@@ -186,5 +235,277 @@ class TestMetadataEndpoints:
         assert data["max_date"] == "2020-03-16"
 
 
+class TestCompactSchema:
+    """Endpoints serve the compact ETL dtypes without widening them."""
+    
+    @pytest.fixture
+    def compact_client(self, mock_timeseries_data):
+        from main import app, build_dataset, install_dataset
+        df = mock_timeseries_data.copy()
+        df["date"] = pd.to_datetime(df["date"])
+        df["iso3"] = df["iso3"].astype("category")
+        df["country"] = df["country"].astype("category")
+        df["confirmed_cases"] = df["confirmed_cases"].astype("int32")
+        df["deaths"] = df["deaths"].astype("float32")
+        install_dataset(build_dataset(df))
+        return TestClient(app), df
+    
+    def test_summary(self, compact_client):
+        client, _ = compact_client
+        data = client.get("/api/v1/summary?date_param=2020-03-15").json()
+        assert data["total_confirmed_cases"] == 3000.0
+        assert data["total_deaths"] == 80.0
+        assert client.get("/api/v1/summary").json()["date"] == "2020-03-16"
+    
+    def test_timeseries_and_dates(self, compact_client):
+        client, df = compact_client
+        data = client.get("/api/v1/countries/USA/timeseries?from_date=2020-03-16").json()
+        assert data["country"] == "United States"
+        assert data["data"] == [{
+            "date": "2020-03-16", "confirmed_cases": 2500.0, "deaths": 75.0,
+            "total_vaccinations": None, "people_vaccinated": None,
+            "people_fully_vaccinated": None, "daily_vaccinations": None,
+        }]
+        assert client.get("/api/v1/dates").json()["min_date"] == "2020-03-15"
+        
+        # The frame and the dataset keep the compact dtypes
+        assert df["confirmed_cases"].dtype == "int32"
+        assert df["iso3"].dtype == "category"
+        from main import get_dataset
+        assert get_dataset().columns["confirmed_cases"].dtype == "int32"
+
+
+class TestDerivedMetrics:
+    """Derived metric columns written by the ETL are served as-is."""
+    
+    def test_served_and_selectable(self, mock_timeseries_data):
+        from main import app, build_dataset, install_dataset
+        df = mock_timeseries_data.copy()
+        df["new_cases"] = [None, 500.0, None, 200.0]
+        df["case_fatality_ratio"] = df["deaths"] / df["confirmed_cases"]
+        install_dataset(build_dataset(df))
+        client = TestClient(app)
+        
+        # metric=all keeps the base metrics; derived ones are opt-in
+        point = client.get("/api/v1/countries/USA/timeseries").json()["data"][1]
+        assert "new_cases" not in point
+        point = client.get("/api/v1/countries/USA/timeseries?metric=derived").json()["data"][1]
+        assert point == {"date": "2020-03-16", "new_cases": 500.0, "case_fatality_ratio": 0.03}
+        
+        # The catalogue is static; derived metrics missing from this frame are rejected
+        catalogue = client.get("/api/v1/metrics").json()
+        assert "new_cases_7d_avg" in catalogue["derived_metrics"]
+        for metric in catalogue["metrics"] + ["new_cases", "case_fatality_ratio"]:
+            assert client.get(f"/api/v1/countries/USA/timeseries?metric={metric}").status_code == 200
+        
+        data = client.get("/api/v1/countries/GBR/timeseries?metric=new_cases").json()["data"]
+        assert data == [{"date": "2020-03-15", "new_cases": None}, {"date": "2020-03-16", "new_cases": 200.0}]
+        assert client.get("/api/v1/countries/GBR/timeseries?metric=new_deaths").status_code == 400
+
+
+class TestGlobalDaily:
+    """Summary lookups in the ETL's per-date global totals."""
+    
+    def test_summary_uses_loaded_table(self, tmp_path, mock_timeseries_data, monkeypatch):
+        import main
+        from main import app, build_dataset, install_dataset
+        
+        output_dir = tmp_path / "output"
+        output_dir.mkdir()
+        mock_timeseries_data.to_parquet(output_dir / "timeseries.parquet")
+        daily = main.build_global_daily(mock_timeseries_data)
+        daily.loc[0, "total_deaths"] = 12345.0  # marks the ETL table
+        daily.to_parquet(output_dir / "global_daily.parquet")
+        
+        monkeypatch.setattr(main, "OUTPUT_DIRS", [output_dir])
+        assert main.load_data()
+        client = TestClient(app)
+        data = client.get("/api/v1/summary?date_param=2020-03-15").json()
+        assert data["total_deaths"] == 12345.0
+        assert data["total_confirmed_cases"] == 3000.0
+        
+        # A dataset built without the ETL table computes its own totals
+        install_dataset(build_dataset(mock_timeseries_data))
+        assert client.get("/api/v1/summary?date_param=2020-03-15").json()["total_deaths"] == 80.0
+    
+    def test_missing_metrics_sum_to_zero(self, test_client):
+        data = test_client.get("/api/v1/summary?date_param=2020-03-16").json()
+        assert data == {
+            "date": "2020-03-16",
+            "total_confirmed_cases": 3700.0,
+            "total_deaths": 115.0,
+            "total_vaccinations": 0.0,
+            "people_fully_vaccinated": 0.0,
+            "countries_affected": 2,
+        }
+    
+    def test_series(self, test_client):
+        data = test_client.get("/api/v1/summary/series").json()
+        assert [point["date"] for point in data["data"]] == ["2020-03-15", "2020-03-16"]
+        assert data["data"][1] == test_client.get("/api/v1/summary").json()
+        
+        data = test_client.get("/api/v1/summary/series?from=2020-03-16&format=columnar").json()
+        assert data["from"] == "2020-03-16"
+        assert data["data"]["date"] == ["2020-03-16"]
+        assert data["data"]["total_confirmed_cases"] == [3700.0]
+        assert data["data"]["countries_affected"] == [2]
+        
+        assert test_client.get("/api/v1/summary/series?to=2020-03-01").json()["data"] == []
+        assert test_client.get("/api/v1/summary/series?format=csv").status_code == 400
+    
+    def test_empty_daily_table(self, mock_timeseries_data):
+        import main
+        
+        empty = main.build_global_daily(mock_timeseries_data).set_index("date").iloc[:0]
+        main.install_dataset(main.build_dataset(mock_timeseries_data, empty))
+        client = TestClient(main.app)
+        assert client.get("/api/v1/summary").status_code == 404
+        assert client.get("/api/v1/summary?date_param=2020-03-15").status_code == 404
+        assert client.get("/api/v1/dates").status_code == 404
+        assert client.get("/api/v1/summary/series").json()["data"] == []
+
+
+class TestMmapLoading:
+    """Memory-mapped Arrow IPC loading mode."""
+    
+    def test_mmap_matches_parquet(self, tmp_path, mock_timeseries_data, monkeypatch):
+        import pyarrow as pa
+        import main
+        sys.path.insert(0, str(Path(__file__).parent.parent / "etl"))
+        from dataset_writer import write_timeseries_feather, write_timeseries_parquet
+        
+        df = mock_timeseries_data.copy()
+        df["date"] = pd.to_datetime(df["date"])
+        df["iso3"] = df["iso3"].astype("category")
+        df["confirmed_cases"] = df["confirmed_cases"].astype("int32")
+        # Sorted by (iso3, date) like the ETL output, so loading needs no sorted copy
+        df = df.sort_values(["iso3", "date"], ignore_index=True)
+        write_timeseries_parquet(df, tmp_path / "timeseries.parquet")
+        write_timeseries_feather(df, tmp_path / "timeseries.arrow")
+        monkeypatch.setattr(main, "OUTPUT_DIRS", [tmp_path])
+        client = TestClient(main.app)
+        
+        responses = {}
+        for mode in ["parquet", "mmap"]:
+            monkeypatch.setattr(main, "LOAD_MODE", mode)
+            allocated = pa.total_allocated_bytes()
+            assert main.load_data()
+            if mode == "mmap":
+                # Columns are views on the mapped file, not Arrow-allocated copies
+                assert pa.total_allocated_bytes() <= allocated
+                assert not main.get_dataset().columns["deaths"].flags.writeable
+            responses[mode] = [client.get(url).json() for url in [
+                "/api/v1/summary", "/api/v1/countries", "/api/v1/dates",
+                "/api/v1/countries/USA/timeseries?from_date=2020-03-16",
+            ]]
+        assert responses["mmap"] == responses["parquet"]
+        assert responses["mmap"][3]["data"][0]["confirmed_cases"] == 2500.0
+
+
+class TestPublishedVersion:
+    """Loading the version published by the ETL and reporting it."""
+    
+    def test_serves_and_reports_current_version(self, tmp_path, mock_timeseries_data, monkeypatch):
+        import main
+        sys.path.insert(0, str(Path(__file__).parent.parent / "etl"))
+        from publish import prepare_version, publish_version, rollback
+        
+        output_dir = tmp_path / "output"
+        output_dir.mkdir()
+        # A stale in-place file must not win over the published version
+        mock_timeseries_data.iloc[:1].to_parquet(output_dir / "timeseries.parquet")
+        versions = []
+        for n_rows in [2, 4]:
+            version_dir = prepare_version(output_dir)
+            mock_timeseries_data.iloc[:n_rows].to_parquet(version_dir / "timeseries.parquet")
+            versions.append(publish_version(output_dir, version_dir, {"cases": "abc"}, "code", {})["version"])
+        
+        monkeypatch.setattr(main, "OUTPUT_DIRS", [output_dir])
+        client = TestClient(main.app)
+        assert main.load_data()
+        assert main.get_dataset().rows == 4
+        assert client.get("/health").json()["data_version"] == versions[1]
+        data = client.get("/api/v1/version").json()
+        assert data["version"] == versions[1]
+        assert data["inputs"] == {"cases": "abc"}
+        assert data["rows"] == {"timeseries.parquet": 4}
+        
+        rollback(output_dir, versions[0])
+        assert main.load_data()
+        assert main.get_dataset().rows == 2
+        assert client.get("/api/v1/version").json()["version"] == versions[0]
+    
+    def test_unversioned_output(self, test_client):
+        assert test_client.get("/api/v1/version").json()["version"] is None
+
+
+class TestHotReload:
+    """Reloading a changed ETL output while serving."""
+    
+    def test_reload_when_output_changes(self, tmp_path, mock_timeseries_data, monkeypatch):
+        import main
+        sys.path.insert(0, str(Path(__file__).parent.parent / "etl"))
+        from publish import prepare_version, publish_version
+        
+        def publish(n_rows):
+            version_dir = prepare_version(tmp_path)
+            mock_timeseries_data.iloc[:n_rows].to_parquet(version_dir / "timeseries.parquet")
+            return publish_version(tmp_path, version_dir, {}, "code", {})["version"]
+        
+        publish(2)
+        monkeypatch.setattr(main, "OUTPUT_DIRS", [tmp_path])
+        assert main.load_data()
+        old = main.get_dataset()
+        assert not main.reload_data()  # unchanged output
+        assert main.get_dataset() is old
+        
+        version = publish(4)
+        assert main.reload_data()
+        assert main.get_dataset().rows == 4
+        assert main.get_dataset().manifest["version"] == version
+        # Holders of the previous dataset (requests in flight) still see it whole
+        assert old.rows == 2 and dict(old.ranges) == {"USA": (0, 2)}
+    
+    def test_in_place_output_needs_force(self, tmp_path, mock_timeseries_data, monkeypatch):
+        import main
+        
+        # Files written in place are not watched: a check could see half an ETL run
+        mock_timeseries_data.iloc[:2].to_parquet(tmp_path / "timeseries.parquet")
+        monkeypatch.setattr(main, "OUTPUT_DIRS", [tmp_path])
+        assert main.load_data()
+        mock_timeseries_data.to_parquet(tmp_path / "timeseries.parquet")
+        assert not main.reload_data()
+        assert main.get_dataset().rows == 2
+        assert main.reload_data(force=True)
+        assert main.get_dataset().rows == 4
+    
+    def test_admin_reload(self, tmp_path, mock_timeseries_data, monkeypatch):
+        import main
+        
+        mock_timeseries_data.to_parquet(tmp_path / "timeseries.parquet")
+        monkeypatch.setattr(main, "OUTPUT_DIRS", [tmp_path])
+        client = TestClient(main.app)
+        # Disabled unless a token is configured
+        monkeypatch.setattr(main, "ADMIN_TOKEN", None)
+        assert client.post("/api/v1/admin/reload").status_code == 404
+        assert client.post("/api/v1/admin/reload", headers={"X-Admin-Token": ""}).status_code == 404
+        
+        monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+        client.headers["X-Admin-Token"] = "secret"
+        data = client.post("/api/v1/admin/reload").json()
+        assert data["rows"] == 4 and data["version"] is None
+        assert data["seconds"] >= 0
+        
+        # A broken output fails the reload and keeps the served dataset
+        served = main.get_dataset()
+        (tmp_path / "timeseries.parquet").write_bytes(b"not parquet")
+        assert client.post("/api/v1/admin/reload").status_code == 503
+        assert main.get_dataset() is served
+        
+        assert client.post("/api/v1/admin/reload", headers={"X-Admin-Token": "wrong"}).status_code == 403
+        del client.headers["X-Admin-Token"]
+        assert client.post("/api/v1/admin/reload").status_code == 403
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -15,13 +15,51 @@ sys.path.insert(0, str(Path(__file__).parent.parent / "etl"))
 
 from transform_utils import (
     normalize_date,
+    DateNormalizer,
     get_iso3_code,
+    ISO3Resolver,
+    ISO3_COUNTRY_MAPPING,
     fix_monotonicity,
+    repair_monotonicity,
     long_format_timeseries,
+    long_format_timeseries_reference,
     validate_data
 )
 
 
+def write_raw_inputs(raw_dir, n_days, start=date(2020, 1, 22)):
+    """Write small JHU/OWID-style raw CSVs covering the first n_days."""
+    from datetime import timedelta
+    
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    dates = [start + timedelta(days=i) for i in range(n_days)]
+    header = "Country/Region,US,China,India,Japan"
+    provinces = "Province/State,,,,"
+    
+    def wide_csv(name, values):
+        lines = [header, provinces]
+        for day, row in zip(dates, values):
+            lines.append(",".join([f"{day.month}/{day.day}/{day.year % 100}"] + row))
+        (raw_dir / name).write_text("\n".join(lines) + "\n")
+    
+    cases, deaths = [], []
+    for i in range(n_days):
+        cases.append([str(10 * i - (15 if i == 4 else 0)),  # decrease on day 4
+                      str(100 + i) if i != 2 else "",      # gap
+                      "-1" if i == 3 else str(i * i),      # negative
+                      "" if i < 6 else str(i)])            # no values early on
+        deaths.append([str(i), str(max(0, 5 - i)), str(i // 2), ""])
+    wide_csv("CONVENIENT_global_confirmed_cases.csv", cases)
+    wide_csv("CONVENIENT_global_deaths.csv", deaths)
+    
+    rows = ["country,date,total_vaccinations,people_vaccinated,people_fully_vaccinated,daily_vaccinations"]
+    for i, day in enumerate(dates):
+        rows.append(f"United States,{day.isoformat()},{1000 * i if i % 3 else ''},{500 * i},,{i}")
+        if i % 2 == 0:
+            rows.append(f"China,{day.isoformat()},{2000 * i},,{10 * i},")
+    (raw_dir / "country_vaccinations.csv").write_text("\n".join(rows) + "\n")
+
+
 class TestDateNormalization:
     """Test date normalization across formats."""
     
@@ -50,6 +88,36 @@ class TestDateNormalization:
         assert result is None
 
 
+class TestDateNormalizer:
+    """Test batch date normalization with a per-run cache."""
+    
+    def test_detects_column_format(self):
+        normalizer = DateNormalizer()
+        assert normalizer.detect_format(["1/23/20", "1/24/20", "Province/State"]) == "%m/%d/%y"
+        assert normalizer.detect_format(["2021-02-01", "2021-02-02"]) == "%Y-%m-%d"
+    
+    def test_normalize_many_matches_normalize_date(self):
+        values = ["1/23/20", "1/24/20", "1/23/20", "2020-01-25", "12/31/2020", "invalid", "", np.nan]
+        result = DateNormalizer().normalize_many(values)
+        
+        expected = []
+        for value in values:
+            ts = normalize_date(value)
+            expected.append(None if ts is None else ts.date())
+        assert list(result) == expected
+    
+    def test_counts_failures_and_caches(self):
+        normalizer = DateNormalizer()
+        normalizer.normalize_many(["2020-01-23", "bad", "bad", "", None])
+        assert normalizer.parsed_count == 1
+        assert normalizer.failed_count == 2
+        
+        normalizer.normalize_many(["2020-01-23", "bad"])
+        assert normalizer.parsed_count == 2
+        assert normalizer.failed_count == 3
+        assert set(normalizer._cache) == {"2020-01-23", "bad", ""}
+
+
 class TestISO3Mapping:
     """Test country name to ISO3 code mapping."""
     
@@ -73,6 +141,32 @@ class TestISO3Mapping:
     def test_nan_input(self):
         result = get_iso3_code(np.nan)
         assert result is None
+    
+    def test_partial_match_fallback(self):
+        assert get_iso3_code("United Kingdom.1") == "GBR"
+        assert get_iso3_code("Korea") == "KOR"
+
+
+class TestISO3Resolver:
+    """Test the precompiled, memoizing ISO3 resolver."""
+    
+    def test_resolve_many_broadcasts_unique_values(self):
+        resolver = ISO3Resolver(ISO3_COUNTRY_MAPPING)
+        names = pd.Series(["US", "China", np.nan, "US", "Atlantis"], index=[10, 11, 12, 13, 14])
+        result = resolver.resolve_many(names)
+        
+        assert list(result.index) == [10, 11, 12, 13, 14]
+        assert list(result) == ["USA", "CHN", None, "USA", None]
+    
+    def test_misses_are_memoized_and_logged_once(self, caplog):
+        resolver = ISO3Resolver(ISO3_COUNTRY_MAPPING)
+        with caplog.at_level("WARNING"):
+            resolver.resolve_many(pd.Series(["Atlantis"] * 1000))
+            resolver.resolve("Atlantis")
+        
+        warnings = [r for r in caplog.records if "Atlantis" in r.getMessage()]
+        assert len(warnings) == 1
+        assert resolver.misses == ["Atlantis"]
 
 
 class TestMonotonicity:
@@ -102,6 +196,34 @@ class TestMonotonicity:
         series = pd.Series([], dtype=float)
         result = fix_monotonicity(series)
         assert len(result) == 0
+    
+    def test_grouped_repair_matches_per_series_fix(self):
+        df = pd.DataFrame({
+            "date": [date(2020, 1, d) for d in (2, 1, 3, 4, 1, 2, 3, 1, 2)],
+            "iso3": ["USA", "USA", "USA", "USA", "GBR", "GBR", "GBR", "FRA", "FRA"],
+            "confirmed_cases": [np.nan, 5, 3, 8, 10, 7, 12, np.nan, np.nan],
+            "deaths": [1, 0, 2, 1, np.nan, 1, 0, 3, 2],
+        })
+        result, report = repair_monotonicity(df, ["confirmed_cases", "deaths"], return_report=True)
+        
+        for iso3, group in df.sort_values(["iso3", "date"]).groupby("iso3"):
+            repaired = result[result["iso3"] == iso3]
+            for col in ["confirmed_cases", "deaths"]:
+                pd.testing.assert_series_equal(repaired[col], fix_monotonicity(group[col]))
+        
+        assert report.loc["USA", "confirmed_cases"] == 1  # 3 after 5
+        assert report.loc["USA", "deaths"] == 1  # 1 after 2
+        assert report.loc["GBR", "confirmed_cases"] == 1  # 7 after 10
+        assert report.loc["FRA"].sum() == 1  # 2 after 3
+    
+    def test_grouped_repair_without_report(self):
+        df = pd.DataFrame({
+            "date": [date(2020, 1, 1), date(2020, 1, 2)],
+            "iso3": ["USA", "USA"],
+            "deaths": [5.0, 4.0],
+        })
+        result = repair_monotonicity(df, ["deaths"])
+        assert list(result["deaths"]) == [5.0, 5.0]
 
 
 class TestLongFormatConversion:
@@ -134,6 +256,43 @@ class TestLongFormatConversion:
         # Negative value should be NaN
         us_row = result[result["country"] == "US"]
         assert us_row["test_metric"].isna().all()
+    
+    def test_non_numeric_values_filtered(self):
+        df = pd.DataFrame({
+            "date": ["2020-01-23", "2020-01-24"],
+            "US": ["12", "n/a"],
+            "China": [100, None]
+        })
+        result = long_format_timeseries(df, metric_col="cases")
+        
+        us_rows = result[result["country"] == "US"]
+        assert us_rows["cases"].iloc[0] == 12.0
+        assert pd.isna(us_rows["cases"].iloc[1])
+    
+    @pytest.mark.parametrize("df", [
+        pd.DataFrame({
+            "date": ["2020-01-23", "2020-01-24"],
+            "US": [1, 2],
+            "China": [100, 101],
+            "Japan": [0, 1]
+        }),
+        pd.DataFrame({
+            "date": ["1/23/20", "not a date", "1/25/20", "1/23/20"],
+            "US": [-5, 3, "x", 7.5],
+            "Atlantis": [1, 2, 3, 4],
+            "India": [np.nan, 0, 1, 2]
+        }),
+        pd.DataFrame({
+            "Date": ["1/23/20", "1/24/20", "1/25/20"],
+            "US": [0, 1, 2],
+            "China": [100, 105, 110],
+            "India": [0, 0, 1]
+        }),
+    ])
+    def test_matches_reference_implementation(self, df):
+        result = long_format_timeseries(df, metric_col="cases")
+        expected = long_format_timeseries_reference(df, metric_col="cases")
+        pd.testing.assert_frame_equal(result, expected)
 
 
 class TestDataValidation:
@@ -161,6 +320,73 @@ class TestDataValidation:
         assert validate_data(df) is False
 
 
+class TestJHUWideReader:
+    """Two-level (Country/Region, Province/State) JHU header and province rollup."""
+    
+    CSV = "\n".join([
+        "Country/Region,Australia,Australia,US,Atlantis,China",
+        "Province/State,Victoria,New South Wales,,,Hubei",
+        "1/22/20,1,2,5,9,100",
+        "1/23/20,,3,-1,9,n/a",
+        "Province/State,7,7,7,7,7",
+        "1/24/20,,,6,9,120",
+    ]) + "\n"
+    
+    def test_header_levels_and_rollup(self, tmp_path):
+        from transform_utils import jhu_long_format, read_jhu_wide
+        
+        path = tmp_path / "cases.csv"
+        path.write_text(self.CSV)
+        wide = read_jhu_wide(str(path))
+        assert list(wide.countries) == ["Australia", "Australia", "US", "Atlantis", "China"]
+        assert list(wide.provinces) == ["Victoria", "New South Wales", "", "", "Hubei"]
+        assert wide.values.shape == (4, 5)
+        
+        result = jhu_long_format(wide, "cases")
+        assert list(result.columns) == ["date", "country", "iso3", "cases"]
+        assert list(pd.unique(result["iso3"])) == ["AUS", "USA", "CHN"]  # Atlantis dropped
+        aus = result[result["iso3"] == "AUS"]["cases"].tolist()
+        assert aus[0] == 3 and aus[1] == 3 and np.isnan(aus[2])  # missing provinces count as 0 unless all are
+        assert np.isnan(result[result["iso3"] == "USA"]["cases"].iloc[1])  # negative
+        assert len(result) == 3 * 3  # the stray Province/State row is not a date
+        
+        by_province = jhu_long_format(wide, "cases", by_province=True)
+        assert list(by_province.columns) == ["date", "country", "province", "iso3", "cases"]
+        assert len(by_province) == 4 * 3
+        assert by_province[by_province["province"] == "Victoria"]["cases"].iloc[0] == 1
+    
+    def test_single_header_matches_long_format(self, tmp_path):
+        from transform_utils import jhu_long_format, read_jhu_wide
+        
+        df = pd.DataFrame({"date": ["1/23/20", "1/24/20"], "US": [1, 2], "China": [100, None]})
+        path = tmp_path / "cases.csv"
+        df.to_csv(path, index=False)
+        result = jhu_long_format(read_jhu_wide(str(path)), "cases")
+        pd.testing.assert_frame_equal(result, long_format_timeseries(df, metric_col="cases"))
+    
+    def test_run_etl_writes_provinces(self, tmp_path):
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        for name in ["CONVENIENT_global_confirmed_cases.csv", "CONVENIENT_global_deaths.csv"]:
+            path = tmp_path / "raw" / name
+            lines = path.read_text().splitlines()
+            lines[0] += ",China"
+            lines[1] += ",Hubei"
+            lines[2:] = [line + ",1" for line in lines[2:]]
+            path.write_text("\n".join(lines) + "\n")
+        
+        assert run_etl(tmp_path / "raw", tmp_path / "output", provinces=True)
+        provinces = pd.read_parquet(tmp_path / "output" / "provinces_timeseries.parquet")
+        assert set(provinces["province"]) == {"Hubei"}
+        assert list(provinces.columns) == ["iso3", "country", "province", "date", "confirmed_cases", "deaths"]
+        assert len(provinces) == 8 and (provinces["deaths"] == 1).all()
+        
+        timeseries = pd.read_parquet(tmp_path / "output" / "timeseries.parquet")
+        china = timeseries[timeseries["iso3"] == "CHN"].sort_values("date")
+        assert china["deaths"].iloc[0] == 5 + 1  # country-level column plus Hubei
+
+
 class TestIntegration:
     """Integration tests for full pipelines."""
     
@@ -186,5 +412,685 @@ class TestIntegration:
             assert usa_data["cases"].iloc[0] == 0
 
 
+class TestCompactSchema:
+    """Canonical compact schema for the merged timeseries."""
+    
+    def test_dtypes_follow_values(self, tmp_path):
+        from transform_utils import apply_compact_schema
+        from dataset_writer import write_timeseries_parquet
+        
+        df = pd.DataFrame({
+            "date": [date(2020, 1, 1), date(2020, 1, 2), date(2020, 1, 3)],
+            "country": ["US", "US", "China"],
+            "iso3": ["USA", "USA", "CHN"],
+            "confirmed_cases": [1.0, 2.0, 3.0],           # integral, no gaps
+            "deaths": [1.0, np.nan, 3.5],                 # float32-exact
+            "total_vaccinations": [np.nan, 16777217.0, 1.0],  # needs float64
+            "big": [0.0, 3e9, 1.0],                       # beyond int32
+        })
+        compact = apply_compact_schema(df)
+        
+        assert compact["country"].dtype.name == "category"
+        assert compact["iso3"].dtype.name == "category"
+        assert compact["date"].dtype == "datetime64[ns]"
+        assert compact["confirmed_cases"].dtype == np.int32
+        assert compact["deaths"].dtype == np.float32
+        assert compact["total_vaccinations"].dtype == np.float64
+        assert compact["big"].dtype == np.int64
+        for col in ["confirmed_cases", "deaths", "total_vaccinations", "big"]:
+            np.testing.assert_array_equal(compact[col].astype(float), df[col])
+        
+        import pyarrow.parquet as pq
+        write_timeseries_parquet(compact, tmp_path / "ts.parquet")
+        schema = pq.read_schema(tmp_path / "ts.parquet")
+        assert str(schema.field("date").type) == "date32[day]"
+        assert str(schema.field("confirmed_cases").type) == "int32"
+        assert str(schema.field("iso3").type).startswith("dictionary")
+    
+    def test_memory_footprint_shrinks(self):
+        from transform_utils import apply_compact_schema, memory_footprint
+        
+        df = pd.DataFrame({
+            "date": [date(2020, 1, 1 + i % 28) for i in range(1000)],
+            "country": ["United States"] * 1000,
+            "iso3": ["USA"] * 1000,
+            "confirmed_cases": np.arange(1000, dtype=np.float64),
+        })
+        before = memory_footprint(df)
+        after = memory_footprint(apply_compact_schema(df))
+        assert after["total"] < before["total"] / 3
+        assert set(before) == set(after)
+
+
+class TestMergeSources:
+    """Key-encoded join of cases, deaths and vaccinations."""
+    
+    def test_source_spellings_join_on_iso3(self):
+        from transform_utils import merge_sources, VACCINATION_COLUMNS
+        
+        cases = pd.DataFrame({
+            "date": [date(2021, 1, 1), date(2021, 1, 2)],
+            "country": ["US", "US"],
+            "iso3": ["USA", "USA"],
+            "confirmed_cases": [10.0, 12.0],
+        })
+        deaths = pd.DataFrame({
+            "date": [date(2021, 1, 2), date(2021, 1, 3)],
+            "country": ["United States", "United States"],
+            "iso3": ["USA", "USA"],
+            "deaths": [1.0, 2.0],
+        })
+        vacc = pd.DataFrame({
+            "date": [date(2021, 1, 2), date(2021, 1, 9)],
+            "country": ["United States", "United States"],
+            "iso3": ["USA", "USA"],
+            **{col: [5.0, 6.0] for col in VACCINATION_COLUMNS},
+        })
+        result = merge_sources(cases, deaths, vacc)
+        
+        # Outer join of cases/deaths, vaccinations only where they overlap
+        assert list(result["date"].dt.day) == [1, 2, 3]
+        assert list(result["country"]) == ["United States"] * 3
+        np.testing.assert_array_equal(result["confirmed_cases"], [10.0, 12.0, np.nan])
+        np.testing.assert_array_equal(result["deaths"], [np.nan, 1.0, 2.0])
+        np.testing.assert_array_equal(result["total_vaccinations"], [np.nan, 5.0, np.nan])
+    
+    def test_duplicate_keys_prefer_reference_name(self):
+        from transform_utils import merge_sources, VACCINATION_COLUMNS
+        
+        cases = pd.DataFrame({
+            "date": [date(2021, 1, 1)] * 3,
+            "country": ["England", "United Kingdom", "India"],
+            "iso3": ["GBR", "GBR", "IND"],
+            "confirmed_cases": [1.0, 2.0, 3.0],
+        })
+        deaths = cases.rename(columns={"confirmed_cases": "deaths"})
+        vacc = pd.DataFrame(columns=["date", "country", "iso3"] + VACCINATION_COLUMNS)
+        result = merge_sources(cases, deaths, vacc)
+        
+        assert list(result["iso3"]) == ["GBR", "IND"]
+        assert list(result["confirmed_cases"]) == [2.0, 3.0]
+        assert list(result["deaths"]) == [2.0, 3.0]
+        assert result["total_vaccinations"].isna().all()
+
+
+class TestDerivedMetrics:
+    """Daily new counts, rolling means, growth and CFR per country."""
+    
+    def test_grouped_values(self):
+        from derived_metrics import add_derived_metrics, DERIVED_METRICS
+        
+        n = 22
+        dates = pd.date_range("2020-03-01", periods=n)
+        df = pd.DataFrame({
+            "date": list(dates) * 2,
+            "iso3": ["USA"] * n + ["CHN"] * n,
+            "confirmed_cases": np.r_[np.arange(n) ** 2, 1000 + 10 * np.arange(n)].astype(float),
+            "deaths": np.r_[np.zeros(n), np.arange(n)].astype(float),
+        }).sample(frac=1, random_state=0)
+        result = add_derived_metrics(df)
+        
+        assert list(result.columns[-len(DERIVED_METRICS):]) == DERIVED_METRICS
+        chn, usa = result[result["iso3"] == "CHN"], result[result["iso3"] == "USA"]
+        # No diff across the country boundary
+        assert np.isnan(chn["new_cases"].iloc[0]) and np.isnan(usa["new_cases"].iloc[0])
+        np.testing.assert_array_equal(usa["new_cases"].iloc[1:], 2 * np.arange(1, n) - 1)
+        assert (chn["new_cases"].iloc[1:] == 10).all()
+        
+        # Windows only within a country, NaN until full
+        assert usa["new_cases_7d_avg"].isna().sum() == 7
+        assert usa["new_cases_7d_avg"].iloc[7] == np.mean(2 * np.arange(1, 8) - 1)
+        assert usa["new_cases_14d_avg"].isna().sum() == 14
+        assert (chn["new_cases_14d_avg"].dropna() == 10).all()
+        
+        # Week-over-week growth of the 7-day mean; undefined after a zero week
+        assert chn["new_cases_wow_growth"].iloc[14] == 0.0
+        weekly = usa["new_cases_7d_avg"]
+        assert usa["new_cases_wow_growth"].iloc[14] == weekly.iloc[14] / weekly.iloc[7] - 1
+        assert usa["new_deaths_wow_growth"].isna().all()
+        
+        assert np.isnan(usa["case_fatality_ratio"].iloc[0])  # no cases yet
+        assert chn["case_fatality_ratio"].iloc[5] == 5 / 1050
+
+
+class TestGlobalDaily:
+    """Per-date global totals written next to the timeseries."""
+    
+    def test_matches_per_date_summary(self, tmp_path):
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        assert run_etl(tmp_path / "raw", tmp_path / "output")
+        timeseries = pd.read_parquet(tmp_path / "output" / "timeseries.parquet")
+        daily = pd.read_parquet(tmp_path / "output" / "global_daily.parquet")
+        
+        assert len(daily) == timeseries["date"].nunique() == 8
+        for row in daily.itertuples(index=False):
+            day = timeseries[timeseries["date"] == row.date]
+            assert row.total_confirmed_cases == day["confirmed_cases"].sum()
+            assert row.total_deaths == day["deaths"].sum()
+            assert row.total_vaccinations == (day["total_vaccinations"].sum() or 0)
+            assert row.people_fully_vaccinated == (day["people_fully_vaccinated"].sum() or 0)
+            assert row.countries_affected == (day["confirmed_cases"] > 0).sum()
+
+
+class TestDateGrid:
+    """Dense daily date axis per country and (date x country) matrices."""
+    
+    def test_align_fills_cumulatives_and_flags_them(self):
+        from date_grid import align_to_date_grid
+        
+        df = pd.DataFrame({
+            "date": pd.to_datetime(["2020-03-02", "2020-03-04", "2020-03-01", "2020-03-02", "2020-03-04"]),
+            "iso3": ["USA", "USA", "CHN", "CHN", "CHN"],
+            "country": ["United States", "United States", "China", "China", "China"],
+            "confirmed_cases": [10.0, 30.0, 1.0, np.nan, 5.0],
+            "daily_vaccinations": [7.0, 8.0, np.nan, np.nan, np.nan],
+        })
+        result = align_to_date_grid(df)
+        
+        assert len(result) == 2 * 4
+        assert list(result["iso3"]) == ["CHN"] * 4 + ["USA"] * 4
+        assert (result["date"].iloc[:4] == result["date"].iloc[4:].to_numpy()).all()
+        usa, chn = result[result["iso3"] == "USA"], result[result["iso3"] == "CHN"]
+        assert (usa["country"] == "United States").all()
+        # Leading gap stays missing, inner gaps carry the last report
+        np.testing.assert_array_equal(usa["confirmed_cases"], [np.nan, 10, 10, 30])
+        assert list(usa["confirmed_cases_imputed"]) == [False, False, True, False]
+        np.testing.assert_array_equal(chn["confirmed_cases"], [1, 1, 1, 5])
+        assert list(chn["confirmed_cases_imputed"]) == [False, True, True, False]
+        # Non-cumulative metrics are not filled
+        np.testing.assert_array_equal(usa["daily_vaccinations"], [np.nan, 7, np.nan, 8])
+        assert "daily_vaccinations_imputed" not in result.columns
+    
+    def test_duplicate_keys_rejected(self):
+        from date_grid import align_to_date_grid
+        
+        df = pd.DataFrame({"date": pd.to_datetime(["2020-03-01"] * 2), "iso3": ["USA"] * 2,
+                           "confirmed_cases": [1.0, 2.0]})
+        with pytest.raises(ValueError):
+            align_to_date_grid(df)
+    
+    def test_run_etl_writes_metric_matrices(self, tmp_path):
+        from run_etl import run_etl
+        from dataset_writer import read_metric_matrix
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        assert run_etl(tmp_path / "raw", tmp_path / "output", dense_grid=True)
+        timeseries = pd.read_parquet(tmp_path / "output" / "timeseries.parquet")
+        assert len(timeseries) == timeseries["iso3"].nunique() * 8
+        assert timeseries["confirmed_cases_imputed"].dtype == bool
+        
+        matrix = read_metric_matrix(tmp_path / "output" / "matrices" / "confirmed_cases.arrow")
+        assert matrix.shape == (8, timeseries["iso3"].nunique())
+        expected = timeseries.pivot(index="date", columns="iso3", values="confirmed_cases")
+        np.testing.assert_array_equal(matrix[list(expected.columns)].to_numpy(), expected.to_numpy())
+        
+        # Date ranges are slices of the matrix
+        window = read_metric_matrix(tmp_path / "output" / "matrices" / "confirmed_cases.arrow",
+                                    from_date="2020-01-24", to_date="2020-01-26")
+        pd.testing.assert_frame_equal(window, matrix.iloc[2:5])
+        assert read_metric_matrix(tmp_path / "output" / "matrices" / "deaths.arrow",
+                                  from_date="2021-01-01").empty
+
+
+class TestQualityReport:
+    """Single-pass data quality profile and its hard thresholds."""
+    
+    def test_profile_counts(self):
+        from quality import check_thresholds, profile_quality
+        
+        df = pd.DataFrame({
+            "date": pd.to_datetime(["2020-03-01", "2020-03-02", "2020-03-06",
+                                    "2020-03-01", "2020-03-01", "2020-03-02"]),
+            "iso3": ["USA", "USA", "USA", "CHN", "CHN", "CHN"],
+            "confirmed_cases": [1.0, np.nan, 3.0, 1.0, 1.0, 2.0],
+            "deaths": [0.0, 0.0, 0.0, np.nan, np.nan, np.nan],
+        })
+        summary, table = profile_quality(df.sample(frac=1, random_state=1),
+                                         repaired_points={"confirmed_cases": {"USA": 2}},
+                                         iso3_misses=["Atlantis", "Atlantis"])
+        
+        by_country = table.set_index("iso3")
+        assert list(by_country.index) == ["CHN", "USA"]
+        assert by_country.loc["CHN", "duplicate_keys"] == 1
+        assert by_country.loc["USA", "missing_days"] == 3
+        assert by_country.loc["USA", "max_gap_days"] == 3
+        assert by_country.loc["USA", "null_rate_confirmed_cases"] == 1 / 3
+        assert by_country.loc["CHN", "null_rate_deaths"] == 1.0
+        assert by_country.loc["USA", "repaired_confirmed_cases"] == 2
+        assert by_country.loc["CHN", "repaired_confirmed_cases"] == 0
+        
+        assert summary["duplicate_keys"] == 1
+        assert summary["gaps"] == {"countries_with_gaps": 1, "missing_days": 3, "max_gap_days": 3,
+                                   "worst": {"USA": 3}}
+        assert summary["null_rates"]["deaths"] == 0.5
+        assert summary["repaired_rate"] == 2 / 5
+        assert summary["iso3_misses"] == ["Atlantis"]
+        
+        violations = check_thresholds(summary)
+        assert [v.split(":")[0] for v in violations] == ["max_duplicate_keys", "max_core_null_rate",
+                                                         "max_repaired_rate"]
+        assert check_thresholds(summary, {"max_duplicate_keys": None, "max_core_null_rate": None,
+                                          "max_repaired_rate": None}) == []
+    
+    def test_run_etl_writes_report_and_fails_on_threshold(self, tmp_path):
+        import json
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        assert run_etl(tmp_path / "raw", tmp_path / "output")
+        summary = json.loads((tmp_path / "output" / "quality_report.json").read_text())
+        table = pd.read_parquet(tmp_path / "output" / "quality_by_country.parquet")
+        assert summary["rows"] == 4 * 8 and summary["violations"] == []
+        assert summary["repaired_points"]["confirmed_cases"] > 0  # the day-4 decrease
+        assert len(table) == 4
+        
+        assert not run_etl(tmp_path / "raw", tmp_path / "strict", quality_thresholds={"max_iso3_misses": -1})
+        summary = json.loads((tmp_path / "strict" / "quality_report.json").read_text())
+        assert summary["violations"] == ["max_iso3_misses: 0 exceeds -1"]
+    
+    def test_source_duplicates_are_reported(self, tmp_path):
+        import json
+        from run_etl import run_etl
+        
+        # A repeated vaccinations row: merge_sources keeps one, the profile still counts it
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        vacc_file = tmp_path / "raw" / "country_vaccinations.csv"
+        lines = vacc_file.read_text().splitlines()
+        vacc_file.write_text("\n".join(lines + [lines[1]]) + "\n")
+        
+        assert run_etl(tmp_path / "raw", tmp_path / "output")
+        summary = json.loads((tmp_path / "output" / "quality_report.json").read_text())
+        assert summary["rows"] == 4 * 8
+        assert summary["duplicate_keys"] == 0
+        assert summary["source_duplicate_keys"] == {"cases": 0, "deaths": 0, "vaccinations": 1}
+        assert summary["violations"] == []
+        
+        assert not run_etl(tmp_path / "raw", tmp_path / "strict",
+                           quality_thresholds={"max_source_duplicate_keys": 0})
+        summary = json.loads((tmp_path / "strict" / "quality_report.json").read_text())
+        assert summary["violations"] == ["max_source_duplicate_keys: 1 exceeds 0"]
+    
+    def test_colliding_country_names_pass(self, tmp_path):
+        import json
+        from datetime import timedelta
+        from run_etl import run_etl
+        
+        # Real names sharing an ISO3: Niger/Nigeria, Oman/Romania and Dominica/Nicaragua
+        # through the resolver's partial matches in JHU, England/United Kingdom in OWID
+        raw = tmp_path / "raw"
+        raw.mkdir()
+        names = ["Niger", "Nigeria", "Oman", "Romania", "Dominica", "Nicaragua"]
+        dates = [date(2020, 3, 1) + timedelta(days=i) for i in range(10)]
+        for file_name, scale in [("CONVENIENT_global_confirmed_cases.csv", 100),
+                                 ("CONVENIENT_global_deaths.csv", 1)]:
+            lines = ["Country/Region," + ",".join(names), "Province/State" + "," * len(names)]
+            for day in dates:
+                # Daily new values, the smaller country of each pair first
+                lines.append(",".join([f"{day.month}/{day.day}/{day.year % 100}"]
+                                      + [str(scale * (k % 2 * 9 + 1)) for k in range(len(names))]))
+            (raw / file_name).write_text("\n".join(lines) + "\n")
+        rows = ["country,date,total_vaccinations,people_vaccinated,people_fully_vaccinated,daily_vaccinations"]
+        for i, day in enumerate(dates):
+            rows.append(f"England,{day.isoformat()},{800 * i},,,")
+            rows.append(f"United Kingdom,{day.isoformat()},{1000 * i},,,")
+        (raw / "country_vaccinations.csv").write_text("\n".join(rows) + "\n")
+        
+        assert run_etl(raw, tmp_path / "output")
+        summary = json.loads((tmp_path / "output" / "quality_report.json").read_text())
+        assert summary["violations"] == []
+        assert summary["duplicate_keys"] == 0
+        assert summary["source_duplicate_keys"]["vaccinations"] == len(dates)
+        assert summary["source_duplicate_keys"]["cases"] > 0
+        assert summary["repaired_points"] == {"confirmed_cases": 0, "deaths": 0}
+
+
+class TestVersionedPublish:
+    """Versioned output directories published through current.json."""
+    
+    def test_publish_manifest_and_pruning(self, tmp_path):
+        import json
+        from run_etl import run_etl
+        from publish import list_versions, read_current, rollback
+        from stage_cache import hash_file
+        
+        raw_dir, output_dir = tmp_path / "raw", tmp_path / "output"
+        write_raw_inputs(raw_dir, n_days=8)
+        assert run_etl(raw_dir, output_dir, versioned=True, keep_versions=2)
+        first = read_current(output_dir)
+        version_dir = output_dir / first["path"]
+        assert (version_dir / "timeseries.parquet").exists()
+        assert not (output_dir / "timeseries.parquet").exists()
+        assert json.loads((version_dir / "manifest.json").read_text()) == first
+        assert first["inputs"]["cases"] == hash_file(raw_dir / "CONVENIENT_global_confirmed_cases.csv")
+        timeseries = pd.read_parquet(version_dir / "timeseries.parquet")
+        assert first["files"]["timeseries.parquet"]["rows"] == len(timeseries)
+        assert first["files"]["timeseries.parquet"]["schema"]["iso3"].startswith("dictionary")
+        
+        # Unchanged inputs: an incremental run publishes nothing new
+        assert run_etl(raw_dir, output_dir, versioned=True, incremental=True, keep_versions=2)
+        assert list_versions(output_dir) == [first["version"]]
+        
+        for _ in range(2):
+            assert run_etl(raw_dir, output_dir, versioned=True, keep_versions=2)
+        versions = list_versions(output_dir)
+        assert len(versions) == 2 and first["version"] not in versions
+        assert read_current(output_dir)["version"] == versions[-1]
+        
+        assert rollback(output_dir, versions[0])["version"] == versions[0]
+        assert read_current(output_dir)["version"] == versions[0]
+        with pytest.raises(ValueError):
+            rollback(output_dir, first["version"])
+
+
+class TestStreamingIngestion:
+    """Chunked streaming of the raw inputs, with state carried across chunks."""
+    
+    @pytest.mark.parametrize("chunk_cells", [5, 12, 10 ** 6])
+    def test_stream_matches_in_memory(self, tmp_path, chunk_cells):
+        from streaming import read_streamed_output, stream_jhu_source, stream_vaccinations_source
+        from transform_utils import load_and_transform_jhu, load_and_transform_vaccinations
+        
+        write_raw_inputs(tmp_path, n_days=10)
+        raw = tmp_path / "CONVENIENT_global_confirmed_cases.csv"
+        rows, report, misses = stream_jhu_source(str(raw), "confirmed_cases", tmp_path / "cases.parquet",
+                                                 chunk_cells=chunk_cells)
+        expected, expected_report = load_and_transform_jhu(str(raw), "confirmed_cases", return_repair_report=True)
+        assert rows == len(expected) == 4 * 10
+        pd.testing.assert_frame_equal(read_streamed_output(tmp_path / "cases.parquet"),
+                                      expected.reset_index(drop=True))
+        assert report["confirmed_cases"].to_dict() == expected_report["confirmed_cases"].to_dict()
+        assert misses == []
+        
+        raw = tmp_path / "country_vaccinations.csv"
+        raw.write_text(raw.read_text() + "Atlantis,2020-01-22,1,,,\n")
+        rows, misses = stream_vaccinations_source(str(raw), tmp_path / "vacc.parquet", chunk_cells=chunk_cells)
+        assert misses == ["Atlantis"]
+        expected = load_and_transform_vaccinations(str(raw)).sort_values(["iso3", "date"], ignore_index=True)
+        pd.testing.assert_frame_equal(read_streamed_output(tmp_path / "vacc.parquet"), expected, check_dtype=False)
+    
+    def test_unsorted_dates_rejected(self, tmp_path):
+        from streaming import stream_jhu_source
+        
+        raw = tmp_path / "cases.csv"
+        raw.write_text("Country/Region,US\n1/23/20,2\n1/24/20,3\n1/22/20,1\n")
+        with pytest.raises(ValueError, match="ascending"):
+            stream_jhu_source(str(raw), "cases", tmp_path / "cases.parquet", chunk_cells=4)
+        assert not (tmp_path / "cases.parquet").exists()
+        assert not (tmp_path / "cases.parquet.tmp").exists()
+    
+    def test_run_etl_streams_compressed_inputs(self, tmp_path):
+        import json
+        import pyarrow as pa
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        with open(tmp_path / "raw" / "country_vaccinations.csv", "a") as f:
+            f.write("Atlantis,2020-01-22,1,,,\n")
+        assert run_etl(tmp_path / "raw", tmp_path / "expected")
+        for path, codec in zip(sorted((tmp_path / "raw").iterdir()), ["gzip", "zstd", "gzip"]):
+            suffix = ".gz" if codec == "gzip" else ".zst"
+            with pa.output_stream(str(path) + suffix, compression=codec) as out:
+                out.write(path.read_bytes())
+            path.unlink()
+        
+        assert run_etl(tmp_path / "raw", tmp_path / "output", stream=True, chunk_cells=12)
+        for name in ["timeseries.parquet", "cases_timeseries.parquet"]:
+            result = pd.read_parquet(tmp_path / "output" / name)
+            expected = pd.read_parquet(tmp_path / "expected" / name)
+            pd.testing.assert_frame_equal(result.sort_values(["iso3", "date"], ignore_index=True),
+                                          expected.sort_values(["iso3", "date"], ignore_index=True))
+        # ISO3 misses collected while streaming match the in-memory run
+        reports = [json.loads((tmp_path / d / "quality_report.json").read_text()) for d in ["expected", "output"]]
+        assert reports[0]["iso3_misses"] == reports[1]["iso3_misses"] == ["Atlantis"]
+
+
+class TestIncrementalETL:
+    """Incremental runs must produce exactly the full-rebuild outputs."""
+    
+    OUTPUT_FILES = ["timeseries.parquet", "global_daily.parquet", "cases_timeseries.parquet",
+                    "deaths_timeseries.parquet", "vaccinations_timeseries.parquet"]
+    
+    @pytest.mark.parametrize("first_days", [3, 5, 9])
+    def test_incremental_matches_full_rebuild(self, tmp_path, first_days):
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw_full", n_days=12)
+        write_raw_inputs(tmp_path / "raw_partial", n_days=first_days)
+        
+        assert run_etl(tmp_path / "raw_full", tmp_path / "full")
+        assert run_etl(tmp_path / "raw_partial", tmp_path / "incr")
+        assert run_etl(tmp_path / "raw_full", tmp_path / "incr", incremental=True)
+        
+        for name in self.OUTPUT_FILES:
+            full = pd.read_parquet(tmp_path / "full" / name)
+            incr = pd.read_parquet(tmp_path / "incr" / name)
+            pd.testing.assert_frame_equal(incr, full, obj=name)
+    
+    def test_incremental_without_new_dates_is_noop(self, tmp_path):
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=6)
+        assert run_etl(tmp_path / "raw", tmp_path / "out")
+        before = (tmp_path / "out" / "timeseries.parquet").stat().st_mtime_ns
+        
+        assert run_etl(tmp_path / "raw", tmp_path / "out", incremental=True)
+        assert (tmp_path / "out" / "timeseries.parquet").stat().st_mtime_ns == before
+
+
+class TestParallelStages:
+    """Source stages run in a process pool must match the sequential run."""
+    
+    def test_parallel_matches_sequential(self, tmp_path):
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=10)
+        assert run_etl(tmp_path / "raw", tmp_path / "seq", workers=1)
+        assert run_etl(tmp_path / "raw", tmp_path / "par", workers=3)
+        
+        for name in TestIncrementalETL.OUTPUT_FILES:
+            seq = pd.read_parquet(tmp_path / "seq" / name)
+            par = pd.read_parquet(tmp_path / "par" / name)
+            pd.testing.assert_frame_equal(par, seq, obj=name)
+    
+    def test_stage_info_reports_each_source(self, tmp_path):
+        from stages import SOURCE_FILES, run_source_stages
+        
+        write_raw_inputs(tmp_path / "raw", n_days=4)
+        raw_files = {source: tmp_path / "raw" / name for source, name in SOURCE_FILES.items()}
+        frames, stage_info = run_source_stages(raw_files, tmp_path / "out", workers=2)
+        
+        assert list(frames) == ["cases", "deaths", "vaccinations"]
+        assert stage_info["cases"]["rows"] == len(frames["cases"]) == 16
+        assert stage_info["vaccinations"]["dates_failed"] == 0
+        assert stage_info["deaths"]["dates_failed"] == 0  # Province/State is read as a header row
+
+
+class TestFeatherOutput:
+    """Uncompressed Arrow IPC copy of the timeseries for memory-mapped loading."""
+    
+    def test_feather_copy_for_mmap(self, tmp_path):
+        import pyarrow as pa
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        assert run_etl(tmp_path / "raw", tmp_path / "output")
+        
+        with pa.memory_map(str(tmp_path / "output" / "timeseries.arrow")) as source:
+            reader = pa.ipc.open_file(source)
+            assert reader.num_record_batches == 1
+            table = reader.read_all()
+        assert all(table.column(i).null_count == 0 for i in range(table.num_columns)
+                   if pa.types.is_floating(table.schema.field(i).type))
+        
+        parquet = pd.read_parquet(tmp_path / "output" / "timeseries.parquet")
+        parquet["date"] = pd.to_datetime(parquet["date"])
+        pd.testing.assert_frame_equal(table.to_pandas(), parquet)
+
+
+class TestPartitionedDataset:
+    """Partitioned timeseries output and its manifest."""
+    
+    def test_run_etl_writes_partitioned_dataset(self, tmp_path):
+        import json
+        from run_etl import run_etl
+        from dataset_writer import DATASET_DIR_NAME, MANIFEST_NAME, read_partitioned_dataset
+        
+        write_raw_inputs(tmp_path / "raw", n_days=10)
+        assert run_etl(tmp_path / "raw", tmp_path / "out", partitioned=True, partition_by_year=True)
+        
+        dataset_dir = tmp_path / "out" / DATASET_DIR_NAME
+        manifest = json.loads((dataset_dir / MANIFEST_NAME).read_text())
+        full = pd.read_parquet(tmp_path / "out" / "timeseries.parquet")
+        
+        assert manifest["partitioning"] == ["iso3", "year"]
+        assert manifest["row_count"] == len(full)
+        assert sum(p["rows"] for p in manifest["partitions"]) == len(full)
+        for partition in manifest["partitions"]:
+            assert (dataset_dir / partition["path"]).exists()
+        
+        usa = read_partitioned_dataset(dataset_dir, iso3="USA", from_date=date(2020, 1, 25))
+        expected = full[(full["iso3"] == "USA") & (full["date"] >= date(2020, 1, 25))]
+        assert list(usa["date"]) == list(expected["date"])
+        assert list(usa["confirmed_cases"]) == list(expected["confirmed_cases"])
+        assert usa["country"].dtype.name == "category"
+    
+    def test_rows_sorted_by_date_within_partition(self, tmp_path):
+        import pyarrow.parquet as pq
+        from dataset_writer import DATASET_DIR_NAME, write_partitioned_dataset
+        
+        df = pd.DataFrame({
+            "date": [date(2020, 1, 3), date(2020, 1, 1), date(2020, 1, 2)],
+            "country": ["US", "US", "US"],
+            "iso3": ["USA", "USA", "USA"],
+            "confirmed_cases": [3.0, 1.0, 2.0],
+        })
+        manifest = write_partitioned_dataset(df, tmp_path)
+        
+        path = tmp_path / DATASET_DIR_NAME / manifest["partitions"][0]["path"]
+        table = pq.read_table(path)
+        assert table.column("date").to_pylist() == sorted(df["date"])
+        stats = pq.ParquetFile(path).metadata.row_group(0).column(0).statistics
+        assert (stats.min, stats.max) == (date(2020, 1, 1), date(2020, 1, 3))
+
+
+class TestStageCache:
+    """Content-hash stage cache."""
+    
+    def test_unchanged_stages_are_cache_hits(self, tmp_path, caplog):
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        cache_dir = tmp_path / "cache"
+        assert run_etl(tmp_path / "raw", tmp_path / "first", cache_dir=cache_dir)
+        
+        # Only the vaccinations input changes
+        vacc_file = tmp_path / "raw" / "country_vaccinations.csv"
+        vacc_file.write_text(vacc_file.read_text() + "China,2020-02-01,99999,,,\n")
+        with caplog.at_level("INFO"):
+            assert run_etl(tmp_path / "raw", tmp_path / "second", cache_dir=cache_dir)
+        
+        summary = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Stage cache")]
+        assert summary == ["Stage cache hits: cases, deaths; misses: vaccinations, merge, validate"]
+        
+        assert run_etl(tmp_path / "raw", tmp_path / "third", workers=1)
+        for name in TestIncrementalETL.OUTPUT_FILES:
+            pd.testing.assert_frame_equal(pd.read_parquet(tmp_path / "second" / name),
+                                          pd.read_parquet(tmp_path / "third" / name), obj=name)
+    
+    def test_code_version_is_part_of_key(self, tmp_path):
+        from stage_cache import StageCache
+        
+        old = StageCache(tmp_path, code_version="v1")
+        new = StageCache(tmp_path, code_version="v2")
+        assert old.key("cases", "abc") != new.key("cases", "abc")
+        assert old.key("cases", "abc") == StageCache(tmp_path, code_version="v1").key("cases", "abc")
+    
+    def test_size_based_eviction(self, tmp_path):
+        import os
+        from stage_cache import StageCache
+        
+        cache = StageCache(tmp_path, max_bytes=10 ** 9)
+        df = pd.DataFrame({"x": np.arange(10000, dtype=np.float64)})
+        for i, name in enumerate(["a", "b", "c"]):
+            cache.put(cache.key(name), df)
+            entry = tmp_path / f"{cache.key(name)}.json"
+            os.utime(entry, (1000 + i, 1000 + i))
+            os.utime(tmp_path / f"{cache.key(name)}.arrow", (1000 + i, 1000 + i))
+        
+        cache.max_bytes = cache.size_bytes() - 1
+        assert cache.evict() == 1
+        assert cache.get(cache.key("a")) is None
+        assert cache.get(cache.key("c")) is not None
+
+
+class TestSyntheticData:
+    """Synthetic raw data generator used by the benchmarks."""
+    
+    def test_generated_inputs_run_through_etl(self, tmp_path):
+        sys.path.insert(0, str(Path(__file__).parent.parent / "benchmarks"))
+        from generate_data import generate_raw_data
+        from run_etl import run_etl
+        
+        paths = generate_raw_data(tmp_path / "raw", n_countries=6, n_days=40, province_countries=2,
+                                  provinces=3, vaccination_start=10, gap_rate=0.05, negative_rate=0.02,
+                                  decrease_rate=0.02)
+        raw = pd.read_csv(paths["cases"])
+        assert raw.shape == (41, 1 + 2 * 3 + 4 + 4)  # province row + dates; date + columns
+        
+        assert run_etl(tmp_path / "raw", tmp_path / "output")
+        result = pd.read_parquet(tmp_path / "output" / "timeseries.parquet")
+        assert result["iso3"].nunique() == 6
+        assert len(result) == 6 * 40
+        assert result["total_vaccinations"].notna().any()
+        assert (result.groupby("iso3")["confirmed_cases"].diff().dropna() >= 0).all()
+
+
+class TestInstrumentation:
+    """Per-stage run report and profiles."""
+    
+    def test_run_report_covers_stages(self, tmp_path):
+        import json
+        from run_etl import run_etl
+        
+        write_raw_inputs(tmp_path / "raw", n_days=8)
+        assert run_etl(tmp_path / "raw", tmp_path / "output", profile=True, trace_memory=True)
+        
+        report = json.loads((tmp_path / "output" / "run_report.json").read_text())
+        assert report["success"] and report["mode"] == "full"
+        stages = {record["stage"]: record for record in report["stages"]}
+        for name in ["cases/read_csv", "cases/reshape", "cases/repair_monotonicity",
+                     "vaccinations/transform", "merge", "validate", "write_timeseries"]:
+            assert stages[name]["wall_seconds"] >= 0
+            assert stages[name]["cpu_seconds"] >= 0
+            assert stages[name]["tracemalloc_peak_mb"] is not None
+        assert stages["cases/read_csv"]["rows_out"] == 8  # date rows, below the two header rows
+        assert stages["cases/reshape"]["rows_out"] == stages["cases"]["rows_out"] == 8 * 4
+        assert stages["merge"]["rows_out"] == stages["write_timeseries"]["rows_in"]
+        assert (tmp_path / "output" / "profiles" / "cases.prof").exists()
+        assert not (tmp_path / "output" / "profiles" / "reshape.prof").exists()
+    
+    def test_nested_peak_includes_children(self):
+        import tracemalloc
+        from instrumentation import StageRecorder, recording, stage
+        
+        recorder = StageRecorder(trace_memory=True)
+        with recording(recorder), stage("outer"):
+            with stage("inner"):
+                block = bytearray(8 * 1024 ** 2)
+                del block
+        outer, inner = recorder.records
+        assert inner["stage"] == "outer/inner"
+        assert inner["tracemalloc_peak_mb"] >= 8
+        assert outer["tracemalloc_peak_mb"] >= inner["tracemalloc_peak_mb"]
+        assert not tracemalloc.is_tracing()
+        
+        # Without an active recorder stage() is a no-op
+        with stage("ignored") as record:
+            record["rows_out"] = 1
+        assert len(recorder.records) == 2
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])